@@ -0,0 +1,81 @@
+# ***************************************
+# ***Overview***
+# Script name: acs.py
+# Purpose: This Python module reads the American Community Survey (ACS) tables downloaded as CSV
+#          files, and joins them to the census tracts in memory. Only the needed columns are kept
+#          (as numpy arrays), the ACS special values ("-", "(X)", "**", ...) are handled for
+#          the whole column at once, and the join is a GEOID lookup instead of
+#          arcpy.TableToTable_conversion() + arcpy.AddJoin_management() + arcpy.CopyFeatures_management().
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import modules:
+import csv
+import io
+import sys
+import numpy as np
+
+# Import local modules:
+from config import *
+
+# Values used by the ACS instead of a number (no estimate, not applicable, too few samples, ...)
+acs_special_values = ["", "-", "N", "(X)", "*", "**", "***", "*****"]
+
+# *****************************************
+# Functions
+
+# Open a CSV file for the csv module (which expects binary mode in Python 2)
+def open_csv_file(csv_path):
+    if sys.version_info[0] < 3:
+        return open(csv_path, "rb")
+    return io.open(csv_path, newline="", encoding="latin-1")
+
+# Read some columns of a CSV file as arrays of strings, streaming through the rows.
+# The ACS files downloaded "with annotations" have a second header row with the
+# description of every column, which is skipped.
+def read_csv_columns(csv_path, column_names, num_of_description_rows=1):
+    with open_csv_file(csv_path) as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        indices = [header.index(column_name) for column_name in column_names]
+        for i in range(num_of_description_rows):
+            next(reader)
+        columns = [[] for column_name in column_names]
+        for row in reader:
+            for column, index in zip(columns, indices):
+                column.append(row[index].strip())
+    return dict((column_name, np.array(column)) for column_name, column in zip(column_names, columns))
+
+# Convert an array of ACS strings into numbers. Thousands separators and the "+"/"-" suffixes
+# of the top and bottom coded values ("250,000+", "2,500-") are removed, and the special
+# values become sentinel_value.
+def parse_acs_values(values, sentinel_value=np.nan):
+    numbers = np.full(len(values), sentinel_value, dtype=np.float64)
+    is_number = ~np.isin(values, acs_special_values)
+    if is_number.any():
+        cleaned_values = np.char.rstrip(np.char.replace(values[is_number], ",", ""), "+-")
+        numbers[is_number] = cleaned_values.astype(np.float64)
+    return numbers
+
+# Build a lookup table from the GEOID to the position in an array of GEOIDs
+def build_geoid_index(geoids):
+    return dict((str(geoid), index) for index, geoid in enumerate(geoids))
+
+# Join values to a list of GEOIDs (e.g. the census tracts): returns the value of every GEOID
+# in the same order, or NaN if it is not in right_geoids
+def join_on_geoid(left_geoids, right_geoids, right_values):
+    index = build_geoid_index(right_geoids)
+    positions = np.array([index.get(str(geoid), -1) for geoid in left_geoids], dtype=np.int64)
+    # The NaN at the end is used for the GEOIDs with no match (position -1)
+    values = np.append(np.asarray(right_values, dtype=np.float64), np.nan)
+    return values[positions]
+
+# Read one numeric column of an ACS CSV file and join it to a list of GEOIDs
+# (the GEOID of a census tract is in the column GEO.id2 of the ACS files)
+def read_acs_values_for_geoids(csv_path, value_column, geoids, sentinel_value=np.nan):
+    columns = read_csv_columns(csv_path, ["GEO.id2", value_column])
+    return join_on_geoid(geoids, columns["GEO.id2"], parse_acs_values(columns[value_column], sentinel_value))
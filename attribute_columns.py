@@ -0,0 +1,93 @@
+# ***************************************
+# ***Overview***
+# Script name: attribute_columns.py
+# Purpose: This Python module computes the normalized scores of a feature class as columns.
+#          The attributes needed are read into numpy arrays in a single scan, the maxima and
+#          the normalized and weighted scores are computed with array math, and all the new
+#          fields are written back in a single update pass. This replaces one get_max() scan per
+#          attribute followed by one arcpy.CalculateField_management() pass per derived field.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import numpy as np
+
+# Import local modules:
+from config import *
+
+# *****************************************
+# Functions
+
+# Read attributes of a feature class as float columns (null values become NaN), in one scan.
+# Returns the object ids and a dictionary attribute -> column.
+def read_columns(feat_class, attributes):
+    with arcpy.da.SearchCursor(feat_class, ["OID@"] + list(attributes)) as cursor:
+        rows = [row for row in cursor]
+    object_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    columns = {}
+    for i, attribute in enumerate(attributes):
+        columns[attribute] = np.array([np.nan if row[i + 1] is None else row[i + 1] for row in rows],
+                                      dtype=np.float64)
+    return object_ids, columns
+
+# Get the maximum of every column (NaN values ignored, None for an empty or all-null column)
+def get_column_maxima(columns):
+    maxima = {}
+    for attribute in columns:
+        values = columns[attribute][~np.isnan(columns[attribute])]
+        maxima[attribute] = float(values.max()) if values.size > 0 else None
+    return maxima
+
+# Normalize a column by a maximum value, so that its max value is a true 20
+def normalize_column(values, max_value, scale=20):
+    if not max_value:
+        return np.full(len(values), np.nan)
+    return values / float(max_value) * scale
+
+# Compute a weighted score from columns: weights is a list of [column, weight]
+def compute_weighted_score(columns, weights):
+    score = np.zeros(len(columns[weights[0][0]]))
+    for attribute, weight in weights:
+        score += columns[attribute] * weight
+    return score
+
+# Write columns to a feature class in a single update pass (the fields are added as DOUBLE if
+# they do not exist yet, in the order of attributes). The rows are matched on their object id;
+# NaN values are written as null.
+def write_columns(feat_class, object_ids, columns, attributes=None):
+    if attributes is None:
+        attributes = sorted(columns)
+    existing_fields = [field.name.lower() for field in arcpy.ListFields(feat_class)]
+    for attribute in attributes:
+        if attribute.lower() not in existing_fields:
+            arcpy.AddField_management(feat_class, attribute, "DOUBLE")
+    positions = dict((int(object_id), i) for i, object_id in enumerate(object_ids))
+    with arcpy.da.UpdateCursor(feat_class, ["OID@"] + attributes) as cursor:
+        for row in cursor:
+            i = positions.get(row[0])
+            if i is None:
+                continue
+            values = [columns[attribute][i] for attribute in attributes]
+            cursor.updateRow([row[0]] + [None if np.isnan(value) else float(value) for value in values])
+
+# Normalize attributes of a feature class by their max and compute a weighted overall score,
+# reading the feature class once and writing all the new fields in one pass.
+# normalizations is a list of [attribute, normalized field], and weights a list of
+# [normalized field, weight] for the overall_field. Returns the maxima of the attributes.
+def compute_normalized_scores(feat_class, normalizations, weights, overall_field):
+    object_ids, columns = read_columns(feat_class, [attribute for attribute, norm_field in normalizations])
+    maxima = get_column_maxima(columns)
+    out_columns = {}
+    for attribute, norm_field in normalizations:
+        print(norm_field + " = " + attribute + " / " + str(maxima[attribute]) + " * 20")
+        out_columns[norm_field] = normalize_column(columns[attribute], maxima[attribute])
+    out_columns[overall_field] = compute_weighted_score(out_columns, weights)
+    write_columns(feat_class, object_ids, out_columns,
+                  [norm_field for attribute, norm_field in normalizations] + [overall_field])
+    return maxima
@@ -0,0 +1,195 @@
+# ***************************************
+# ***Overview***
+# Script name: buffer_means.py
+# Purpose: This Python module approximates the mean of a raster in the buffers around line
+#          segments (e.g. the CII score in the 1 mile buffers around the LTS3 road segments)
+#          without building and rasterizing the buffers. The raster is convolved once with a
+#          disk as wide as the buffer (with FFTs), which gives for every cell the mean of the
+#          raster in the disk around it. The mean in the buffer of a segment is approximated
+#          by the average of that surface along the segment, weighted by length.
+#          Each segment then costs a few lookups, which lets us score all the road segments
+#          of the network in seconds. The error against the exact zonal mean is measured
+#          on a random sample of segments and reported.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from zonal_statistics import *
+from distance import *
+
+# Number of segments used to measure the error of the approximation
+num_of_error_samples = 200
+
+# *****************************************
+# Functions
+
+# Get the boolean kernel of a disk of a given radius (in meters), following the same
+# rule as the rasterization of the buffers: the cells whose center is within the radius
+def make_disk_kernel(radius, cell_width, cell_height):
+    row_radius = int(np.floor(radius / cell_height))
+    col_radius = int(np.floor(radius / cell_width))
+    rows, cols = np.mgrid[-row_radius:row_radius + 1, -col_radius:col_radius + 1]
+    return (rows * cell_height) ** 2 + (cols * cell_width) ** 2 <= radius * radius
+
+# Convolve an array with a (centered) kernel using FFTs. The array is padded with zeros,
+# so the result is the sum over the part of the kernel that falls inside of the array.
+def convolve_with_kernel(array, kernel):
+    fft_shape = (array.shape[0] + kernel.shape[0] - 1, array.shape[1] + kernel.shape[1] - 1)
+    result = np.fft.irfft2(np.fft.rfft2(array, fft_shape) * np.fft.rfft2(kernel, fft_shape), fft_shape)
+    first_row = (kernel.shape[0] - 1) // 2
+    first_col = (kernel.shape[1] - 1) // 2
+    return result[first_row:first_row + array.shape[0], first_col:first_col + array.shape[1]]
+
+# Compute, for every cell of an array, the mean of the values (NaN ignored) in the disk around it
+def compute_disk_means(values, cell_width, cell_height, radius):
+    kernel = make_disk_kernel(radius, cell_width, cell_height).astype(np.float64)
+    is_valid = ~np.isnan(values)
+    sums = convolve_with_kernel(np.where(is_valid, values, 0), kernel)
+    counts = np.round(convolve_with_kernel(is_valid.astype(np.float64), kernel))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+# Compute, for every cell, the mean of the raster values (NoData ignored) in the disk around it.
+# With SHARDING_OPTION, the raster is split into square tiles (also with "counties", as every cell
+# needs a value) with a halo margin as wide as the disk, convolved in parallel and merged.
+def compute_disk_mean_surface(values, grid, radius):
+    if SHARDING_OPTION == "no":
+        return compute_disk_means(values, grid["cell_width"], grid["cell_height"], radius)
+    shards = get_shards(grid, get_halo_num_of_cells(radius, grid), "tiles")
+    return run_sharded_function(compute_disk_means, [values], shards,
+                                (grid["cell_width"], grid["cell_height"], radius))
+
+# Get points along a line geometry (at most half a cell apart), with the length of line
+# each of them stands for (half of the segments on both sides)
+def get_weighted_line_samples(geometry, grid):
+    step = 0.5 * min(grid["cell_width"], grid["cell_height"])
+    samples = []
+    weights = []
+    for part in geometry:
+        points = np.array([(point.X, point.Y) for point in part if point is not None])
+        if len(points) == 0:
+            continue
+        if len(points) > 1:
+            points = densify_line(points, step)
+        lengths = np.hypot(np.diff(points[:, 0]), np.diff(points[:, 1]))
+        part_weights = np.zeros(len(points))
+        part_weights[:-1] += lengths / 2
+        part_weights[1:] += lengths / 2
+        if part_weights.sum() == 0:
+            part_weights[:] = 1
+        samples.append(points)
+        weights.append(part_weights)
+    if not samples:
+        return np.zeros((0, 2)), np.zeros(0)
+    return np.concatenate(samples), np.concatenate(weights)
+
+# Approximate the zonal statistics (COUNT, AREA, MEAN) of the buffers of the line segments of a
+# feature class: the MEAN is the length-weighted mean of the disk mean surface along the segment,
+# and the COUNT the number of cells of the buffer (pi * r^2 + 2 * r * length, in cells).
+# Returns a dictionary zone value -> [count, area, mean], like compute_overlapping_zonal_statistics()
+def compute_approximate_buffer_statistics(line_feature_class, zone_field, value_raster, radius,
+                                          values=None, grid=None):
+    if values is None:
+        values, grid = read_raster_as_array(value_raster)
+    surface = compute_disk_mean_surface(values, grid, radius)
+    cell_area = grid["cell_width"] * grid["cell_height"]
+    zonal_stats = {}
+    sample_sums = {}
+    with arcpy.da.SearchCursor(line_feature_class, [zone_field, "SHAPE@"]) as cursor:
+        for zone, geometry in cursor:
+            if geometry is None:
+                continue
+            samples, weights = get_weighted_line_samples(geometry, grid)
+            if len(samples) == 0:
+                continue
+            # Look up the surface at the samples inside of the grid
+            rows = np.floor((grid["y_max"] - samples[:, 1]) / grid["cell_height"]).astype(np.int64)
+            cols = np.floor((samples[:, 0] - grid["x_min"]) / grid["cell_width"]).astype(np.int64)
+            inside = (rows >= 0) & (rows < grid["n_rows"]) & (cols >= 0) & (cols < grid["n_cols"])
+            sample_values = surface[rows[inside], cols[inside]]
+            sample_weights = weights[inside]
+            is_valid = ~np.isnan(sample_values)
+            if not is_valid.any() or sample_weights[is_valid].sum() == 0:
+                continue
+            count = (np.pi * radius * radius + 2 * radius * geometry.length) / cell_area
+            total, total_weight, total_count = sample_sums.get(zone, [0.0, 0.0, 0.0])
+            sample_sums[zone] = [total + (sample_values[is_valid] * sample_weights[is_valid]).sum(),
+                                 total_weight + sample_weights[is_valid].sum(), total_count + count]
+    for zone in sample_sums:
+        total, total_weight, count = sample_sums[zone]
+        zonal_stats[zone] = [int(round(count)), round(count) * cell_area, total / total_weight]
+    return zonal_stats
+
+# Measure the error of the approximation on a random sample of segments, against the exact mean
+# in their buffers (buffered with arcpy geometries and rasterized like the buffer zones).
+# Returns the number of segments compared, the mean and max absolute error, the root mean square
+# error and the mean relative error.
+def measure_buffer_means_error(line_feature_class, zone_field, approximate_stats, values, grid, radius,
+                               num_of_samples=num_of_error_samples):
+    zones = sorted(approximate_stats)
+    if not zones:
+        return None
+    random_state = np.random.RandomState(0)
+    sampled_zones = set([zones[i] for i in random_state.choice(len(zones), min(num_of_samples, len(zones)),
+                                                                 replace=False)])
+    geometries = {}
+    with arcpy.da.SearchCursor(line_feature_class, [zone_field, "SHAPE@"]) as cursor:
+        for zone, geometry in cursor:
+            if zone in sampled_zones and geometry is not None:
+                geometries.setdefault(zone, []).append(geometry.buffer(radius))
+    errors = []
+    exact_means = []
+    for zone in geometries:
+        zone_values = []
+        for buffer_geometry in geometries[zone]:
+            window = rasterize_polygon(get_polygon_rings(buffer_geometry), grid)
+            if window is None:
+                continue
+            first_row, first_col, mask = window
+            zone_values.append(values[first_row:first_row + mask.shape[0],
+                                      first_col:first_col + mask.shape[1]][mask])
+        zone_values = np.concatenate(zone_values) if zone_values else np.zeros(0)
+        zone_values = zone_values[~np.isnan(zone_values)]
+        if zone_values.size == 0:
+            continue
+        exact_means.append(zone_values.mean())
+        errors.append(approximate_stats[zone][2] - zone_values.mean())
+    if not errors:
+        return None
+    errors = np.array(errors)
+    exact_means = np.array(exact_means)
+    nonzero = exact_means != 0
+    return {"num_of_segments": len(errors),
+            "mean_absolute_error": float(np.abs(errors).mean()),
+            "max_absolute_error": float(np.abs(errors).max()),
+            "root_mean_square_error": float(np.sqrt((errors * errors).mean())),
+            "mean_relative_error": float(np.abs(errors[nonzero] / exact_means[nonzero]).mean())
+                                   if nonzero.any() else None}
+
+# Fast alternative to buffering the segments and running zonal_statistics_as_table() on the
+# buffers: saves the approximate zonal statistics to a table with the same fields, and prints
+# the error measured on a sample of segments (which is also returned)
+def approximate_buffer_means_as_table(line_feature_class, zone_field, value_raster, radius, out_table):
+    values, grid = read_raster_as_array(value_raster)
+    zonal_stats = compute_approximate_buffer_statistics(line_feature_class, zone_field, value_raster, radius,
+                                                        values, grid)
+    zone_dtype = arcpy.da.FeatureClassToNumPyArray(line_feature_class, [zone_field]).dtype[0]
+    save_zonal_statistics_table(zonal_stats, zone_field, zone_dtype, out_table)
+    error = measure_buffer_means_error(line_feature_class, zone_field, zonal_stats, values, grid, radius)
+    if error is not None:
+        print("Approximate buffer means, error on " + str(error["num_of_segments"]) + " segments: "
+              + "mean absolute " + str(round(error["mean_absolute_error"], 4))
+              + ", max absolute " + str(round(error["max_absolute_error"], 4))
+              + ", RMSE " + str(round(error["root_mean_square_error"], 4)))
+    return error
@@ -0,0 +1,306 @@
+# ***************************************
+# ***Overview***
+# Script name: cache.py
+# Purpose: This Python module keeps a persistent cache of the datasets produced by the expensive
+#          steps (distance and score rasters, rasterized census tracts, buffers, zonal tables).
+#          Each step is identified by a key: a hash of its code, of the content of the datasets
+#          it reads, of its parameters and of the grid settings (extent, cell size, coordinate
+#          system and mask). When a step runs again with the same key, its outputs are copied
+#          back from the cache instead of being recomputed. The cache is bounded in size, and
+#          the least recently used entries are removed first.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import types
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from tiled_raster import *
+
+# Extensions of the files that make up a shapefile
+shapefile_extensions = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+# Folder of the local modules of the project (the modules whose source is part of the cache keys)
+project_folder = os.path.dirname(os.path.abspath(__file__))
+# Hashes of the source files of the local modules (with their modification time), kept per process
+source_file_hashes = {}
+
+# *****************************************
+# Functions
+
+# Get the full path of a dataset given by name (in the current workspace), layer or path
+def get_dataset_path(dataset):
+    if arcpy.Exists(dataset):
+        return arcpy.Describe(dataset).catalogPath
+    return dataset
+
+# Add the content of a file to a hash, reading it in blocks
+def hash_file(file_path, hasher):
+    with open(file_path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(1024 * 1024), b""):
+            hasher.update(block)
+
+# Add the rows of a feature class or table to a hash (the geometries as WKB)
+def hash_table(dataset_path, hasher):
+    describe = arcpy.Describe(dataset_path)
+    fields = sorted([field.name for field in arcpy.ListFields(dataset_path)
+                     if field.type not in ("OID", "Geometry", "Raster", "Blob")])
+    if hasattr(describe, "shapeType"):
+        hasher.update(describe.spatialReference.exportToString().encode("utf-8"))
+        fields.append("SHAPE@WKB")
+    hasher.update(repr(fields).encode("utf-8"))
+    with arcpy.da.SearchCursor(dataset_path, fields) as cursor:
+        for row in cursor:
+            hasher.update(repr(row).encode("utf-8"))
+
+# Add the cells of a raster to a hash, reading it tile by tile
+def hash_raster(dataset_path, hasher):
+    ras = arcpy.Raster(dataset_path)
+    grid = {"x_min": ras.extent.XMin,
+            "y_max": ras.extent.YMax,
+            "cell_width": ras.meanCellWidth,
+            "cell_height": ras.meanCellHeight,
+            "n_rows": ras.height,
+            "n_cols": ras.width,
+            "spatial_reference": ras.spatialReference}
+    hasher.update(repr([grid[key] for key in ["x_min", "y_max", "cell_width", "cell_height",
+                                               "n_rows", "n_cols"]]).encode("utf-8"))
+    hasher.update(ras.spatialReference.exportToString().encode("utf-8"))
+    for first_row, last_row in iterate_tiles(grid, get_tile_num_of_rows(grid, 1)):
+        hasher.update(np.ascontiguousarray(read_raster_tile(dataset_path, grid, first_row, last_row)).tobytes())
+
+# Add the content of a dataset to a hash: files (with the other files of a shapefile) are
+# hashed byte by byte, and geodatabase datasets through their rows or cells
+def hash_dataset(dataset, hasher):
+    dataset_path = get_dataset_path(dataset)
+    hasher.update(dataset.encode("utf-8"))
+    if os.path.isfile(dataset_path):
+        base_path, extension = os.path.splitext(dataset_path)
+        file_paths = [dataset_path]
+        if extension.lower() == ".shp":
+            file_paths = [base_path + ext for ext in shapefile_extensions if os.path.exists(base_path + ext)]
+        for file_path in file_paths:
+            hash_file(file_path, hasher)
+    elif arcpy.Exists(dataset_path):
+        if arcpy.Describe(dataset_path).dataType in ("RasterDataset", "RasterBand"):
+            hash_raster(dataset_path, hasher)
+        else:
+            hash_table(dataset_path, hasher)
+    else:
+        hasher.update(b"missing")
+
+# Get the names used by a code object and by the code objects nested in it (lambdas, comprehensions...)
+def get_code_names(code):
+    names = list(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.extend(get_code_names(const))
+    return names
+
+# Get the source file of a local module (None for the modules that are not part of the project)
+def get_local_source_file(module):
+    file_path = getattr(module, "__file__", None)
+    if not file_path:
+        return None
+    file_path = os.path.abspath(file_path)
+    if file_path.endswith((".pyc", ".pyo")):
+        file_path = file_path[:-1]
+    if os.path.dirname(file_path) != project_folder or not os.path.exists(file_path):
+        return None
+    return file_path
+
+# Get the source files of the local modules a function depends on: its own module, and the modules of
+# the local functions, classes and modules its global names resolve to, following the functions it
+# calls from module to module (e.g. a step of trails.py calling a helper of zonal_statistics.py)
+def get_function_source_files(function, source_files=None, visited_functions=None):
+    if source_files is None:
+        source_files = set()
+        visited_functions = set()
+    if function in visited_functions:
+        return source_files
+    visited_functions.add(function)
+    source_file = get_local_source_file(sys.modules.get(function.__module__))
+    if source_file is not None:
+        source_files.add(source_file)
+    for name in get_code_names(function.__code__):
+        value = function.__globals__.get(name)
+        if isinstance(value, types.ModuleType):
+            module = value
+        else:
+            module = sys.modules.get(getattr(value, "__module__", None) or "")
+        source_file = get_local_source_file(module)
+        if source_file is None:
+            continue
+        source_files.add(source_file)
+        if isinstance(value, types.FunctionType):
+            get_function_source_files(value, source_files, visited_functions)
+    return source_files
+
+# Add the code of a function to a hash: its byte code, constants and the names it uses, and the
+# source of the local modules it depends on, so that editing a helper it calls changes the key
+def hash_function(function, hasher):
+    code = function.__code__
+    hasher.update(code.co_code)
+    hasher.update(repr([const for const in code.co_consts
+                        if not isinstance(const, types.CodeType)]).encode("utf-8"))
+    hasher.update(repr(code.co_names).encode("utf-8"))
+    for source_file in sorted(get_function_source_files(function)):
+        modification_time = os.path.getmtime(source_file)
+        if source_file_hashes.get(source_file, [None])[0] != modification_time:
+            source_hasher = hashlib.sha1()
+            hash_file(source_file, source_hasher)
+            source_file_hashes[source_file] = [modification_time, source_hasher.hexdigest()]
+        hasher.update(os.path.basename(source_file).encode("utf-8"))
+        hasher.update(source_file_hashes[source_file][1].encode("utf-8"))
+
+# Get the cache key of a step: the hash of its code, inputs, parameters and grid settings
+def get_cache_key(function, inputs, parameters=None):
+    hasher = hashlib.sha1()
+    hasher.update(function.__name__.encode("utf-8"))
+    hash_function(function, hasher)
+    for dataset in inputs:
+        hash_dataset(dataset, hasher)
+    if parameters:
+        hasher.update(repr(sorted(parameters.items())).encode("utf-8"))
+    grid = get_env_grid()
+    hasher.update(repr([grid[key] for key in ["x_min", "y_max", "cell_width", "cell_height",
+                                               "n_rows", "n_cols"]]).encode("utf-8"))
+    if grid["spatial_reference"] is not None:
+        hasher.update(grid["spatial_reference"].exportToString().encode("utf-8"))
+    if arcpy.env.mask:
+        hash_dataset(str(arcpy.env.mask), hasher)
+    return hasher.hexdigest()
+
+# Get the size (in bytes) of all the files in a folder
+def get_folder_size(folder):
+    size = 0
+    for dir_path, dir_names, file_names in os.walk(folder):
+        for file_name in file_names:
+            size += os.path.getsize(os.path.join(dir_path, file_name))
+    return size
+
+# Read the manifest of a cache entry (None if the entry does not exist or is incomplete)
+def read_cache_manifest(key):
+    manifest_path = os.path.join(cache_path, key, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+# Write the manifest of a cache entry
+def write_cache_manifest(entry_path, manifest):
+    with open(os.path.join(entry_path, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+# Copy a dataset (geodatabase dataset or file) to a new location
+def copy_dataset(source, destination):
+    if os.path.isfile(source):
+        shutil.copy2(source, destination)
+    else:
+        arcpy.Copy_management(source, destination)
+
+# Copy the outputs of a step back from its cache entry
+def restore_cache_entry(key, manifest):
+    entry_path = os.path.join(cache_path, key)
+    for output, cached_name in manifest["outputs"]:
+        cached_dataset = os.path.join(entry_path, "outputs.gdb", cached_name)
+        if not arcpy.Exists(cached_dataset):
+            cached_dataset = os.path.join(entry_path, cached_name)
+        output_path = os.path.join(arcpy.env.workspace, output) if "\\" not in output else output
+        if arcpy.Exists(output_path):
+            arcpy.Delete_management(output_path)
+        copy_dataset(cached_dataset, output_path)
+    # Mark the entry as recently used
+    manifest["last_access"] = time.time()
+    write_cache_manifest(entry_path, manifest)
+
+# Copy the outputs of a step into a new cache entry. The entry is built in a temporary
+# folder, which only gets its final name once complete (two processes may store the same entry).
+def store_cache_entry(key, outputs):
+    entry_path = os.path.join(cache_path, key)
+    temp_entry_path = entry_path + ".tmp" + str(os.getpid())
+    if os.path.exists(temp_entry_path):
+        shutil.rmtree(temp_entry_path)
+    os.makedirs(temp_entry_path)
+    arcpy.CreateFileGDB_management(temp_entry_path, "outputs.gdb")
+    cached_outputs = []
+    for output in outputs:
+        output_path = get_dataset_path(output)
+        cached_name = os.path.basename(output_path)
+        if os.path.isfile(output_path):
+            copy_dataset(output_path, os.path.join(temp_entry_path, cached_name))
+        else:
+            copy_dataset(output_path, os.path.join(temp_entry_path, "outputs.gdb", cached_name))
+        cached_outputs.append([output, cached_name])
+    manifest = {"outputs": cached_outputs, "last_access": time.time(),
+                "size": get_folder_size(temp_entry_path)}
+    write_cache_manifest(temp_entry_path, manifest)
+    if os.path.exists(entry_path):
+        shutil.rmtree(temp_entry_path)
+    else:
+        os.rename(temp_entry_path, entry_path)
+
+# Run a step through the cache: its outputs are restored from the cache if it already ran with
+# the same key, otherwise it runs and its outputs are stored in the cache.
+# Returns "hit", "miss" or "off" (when CACHE_OPTION is "no").
+def run_cached_function(function, inputs, outputs, parameters=None):
+    if CACHE_OPTION != "yes":
+        function()
+        return "off"
+    key = get_cache_key(function, inputs, parameters)
+    manifest = read_cache_manifest(key)
+    if manifest is not None:
+        restore_cache_entry(key, manifest)
+        status = "hit"
+    else:
+        function()
+        store_cache_entry(key, outputs)
+        status = "miss"
+    # Only the main process evicts entries, as the workers may be reading them
+    if not is_worker_process():
+        print("Cache " + status + ": " + function.__name__)
+        evict_cache_entries()
+    return status
+
+# Remove the least recently used cache entries until the cache fits within CACHE_MAX_SIZE_MB
+def evict_cache_entries(max_size_mb=CACHE_MAX_SIZE_MB):
+    if not os.path.exists(cache_path):
+        return
+    entries = []
+    for key in os.listdir(cache_path):
+        manifest = read_cache_manifest(key)
+        if manifest is not None:
+            entries.append([manifest["last_access"], manifest["size"], key])
+    entries.sort()
+    total_size = sum([entry[1] for entry in entries])
+    while entries and total_size > max_size_mb * 1024 * 1024:
+        last_access, size, key = entries.pop(0)
+        shutil.rmtree(os.path.join(cache_path, key))
+        total_size -= size
+
+# Print the cache hits and misses of a group of steps (a dictionary of step name: status)
+def print_cache_report(cache_statuses):
+    if CACHE_OPTION != "yes":
+        return
+    for status, label in [["hit", "Cache hits"], ["miss", "Cache misses"]]:
+        names = sorted([name for name in cache_statuses if cache_statuses[name] == status])
+        print(label + " (" + str(len(names)) + "): " + ", ".join(names))
+
+# Remove all the entries of the cache
+def clear_cache():
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
@@ -0,0 +1,170 @@
+# ***************************************
+# ***Overview***
+# Script name: classification.py
+# Purpose: This Python module classifies rasters into 1-to-N scores using the Jenks natural
+#          breaks, as a faster replacement for arcpy.sa.Slice(raster, N, "NATURAL_BREAKS").
+#          The breaks are computed on the distinct values of the raster weighted by their
+#          number of cells (most of our rasters come from census tracts, so they only have
+#          a few hundred distinct values), on a histogram of the values, or on a sample of cells.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+
+# Above this number of distinct values, the "auto" mode switches from the exact
+# (distinct values) mode to the histogram mode
+max_unique_values = 2000
+# Number of bins used in the histogram mode
+num_of_histogram_bins = 1000
+# Number of cells used in the sample mode
+num_of_sampled_cells = 2000
+# Modes of the natural breaks (see compute_natural_breaks())
+natural_breaks_modes = ["unique", "histogram", "sample", "auto"]
+# Maximum size of the temporary cost matrices (to keep memory usage low)
+max_block_size = 4000000
+
+# *****************************************
+# Functions
+
+# Compute the Jenks natural breaks of sorted distinct values with their weights (number of cells),
+# with the Fisher dynamic programming algorithm on cumulative sums.
+# Returns the index of the last value of each class.
+def compute_weighted_jenks_classes(values, weights, num_of_classes):
+    num_of_values = len(values)
+    if num_of_values <= num_of_classes:
+        return list(range(num_of_values))
+
+    # Cumulative sums used to get the sum of squared deviations of any class in constant time
+    cum_weights = np.concatenate([[0.0], np.cumsum(weights)])
+    cum_sums = np.concatenate([[0.0], np.cumsum(weights * values)])
+    cum_squares = np.concatenate([[0.0], np.cumsum(weights * values * values)])
+
+    # Sum of squared deviations of the classes going from values[starts] to values[ends] included
+    def class_deviations(starts, ends):
+        class_weights = cum_weights[ends + 1] - cum_weights[starts]
+        class_sums = cum_sums[ends + 1] - cum_sums[starts]
+        class_squares = cum_squares[ends + 1] - cum_squares[starts]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return class_squares - class_sums * class_sums / class_weights
+
+    ends = np.arange(num_of_values)
+    # costs[i] is the best total deviation for values[0..i] with the current number of classes
+    costs = class_deviations(np.zeros(num_of_values, dtype=np.int64), ends)
+    class_starts = np.zeros((num_of_classes, num_of_values), dtype=np.int64)
+    block_size = max(1, max_block_size // num_of_values)
+    starts = np.arange(num_of_values)
+
+    for class_index in range(1, num_of_classes):
+        new_costs = np.full(num_of_values, np.inf)
+        # Process the class ends by blocks, trying every possible start of the last class at once
+        for block_first in range(class_index, num_of_values, block_size):
+            block_ends = ends[block_first:block_first + block_size]
+            candidates = (costs[np.maximum(starts - 1, 0)][None, :]
+                          + class_deviations(starts[None, :], block_ends[:, None]))
+            # The last class must start after the previous classes and end at block_ends
+            invalid = (starts[None, :] < class_index) | (starts[None, :] > block_ends[:, None])
+            candidates[invalid] = np.inf
+            best_starts = np.argmin(candidates, axis=1)
+            new_costs[block_ends] = candidates[np.arange(len(block_ends)), best_starts]
+            class_starts[class_index, block_ends] = best_starts
+        costs = new_costs
+
+    # Walk back through the class starts to get the last value of each class
+    class_ends = []
+    end = num_of_values - 1
+    for class_index in range(num_of_classes - 1, -1, -1):
+        class_ends.append(end)
+        end = class_starts[class_index, end] - 1
+    class_ends.reverse()
+    return class_ends
+
+# Compute the goodness of variance fit (GVF) of a classification, between 0 and 1
+def compute_goodness_of_variance_fit(values, weights, breaks):
+    mean = np.sum(weights * values) / np.sum(weights)
+    total_deviation = np.sum(weights * (values - mean) ** 2)
+    if total_deviation == 0:
+        return 1.0
+    classes = np.searchsorted(breaks[:-1], values, side="left")
+    class_weights = np.bincount(classes, weights, len(breaks))
+    class_sums = np.bincount(classes, weights * values, len(breaks))
+    class_squares = np.bincount(classes, weights * values * values, len(breaks))
+    nonempty = class_weights > 0
+    class_deviation = np.sum(class_squares[nonempty]
+                             - class_sums[nonempty] ** 2 / class_weights[nonempty])
+    return 1.0 - class_deviation / total_deviation
+
+# Check that a mode of the natural breaks exists (before any raster is read)
+def check_natural_breaks_mode(mode):
+    if mode not in natural_breaks_modes:
+        raise ValueError("Unknown natural breaks mode: " + str(mode) + " (expected one of "
+                         + ", ".join(natural_breaks_modes) + ")")
+
+# Compute the natural breaks of an array of cell values (NaN cells are ignored).
+# Modes:
+#   - "unique": exact, on the distinct values weighted by their number of cells
+#   - "histogram": on the centers of a fixed number of bins weighted by their number of cells
+#   - "sample": exact, on a random sample of cells
+#   - "auto": "unique" if there are few distinct values, "histogram" otherwise
+# Returns the list of breaks and the goodness of variance fit of the breaks on all the cells
+# (whatever values were used to pick the breaks, e.g. a sample or the centers of the bins).
+def compute_natural_breaks(cell_values, num_of_classes, mode="auto"):
+    check_natural_breaks_mode(mode)
+    all_cell_values = cell_values[~np.isnan(cell_values)]
+    if all_cell_values.size == 0:
+        raise ValueError("No cell values to classify (all the cells are NoData)")
+    cell_values = all_cell_values
+    max_value = cell_values.max()
+
+    if mode == "sample" and cell_values.size > num_of_sampled_cells:
+        cell_values = np.random.RandomState(0).choice(cell_values, num_of_sampled_cells, replace=False)
+
+    if mode in ["unique", "sample", "auto"]:
+        values, weights = np.unique(cell_values, return_counts=True)
+        upper_bounds = values
+        if mode == "auto" and len(values) > max_unique_values:
+            mode = "histogram"
+
+    if mode == "histogram":
+        # Each bin is represented by its center, and bounded by its upper edge
+        counts, edges = np.histogram(cell_values, num_of_histogram_bins)
+        nonempty = counts > 0
+        values = ((edges[:-1] + edges[1:]) / 2)[nonempty]
+        upper_bounds = edges[1:][nonempty]
+        weights = counts[nonempty]
+
+    weights = weights.astype(np.float64)
+    class_ends = compute_weighted_jenks_classes(values, weights, num_of_classes)
+    breaks = [upper_bounds[end] for end in class_ends]
+    # Make sure the last class includes the max value of the raster
+    breaks[-1] = max_value
+    gvf = compute_goodness_of_variance_fit(all_cell_values.astype(np.float64), np.ones(all_cell_values.size),
+                                           np.array(breaks))
+    return breaks, gvf
+
+# Reclassify a raster into 1-to-N scores using the Jenks natural breaks classification
+# (replaces arcpy.sa.Slice(in_raster, num_of_classes, "NATURAL_BREAKS")), and save it.
+def slice_natural_breaks(in_raster, num_of_classes, out_raster, mode="auto"):
+    check_natural_breaks_mode(mode)
+    cell_values, grid = read_raster_as_array(in_raster)
+    if np.isnan(cell_values).all():
+        raise ValueError("The raster " + str(in_raster) + " has no values to classify into "
+                         + str(out_raster) + " (all its cells are NoData)")
+    breaks, gvf = compute_natural_breaks(cell_values, num_of_classes, mode)
+    print("Natural breaks of " + str(in_raster) + " (GVF: " + str(round(gvf, 4)) + "): " + str(breaks))
+
+    # Class 1 holds the values up to the first break, class 2 up to the second, etc.
+    # 0 is used for NoData
+    classes = np.searchsorted(np.array(breaks[:-1]), cell_values, side="left") + 1
+    classes[np.isnan(cell_values)] = 0
+    save_array_as_raster(classes.astype(np.uint8), grid, out_raster, 0)
+    return breaks, gvf
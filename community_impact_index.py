@@ -20,35 +20,41 @@
 # Import Arcpy modules:
 import arcpy
 import arcpy.sa # Spatial Analyst
+import arcpy.da # Data Access
+import numpy as np
 
 # Import local modules:
 from config import *
 from utilities import *
+from classification import *
+from distance import *
+from reprojection import *
+from tracts import *
+from acs import *
+from tiled_raster import *
+from pipeline import *
 
 # *****************************************
 # Functions
 
 # Prepare the Indicator of Potential Disadvantage (IDP) dataset
 def prep_idp_dataset():
-    # Local variables
-    ipd =  orig_datasets_path + "\\CII\\DVRPC_2016_Indicators_of_Potential_Disadvantage\\DVRPC_2016_Indicators_of_Potential_Disadvantage.shp"
-    ipd_clipped = gdb_output_CII + "\\ipd_clipped"
-    ipd_ras = gdb_output_CII + "\\ipd_ras"
-    ipd_score_ras = gdb_output_CII + "\\ipd_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    ipd_clipped = "ipd_clipped"
+    ipd_ras = "ipd_ras"
+    ipd_score_ras = "ipd_score_ras"
 
     # Load the feature class into the MXD
-    arcpy.MakeFeatureLayer_management(ipd, "idp")
+    arcpy.MakeFeatureLayer_management(ipd_orig, "idp")
     # NO need to reproject (already in NAD 1983 UTM Zone 18N)
     # Clip to the boundaries of 4_counties_dissolved
-    arcpy.SpatialJoin_analysis(ipd, "extent_4_counties", ipd_clipped,
+    arcpy.SpatialJoin_analysis(ipd_orig, analysis_extent, ipd_clipped,
                             "JOIN_ONE_TO_ONE", "KEEP_COMMON", match_option="HAVE_THEIR_CENTER_IN")
-    # Convert into a raster
-    arcpy.PolygonToRaster_conversion (ipd_clipped, "IPD_Score", ipd_ras)
+    # Convert into a raster, using the shared census tract label raster (matched on the tract id)
+    tract_field_to_raster(ipd_clipped, "GEOID10", "IPD_Score", ipd_ras)
 
-    # reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice(ipd_ras, 20, "NATURAL_BREAKS")
-    outslice.save(ipd_score_ras)
+    # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
+    slice_natural_breaks(ipd_ras, 20, ipd_score_ras)
     # Display the resulting raster (note that the tool demands a slightly different name for the layer)
     arcpy.MakeRasterLayer_management(ipd_score_ras, "ipd_score_ras1")
 
@@ -57,80 +63,57 @@ def prep_idp_dataset():
 
 # Prepare the Population Density dataset
 def prep_pop_density_dataset():
-    # Local variables
-    pa_census_tracts_orig =  orig_datasets_path + "\\CII\\ACS_2016_population_est\\tl_2016_42_tract\\tl_2016_42_tract.shp"
-    population_table_orig =  orig_datasets_path + "\\CII\\ACS_2016_population_est\\ACS_16_5YR_B01003\\ACS_16_5YR_B01003_with_ann.csv"
-    pa_census_tracts_proj = gdb_output_CII + "\\pa_census_tracts_proj"
-    pa_census_tracts_clipped = gdb_output_CII + "\\pa_census_tracts_clipped"
-    pop_table = gdb_output_CII + "\\pop_table"
-    tracts_with_pop = gdb_output_CII + "\\tracts_with_pop"
-    pop_density_ras = gdb_output_CII + "\\pop_density_ras"
-    pop_density_score_ras = gdb_output_CII + "\\pop_density_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    pa_census_tracts_proj = "pa_census_tracts_proj"
+    pa_census_tracts_clipped = "pa_census_tracts_clipped"
+    pa_census_tracts_clipped1 = "pa_census_tracts_clipped1"
+    pop_density_ras = "pop_density_ras"
+    pop_density_score_ras = "pop_density_score_ras"
 
     # Load the feature class and table into the MXD
     arcpy.MakeFeatureLayer_management(pa_census_tracts_orig, "pa_census_tracts_orig")
 
     # Reproject to NAD 1983 UTM Zone 18N (No need for datum transformation)
     target_spatial_reference = arcpy.SpatialReference('NAD 1983 UTM Zone 18N')
-    arcpy.Project_management(pa_census_tracts_orig, pa_census_tracts_proj, target_spatial_reference)
+    project_dataset(pa_census_tracts_orig, pa_census_tracts_proj, target_spatial_reference)
 
     # Clip to the boundaries of 4_counties_dissolved
-    arcpy.SpatialJoin_analysis(pa_census_tracts_proj, "extent_4_counties", "pa_census_tracts_clipped",
+    arcpy.SpatialJoin_analysis(pa_census_tracts_proj, analysis_extent, pa_census_tracts_clipped,
                               "JOIN_ONE_TO_ONE", "KEEP_COMMON", match_option="HAVE_THEIR_CENTER_IN")
-    # Remove the extra tract that got included because of its weirdly-placed centroid
-    # XXX This does not work the way it should XXX
-    arcpy.SelectLayerByAttribute_management("pa_census_tracts_clipped", "NEW_SELECTION",
-                                            "GEOID <> '42101006500'")
-    # Save to a new feature class and do some clean up
-    arcpy.CopyFeatures_management("pa_census_tracts_clipped", "pa_census_tracts_clipped1")
-    arcpy.SelectLayerByAttribute_management("pa_census_tracts_clipped", "CLEAR_SELECTION")
-
-    # Import the table with the ACS Total Population data
-    arcpy.TableToTable_conversion(population_table_orig, gdb_output_CII, 'pop_table')
-
-    # Join the table to the Census tracts
-    arcpy.AddJoin_management("pa_census_tracts_clipped1", "GEOID", pop_table, "GEO_id2", "KEEP_ALL")
-    arcpy.CopyFeatures_management("pa_census_tracts_clipped1", tracts_with_pop)
-    arcpy.RemoveJoin_management("pa_census_tracts_clipped1")
-
-    # Add new Long field "TotalPop" and put the value of String field HD01_VD01
-    arcpy.AddField_management(tracts_with_pop, "TotalPop", "Double")
-    arcpy.CalculateField_management(tracts_with_pop, "TotalPop",
-                                    "!pop_table_HD01_VD01!",
-                                    "PYTHON_9.3")
-
-    # Add new Long field "AlandSqKm" and put in it the value of field
-    # pa_census_tracts_clipped_ALAND converted to sq km
-    arcpy.AddField_management(tracts_with_pop, "AlandSqKm", "Double")
-    arcpy.CalculateField_management(tracts_with_pop, "AlandSqKm",
-                                    "!pa_census_tracts_clipped1_ALAND! / 1000000",
-                                    "PYTHON_9.3")
-
-    # Add new field "PopDensity" and put in it TotalPop divided by AlandSqKm
-    arcpy.AddField_management(tracts_with_pop, "PopDensity", "Double")
-    arcpy.CalculateField_management(tracts_with_pop, "PopDensity",
-                                    "!TotalPop! / !AlandSqKm!",
-                                    "PYTHON_9.3")
+    # Remove the extra tract that got included because of its weirdly-placed centroid, and save
+    # the other tracts to a new feature class (a where clause on the feature class itself, as there
+    # is no layer of it to select from when the stage runs in a worker process)
+    arcpy.Select_analysis(pa_census_tracts_clipped, pa_census_tracts_clipped1, "GEOID <> '42101006500'")
+
+    # Read the ACS Total Population (field HD01_VD01) of every census tract, joined on the GEOID
+    tracts = arcpy.da.TableToNumPyArray(pa_census_tracts_clipped1, ["GEOID", "ALAND"])
+    total_pop = read_acs_values_for_geoids(population_table_orig, "HD01_VD01", tracts["GEOID"])
+
+    # Compute the population density: TotalPop divided by the land area (ALAND) converted to sq km.
+    # The tracts without land (water tracts, ALAND = 0) get NoData instead of an infinite density,
+    # which would push every other tract into the lowest classes of the natural breaks
+    land_area = tracts["ALAND"].astype(np.float64) / 1000000
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pop_density = np.where(land_area > 0, total_pop / land_area, np.nan)
+
+    # Convert into a raster, using the shared census tract label raster (of the tracts of this
+    # stage, as they are only copied into the output geodatabase once the stage is done)
+    tract_values_to_raster(dict(zip(tracts["GEOID"], pop_density)), pop_density_ras,
+                           pa_census_tracts_clipped1)
 
-    # Convert into a raster
-    arcpy.PolygonToRaster_conversion (tracts_with_pop, "PopDensity", pop_density_ras)
-
-    # reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice(pop_density_ras, 20, "NATURAL_BREAKS")
-    outslice.save(pop_density_score_ras)
+    # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
+    slice_natural_breaks(pop_density_ras, 20, pop_density_score_ras)
     # Display the resulting raster (note that the tool demands a slightly different name for the layer)
     arcpy.MakeRasterLayer_management(pop_density_score_ras, "pop_density_score_ras1")
 
     # Cleanup
     remove_intermediary_layers(["pa_census_tracts_orig","pa_census_tracts_proj",
-                                "pa_census_tracts_clipped", "pa_census_tracts_clipped1", "pop_table", "tracts_with_pop","pop_density_ras"
+                                "pa_census_tracts_clipped", "pa_census_tracts_clipped1", "pop_density_ras"
                                 ])
 
 # Prepare the Employment Density dataset
 def prep_employment_dataset():
     # Local variables
-    employment_clipped = data_path + "\\XXXstop_gap.gdb\\Employment_BusinessPatternZip_with_pop_DVRPC_Counties"
 
     # Display the raster
     arcpy.MakeFeatureLayer_management(employment_clipped, "employment_clipped")
@@ -140,231 +123,186 @@ def prep_employment_dataset():
                                           "employment_ras")
     # Clip the raster to the shape of the 4 counties
     arcpy.Clip_management("employment_ras", "#", "employment_clipped_ras",
-                    "extent_4_counties", "#", "ClippingGeometry")
+                    analysis_extent, "#", "ClippingGeometry")
 
     # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice("employment_clipped_ras", 20, "NATURAL_BREAKS")
-    outslice.save("employment_score_ras")
+    slice_natural_breaks("employment_clipped_ras", 20, "employment_score_ras")
     # Display the resulting raster
     arcpy.MakeRasterLayer_management("employment_score_ras", "employment_score_ras1")
 
     # Cleanup
     remove_intermediary_layers(["employment_clipped","employment_ras", "employment_clipped_ras"])
 
-# Prepare the Distance to Circuit Trails dataset
+# Prepare the sources of the Distance to Circuit Trails dataset
+# (the distances are computed in prep_distance_datasets())
 def prep_circuit_trails_dataset():
-    # Local variables
-    circuit_trails_orig =  orig_datasets_path + "\\CII\\DVRPC_Circuit_Trails_20190328\\DVRPC_Circuit_Trails.shp"
-    circuit_trails = gdb_output_CII + "\\circuit_trails"
-    circuit_trails_distance_ras = gdb_output_CII + "\\circuit_trails_distance_ras"
-    circuit_trails_score_ras = gdb_output_CII + "\\circuit_trails_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    circuit_trails = "circuit_trails"
     # Load the feature class into the MXD
     arcpy.MakeFeatureLayer_management(circuit_trails_orig, "circuit_trails_orig")
 
-    # Remove the partial trolley data present in the dataset
-    arcpy.SelectLayerByAttribute_management("circuit_trails_orig", "NEW_SELECTION",
-                                            "Circuit = 'Existing' OR Circuit = 'In Progress' ")
-    # Save to a new feature class and do some clean up
-    arcpy.CopyFeatures_management("circuit_trails_orig", circuit_trails)
-    arcpy.SelectLayerByAttribute_management("circuit_trails_orig", "CLEAR_SELECTION")
-
-    # Compute the Euclidean distance raster to the rail stops
-    outEucDistance = arcpy.sa.EucDistance(circuit_trails)
-    outEucDistance.save(circuit_trails_distance_ras)
-    # Display the resulting raster (note that the tool demands a slightly different name for the layer)
-    arcpy.MakeRasterLayer_management(circuit_trails_distance_ras, "circuit_trails_distance_ras1")
-
-    # Reclassify the raster based on chosen thresholds
-    # First, convert distances in miles into meters
-    one_mile = 1609.34
-    # Approximate maximun distance within the extent (in meters) for the upper bound
-    max_distance = 134000
-    circuit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 20],
-                                                [one_mile, max_distance, 1]])
-    # Perform the reclassification and display it
-    outReclassRaster = arcpy.sa.Reclassify(circuit_trails_distance_ras, "Value", circuit_remap_range)
-    outReclassRaster.save(circuit_trails_score_ras)
-    arcpy.MakeRasterLayer_management(circuit_trails_score_ras, "circuit_trails_score_ras1")
+    # Remove the partial trolley data present in the dataset, and save to a new feature class
+    arcpy.Select_analysis(circuit_trails_orig, circuit_trails,
+                          "Circuit = 'Existing' OR Circuit = 'In Progress' ")
 
     # Clean up
-    remove_intermediary_layers(["circuit_trails_orig", "circuit_trails", "circuit_trails_distance_ras1"])
+    remove_intermediary_layers(["circuit_trails_orig", "circuit_trails"])
 
 # Prepare the 0 Vehicle Available dataset
 def prep_0_vehicle_dataset():
-    commuting_table_orig =  orig_datasets_path + "\\CII\\Vehicle_available\\ACS_17_5YR_S0801\\ACS_17_5YR_S0801_with_ann.csv"
+    # Read the ACS percentage of workers with no vehicle available (field HC01_EST_VC59) of every
+    # census tract, joined on the GEOID ("-", i.e. no estimate, is counted as 0%)
+    tract_ids = arcpy.da.TableToNumPyArray(census_tracts_clipped, ["GEOID"])["GEOID"]
+    no_vehicle_pct = read_acs_values_for_geoids(commuting_table_orig, "HC01_EST_VC59", tract_ids,
+                                                sentinel_value=0)
 
-    # Load the feature class and table into the MXD
-    arcpy.MakeFeatureLayer_management("pa_census_tracts_clipped1", "pa_census_tracts_clipped1")
-
-    # Import the table with ACS Commuting data
-    arcpy.TableToTable_conversion(commuting_table_orig, gdb_output_CII, "commuting_table")
-
-    # Join the table to the Census tracts
-    arcpy.AddJoin_management("pa_census_tracts_clipped1", "GEOID", "commuting_table", "GEO_id2", "KEEP_ALL")
-    arcpy.CopyFeatures_management("pa_census_tracts_clipped1", "tracts_with_commuting")
-    arcpy.RemoveJoin_management("pa_census_tracts_clipped1")
-
-    # Add new Float field "NoVehiclePct" and put the value of String field HC01_EST_VC59
-    arcpy.AddField_management("tracts_with_commuting", "NoVehiclePct", "Float")
-    expression = "convert_value(!commuting_table_HC01_EST_VC59!)"
-    codeblock = """def convert_value(str_value):
-        if str_value == "-":
-            return 0
-        else:
-            return float(str_value)"""
+    # Convert into a raster, using the shared census tract label raster
+    tract_values_to_raster(dict(zip(tract_ids, no_vehicle_pct)), "no_vehicle_available_ras")
 
-    arcpy.CalculateField_management("tracts_with_commuting", "NoVehiclePct",
-                                    expression, "PYTHON_9.3", codeblock)
-    # Convert into a raster
-    arcpy.PolygonToRaster_conversion ("tracts_with_commuting", "NoVehiclePct",
-                                      "no_vehicle_available_ras")
-
-    # reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice("no_vehicle_available_ras", 20, "NATURAL_BREAKS")
-    outslice.save("no_vehicle_score_ras")
+    # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
+    slice_natural_breaks("no_vehicle_available_ras", 20, "no_vehicle_score_ras")
     # Display the resulting raster (note that the tool demands a slightly different name for the layer)
     arcpy.MakeRasterLayer_management("no_vehicle_score_ras", "no_vehicle_score_ras1")
 
     # Cleanup
-    remove_intermediary_layers(["pa_census_tracts_clipped1","commuting_table",
-                                "tracts_with_commuting", "no_vehicle_available_ras"])
+    remove_intermediary_layers(["no_vehicle_available_ras"])
 
-# Prepare the Distance to Rail Stations dataset
+# Prepare the sources of the Distance to Rail Stations dataset
+# (the distances are computed in prep_distance_datasets())
 def prep_rail_dataset():
-    # Local variables
-    rail_stops_orig =  orig_datasets_path + "\\CII\\DVRPC_Passenger_Rail_Stations\\DVRPC_Passenger_Rail_Stations.shp"
-    rail_stops_distance_ras = gdb_output_CII + "\\rail_stops_distance_ras"
-    rail_stops_proj = gdb_output_CII + "\\rail_stops_proj"
-    rail_stops_proj2 = gdb_output_CII + "\\rail_stops_proj2"
-    rail_score_ras = gdb_output_CII + "\\rail_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    rail_stops_proj = "rail_stops_proj"
+    rail_stops_proj2 = "rail_stops_proj2"
 
     # Load the feature class into the MXD
     arcpy.MakeFeatureLayer_management(rail_stops_orig, "rail_stops_orig")
     # Reproject to NAD 1983 UTM Zone 18N
     target_spatial_reference = arcpy.SpatialReference('NAD 1983 UTM Zone 18N')
-    arcpy.Project_management(rail_stops_orig, rail_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
-
-    # Remove the partial trolley data present in the dataset
-    arcpy.SelectLayerByAttribute_management("rail_stops_proj", "NEW_SELECTION", "Type <>'Surface Trolley'")
-    # Save to a new feature class and do some clean up
-    arcpy.CopyFeatures_management("rail_stops_proj", rail_stops_proj2)
-    arcpy.SelectLayerByAttribute_management("rail_stops_proj", "CLEAR_SELECTION")
+    project_dataset(rail_stops_orig, rail_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
 
-    # Compute the Euclidean distance raster to the rail stops
-    outEucDistance = arcpy.sa.EucDistance(rail_stops_proj2)
-    outEucDistance.save(rail_stops_distance_ras)
-    # Display the resulting raster (note that the tool demands a slightly different name for the layer)
-    arcpy.MakeRasterLayer_management(rail_stops_distance_ras, "rail_stops_distance_ras1")
+    # Remove the partial trolley data present in the dataset, and save to a new feature class
+    # (a where clause on the feature class itself, as there is no layer of it to select from
+    # when the stage runs in a worker process)
+    arcpy.Select_analysis(rail_stops_proj, rail_stops_proj2, "Type <>'Surface Trolley'")
 
-    # Reclassify the raster based on chosen thresholds
-    # First, convert distances in miles into meters
-    one_mile = 1609.34
-    five_miles = 5 * 1609.34
-    # Approximate maximun distance within the extent (in meters) for the upper bound
-    max_distance = 134000
-    transit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 1],
-                                                [one_mile, five_miles, 20],
-                                                [five_miles, max_distance, 10]])
-    # Perform the reclassification and display it
-    outReclassRaster = arcpy.sa.Reclassify(rail_stops_distance_ras, "Value", transit_remap_range)
-    outReclassRaster.save(rail_score_ras)
-    arcpy.MakeRasterLayer_management(rail_score_ras, "rail_score_ras1")
     # Clean up
-    remove_intermediary_layers(["rail_stops_orig", "rail_stops_proj", "rail_stops_proj2", "rail_stops_distance_ras1"])
+    remove_intermediary_layers(["rail_stops_orig", "rail_stops_proj", "rail_stops_proj2"])
 
-# Prepare the Distance to Trolley Stops dataset
+# Prepare the sources of the Distance to Trolley Stops dataset
+# (the distances are computed in prep_distance_datasets())
 def prep_trolley_dataset():
-    # Local variables
-    trolley_stops_orig =  orig_datasets_path + "\\CII\\SEPTA__Trolley_Stops\\SEPTA__Trolley_Stops.shp"
-    trolley_stops_distance_ras = gdb_output_CII + "\\trolley_stops_distance_ras"
-    trolley_stops_proj = gdb_output_CII + "\\trolley_stops_proj"
-    trolley_score_ras = gdb_output_CII + "\\trolley_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    trolley_stops_proj = "trolley_stops_proj"
 
     # Load the feature class into the MXD
     arcpy.MakeFeatureLayer_management(trolley_stops_orig, "trolley_stops_orig")
     # Reproject to NAD 1983 UTM Zone 18N
     target_spatial_reference = arcpy.SpatialReference('NAD 1983 UTM Zone 18N')
-    arcpy.Project_management(trolley_stops_orig, trolley_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
+    project_dataset(trolley_stops_orig, trolley_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
 
-    # Compute the Euclidean distance raster to the trolley stops
-    outEucDistance = arcpy.sa.EucDistance(trolley_stops_proj)
-    outEucDistance.save(trolley_stops_distance_ras)
-    # Display the resulting raster (note that the tool demands a slightly different name for the layer)
-    arcpy.MakeRasterLayer_management(trolley_stops_distance_ras, "trolley_stops_distance_ras1")
-
-    # Reclassify the raster based on chosen thresholds
-    # First, convert distances in miles into meters
-    one_mile = 1609.34
-    five_miles = 5 * 1609.34
-    # Approximate maximun distance within the extent (in meters) for the upper bound
-    max_distance = 134000
-    transit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 1],
-                                                [one_mile, five_miles, 20],
-                                                [five_miles, max_distance, 10]])
-    # Perform the reclassification and display it
-    outReclassRaster = arcpy.sa.Reclassify(trolley_stops_distance_ras, "Value", transit_remap_range)
-    outReclassRaster.save(trolley_score_ras)
     # Clean up
-    arcpy.MakeRasterLayer_management(trolley_score_ras, "trolley_score_ras1")
-    remove_intermediary_layers(["trolley_stops_orig","trolley_stops_proj", "trolley_stops_distance_ras1"])
+    remove_intermediary_layers(["trolley_stops_orig","trolley_stops_proj"])
 
-# Prepare the Distance to Bus Stops dataset
+# Prepare the sources of the Distance to Bus Stops dataset
+# (the distances are computed in prep_distance_datasets())
 def prep_bus_dataset():
-    # Local variables
-    bus_stops_orig =  orig_datasets_path + "\\CII\\SEPTA__Bus_Stops\\SEPTA__Bus_Stops.shp"
-    bus_stops_distance_ras = gdb_output_CII + "\\bus_stops_distance_ras"
-    bus_stops_proj = gdb_output_CII + "\\bus_stops_proj"
-    bus_score_ras = gdb_output_CII + "\\bus_score_ras"
+    # Local variables (written in the workspace of the stage, see pipeline.py)
+    bus_stops_proj = "bus_stops_proj"
 
     # Load the feature class into the MXD
     arcpy.MakeFeatureLayer_management(bus_stops_orig, "bus_stops_orig")
     # Reproject to NAD 1983 UTM Zone 18N
     target_spatial_reference = arcpy.SpatialReference('NAD 1983 UTM Zone 18N')
-    arcpy.Project_management(bus_stops_orig, bus_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
+    project_dataset(bus_stops_orig, bus_stops_proj, target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
 
-    # Compute the Euclidean distance raster to the bus stops
-    outEucDistance = arcpy.sa.EucDistance(bus_stops_proj)
-    outEucDistance.save(bus_stops_distance_ras)
-    arcpy.MakeRasterLayer_management(bus_stops_distance_ras, "bus_stops_distance_ras1")
+    # Clean up
+    remove_intermediary_layers(["bus_stops_orig","bus_stops_proj"])
+
+# Reclassify a distance raster based on chosen thresholds
+def reclassify_distance_raster(distance_ras, remap_range, score_ras):
+    outReclassRaster = arcpy.sa.Reclassify(distance_ras, "Value", remap_range)
+    # Save it as an 8-bit unsigned raster, like the other score rasters (0 is NoData)
+    arcpy.CopyRaster_management(outReclassRaster, score_ras, nodata_value="0", pixel_type="8_BIT_UNSIGNED")
+    # The raster is written by arcpy, so its statistics are computed after the fact
+    compute_raster_statistics(score_ras)
+
+# Compute the Distance to Circuit Trails, Rail Stations, Trolley Stops and Bus Stops datasets.
+# The 4 layers are processed in one batch (sharing the same grid setup, and running in parallel).
+# By default, the score rasters are computed directly from the distance bands, without
+# computing and saving the full distance rasters.
+def prep_distance_datasets():
+    # Local variables: the sources, prepared by the other stages, are read from the output
+    # geodatabase, and the rasters are written in the workspace of the stage (see pipeline.py)
+    circuit_trails = gdb_output_CII + "\\circuit_trails"
+    circuit_trails_distance_ras = "circuit_trails_distance_ras"
+    circuit_trails_score_ras = "circuit_trails_score_ras"
+    rail_stops_proj2 = gdb_output_CII + "\\rail_stops_proj2"
+    rail_stops_distance_ras = "rail_stops_distance_ras"
+    rail_score_ras = "rail_score_ras"
+    trolley_stops_proj = gdb_output_CII + "\\trolley_stops_proj"
+    trolley_stops_distance_ras = "trolley_stops_distance_ras"
+    trolley_score_ras = "trolley_score_ras"
+    bus_stops_proj = gdb_output_CII + "\\bus_stops_proj"
+    bus_stops_distance_ras = "bus_stops_distance_ras"
+    bus_score_ras = "bus_score_ras"
 
-    # Reclassify the raster based on chosen thresholds
-    # First, convert distances in miles into meters
+    # Distance thresholds: first, convert distances in miles into meters
     one_mile = 1609.34
     five_miles = 5 * 1609.34
     # Approximate maximun distance within the extent (in meters) for the upper bound
     max_distance = 134000
-    transit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 1],
-                                                [one_mile, five_miles, 20],
-                                                [five_miles, max_distance, 10]])
-    # Perform the reclassification and display it
-    outReclassRaster = arcpy.sa.Reclassify(bus_stops_distance_ras, "Value", transit_remap_range)
-    outReclassRaster.save(bus_score_ras)
-    arcpy.MakeRasterLayer_management(bus_score_ras, "bus_score_ras1")
 
-    # Clean up
-    remove_intermediary_layers(["bus_stops_orig","bus_stops_proj", "bus_stops_distance_ras1"])
+    if SAVE_DISTANCE_RASTERS_OPTION == "yes":
+        # Compute the Euclidean distance rasters to the trails and to the stops
+        compute_euclidean_distance_rasters([[circuit_trails, circuit_trails_distance_ras],
+                                            [rail_stops_proj2, rail_stops_distance_ras],
+                                            [trolley_stops_proj, trolley_stops_distance_ras],
+                                            [bus_stops_proj, bus_stops_distance_ras]])
+
+        # Reclassify the rasters based on chosen thresholds
+        circuit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 20],
+                                                    [one_mile, max_distance, 1]])
+        transit_remap_range = arcpy.sa.RemapRange([[0, one_mile , 1],
+                                                    [one_mile, five_miles, 20],
+                                                    [five_miles, max_distance, 10]])
+        # Perform the reclassifications
+        arcpy.CheckOutExtension("Spatial")
+        reclassify_distance_raster(circuit_trails_distance_ras, circuit_remap_range, circuit_trails_score_ras)
+        reclassify_distance_raster(rail_stops_distance_ras, transit_remap_range, rail_score_ras)
+        reclassify_distance_raster(trolley_stops_distance_ras, transit_remap_range, trolley_score_ras)
+        reclassify_distance_raster(bus_stops_distance_ras, transit_remap_range, bus_score_ras)
+    else:
+        # Compute the score rasters directly, with the same bands and scores as the remap ranges above
+        band_datasets = [[circuit_trails, [one_mile], [20, 1], circuit_trails_score_ras],
+                         [rail_stops_proj2, [one_mile, five_miles], [1, 20, 10], rail_score_ras],
+                         [trolley_stops_proj, [one_mile, five_miles], [1, 20, 10], trolley_score_ras],
+                         [bus_stops_proj, [one_mile, five_miles], [1, 20, 10], bus_score_ras]]
+        if INCREMENTAL_DISTANCE_SCORES_OPTION == "yes":
+            # Only recompute the scores within 5 miles (the last threshold) of the stops and
+            # trails that were added or removed since the previous run
+            update_band_score_rasters(band_datasets)
+        else:
+            compute_band_score_rasters(band_datasets)
+
+    # Display the score rasters
+    for score_ras in [circuit_trails_score_ras, rail_score_ras, trolley_score_ras, bus_score_ras]:
+        arcpy.MakeRasterLayer_management(score_ras, score_ras + "1")
 
 # Prepare the NATA Respiratory Hazards dataset
 def prep_nata_resp_dataset():
     # Local variables
-    ejscreen_orig = data_path + "\\XXXstop_gap.gdb\\Health_JSCREEN_Tract_DVRPC_9_Counties_proj"
 
     # Load the feature class and table into the MXD
     arcpy.MakeFeatureLayer_management(ejscreen_orig, "ejscreen_orig")
 
     # Clip to the boundaries of 4_counties_dissolved
-    arcpy.SpatialJoin_analysis(ejscreen_orig, "extent_4_counties", "ejscreen_clipped",
+    arcpy.SpatialJoin_analysis(ejscreen_orig, analysis_extent, "ejscreen_clipped",
                               "JOIN_ONE_TO_ONE", "KEEP_COMMON", match_option="HAVE_THEIR_CENTER_IN")
-    # Convert into a raster
-    arcpy.PolygonToRaster_conversion ("ejscreen_clipped", "RESP",
-                                          "nata_resp_ras")
+    # Convert into a raster, using the shared census tract label raster (matched on the tract id)
+    tract_field_to_raster("ejscreen_clipped", "ID", "RESP", "nata_resp_ras")
 
-    # reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice("nata_resp_ras", 20, "NATURAL_BREAKS")
-    outslice.save("nata_resp_score_ras")
+    # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
+    slice_natural_breaks("nata_resp_ras", 20, "nata_resp_score_ras")
     # Display the resulting raster
     arcpy.MakeRasterLayer_management("nata_resp_score_ras", "nata_resp_score_ras1")
 
@@ -373,15 +311,12 @@ def prep_nata_resp_dataset():
 
 # Prepare the Obesity Rate dataset
 def prep_obesity_dataset():
-    obesity_ras = data_path + "\\XXXstop_gap.gdb\\Obesity_PA_normalized_ras"
 
     # Display the raster
     arcpy.MakeRasterLayer_management(obesity_ras, "obesity_ras1")
 
-    # reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
-    arcpy.CheckOutExtension("Spatial")
-    outslice = arcpy.sa.Slice("obesity_ras1", 20, "NATURAL_BREAKS")
-    outslice.save("obesity_score_ras")
+    # Reclassify the raster to 1-to-20 score using the Jenks natural breaks classification
+    slice_natural_breaks(obesity_ras, 20, "obesity_score_ras")
     # Display the resulting raster (note that the tool demands a slightly different name for the layer)
     arcpy.MakeRasterLayer_management("obesity_score_ras", "obesity_score_ras1")
 
@@ -390,80 +325,125 @@ def prep_obesity_dataset():
 
 # Compute the intermediary Density Score raster
 def compute_density_scores():
-    # Compute score raster for density
-    total_ras = (arcpy.Raster("pop_density_score_ras1")*0.67 +
-                 arcpy.Raster("employment_score_ras1")*0.33)
-    total_ras.save("density_score_ras")
+    # Compute score raster for density (tile by tile). The scores of the prep stages are read
+    # from the output geodatabase, see pipeline.py
+    compute_weighted_sum_raster([[gdb_output_CII + "\\pop_density_score_ras", 0.67],
+                                 [gdb_output_CII + "\\employment_score_ras", 0.33]],
+                                "density_score_ras")
     # Display the new raster
     arcpy.MakeRasterLayer_management("density_score_ras", "density_score_ras1")
 
 # Compute the intermediary Transportation Score raster
 def compute_transportation_scores():
-    # Compute score raster for transit
-    total_ras = (arcpy.Raster("circuit_trails_score_ras1")*0.5 +
-                 arcpy.Raster("no_vehicle_score_ras1")*0.27 +
-                 arcpy.Raster("rail_score_ras1")*0.13 +
-                 arcpy.Raster("trolley_score_ras1")*0.07 +
-                 arcpy.Raster("bus_score_ras1")*0.03)
-    total_ras.save("transportation_score_ras")
+    # Compute score raster for transit (tile by tile)
+    compute_weighted_sum_raster([[gdb_output_CII + "\\circuit_trails_score_ras", 0.5],
+                                 [gdb_output_CII + "\\no_vehicle_score_ras", 0.27],
+                                 [gdb_output_CII + "\\rail_score_ras", 0.13],
+                                 [gdb_output_CII + "\\trolley_score_ras", 0.07],
+                                 [gdb_output_CII + "\\bus_score_ras", 0.03]],
+                                "transportation_score_ras")
     # Display the new raster
     arcpy.MakeRasterLayer_management("transportation_score_ras", "transportation_score_ras1")
 
 # Compute the intermediary Health Score raster
 def compute_health_scores():
-    # Compute score raster for health / environment
-    total_ras = (arcpy.Raster("obesity_score_ras1")*0.5 +
-                 arcpy.Raster("nata_resp_score_ras1")*0.5)
-    total_ras.save("health_score_ras")
+    # Compute score raster for health / environment (tile by tile)
+    compute_weighted_sum_raster([[gdb_output_CII + "\\obesity_score_ras", 0.5],
+                                 [gdb_output_CII + "\\nata_resp_score_ras", 0.5]],
+                                "health_score_ras")
     # Display the new raster
     arcpy.MakeRasterLayer_management("health_score_ras", "health_score_ras1")
 
 # Compute the Overall CII Score raster
 def compute_CII_overall_scores():
-    # Compute score raster for Community Impact Index (CII) overall scores
-    total_ras = (arcpy.Raster("ipd_score_ras1")*0.3 +
-                 arcpy.Raster("density_score_ras1")*0.3 +
-                 arcpy.Raster("transportation_score_ras1")*0.3 +
-                 arcpy.Raster("health_score_ras1")*0.1)
-    total_ras.save("cii_overall_score_ras")
+    # Compute score raster for Community Impact Index (CII) overall scores (tile by tile,
+    # the intermediary score rasters are read back from the tile store)
+    compute_weighted_sum_raster([[gdb_output_CII + "\\ipd_score_ras", 0.3],
+                                 [gdb_output_CII + "\\density_score_ras", 0.3],
+                                 [gdb_output_CII + "\\transportation_score_ras", 0.3],
+                                 [gdb_output_CII + "\\health_score_ras", 0.1]],
+                                "cii_overall_score_ras")
     # Display the new raster
     arcpy.MakeRasterLayer_management("cii_overall_score_ras", "cii_overall_score_ras1")
 
-# Prepare all the datasets
+# Display the score rasters (when the stages run in worker processes, the layers
+# they create do not show up in the mxd document)
+def display_score_rasters(score_rasters):
+    for score_ras in score_rasters:
+        arcpy.MakeRasterLayer_management(score_ras, score_ras + "1")
+
+# Set up a worker process running some of the stages below
+def set_up_stage_worker():
+    load_ancillary_layers()
+    set_up_env("CII")
+
+# Prep stages, with the datasets they read and write. The only dependencies between them
+# are the census tracts (prepared with the population density dataset, and used to rasterize
+# the other tract-based datasets), and the sources of the distance datasets.
+# The original datasets are listed as inputs too, so that the cache notices when they change.
+prep_stages = [
+    make_stage(prep_pop_density_dataset, [pa_census_tracts_orig, population_table_orig],
+               ["pa_census_tracts_clipped1", "pop_density_score_ras"]),
+    make_stage(prep_idp_dataset, [ipd_orig, census_tracts_clipped], ["ipd_score_ras"]),
+    make_stage(prep_employment_dataset, [employment_clipped], ["employment_score_ras"]),
+    make_stage(prep_circuit_trails_dataset, [circuit_trails_orig], ["circuit_trails"]),
+    make_stage(prep_0_vehicle_dataset, [commuting_table_orig, census_tracts_clipped],
+               ["no_vehicle_score_ras"]),
+    make_stage(prep_rail_dataset, [rail_stops_orig], ["rail_stops_proj2"]),
+    make_stage(prep_trolley_dataset, [trolley_stops_orig], ["trolley_stops_proj"]),
+    make_stage(prep_bus_dataset, [bus_stops_orig], ["bus_stops_proj"]),
+    make_stage(prep_distance_datasets,
+               ["circuit_trails", "rail_stops_proj2", "trolley_stops_proj", "bus_stops_proj"],
+               ["circuit_trails_score_ras", "rail_score_ras", "trolley_score_ras", "bus_score_ras"],
+               {"SAVE_DISTANCE_RASTERS_OPTION": SAVE_DISTANCE_RASTERS_OPTION}),
+    make_stage(prep_nata_resp_dataset, [ejscreen_orig, census_tracts_clipped], ["nata_resp_score_ras"]),
+    make_stage(prep_obesity_dataset, [obesity_ras], ["obesity_score_ras"])]
+
+# Aggregation stages: each intermediary score only needs a few of the prepared datasets
+aggregation_stages = [
+    make_stage(compute_density_scores, ["pop_density_score_ras", "employment_score_ras"],
+               ["density_score_ras"]),
+    make_stage(compute_transportation_scores,
+               ["circuit_trails_score_ras", "no_vehicle_score_ras", "rail_score_ras",
+                "trolley_score_ras", "bus_score_ras"],
+               ["transportation_score_ras"]),
+    make_stage(compute_health_scores, ["obesity_score_ras", "nata_resp_score_ras"], ["health_score_ras"]),
+    make_stage(compute_CII_overall_scores,
+               ["ipd_score_ras", "density_score_ras", "transportation_score_ras", "health_score_ras"],
+               ["cii_overall_score_ras"])]
+
+# Prepare all the datasets (the independent ones run in parallel)
 def prep_all_datasets():
-    prep_idp_dataset()
-    prep_pop_density_dataset()
-    prep_employment_dataset()
-    prep_circuit_trails_dataset()
-    prep_0_vehicle_dataset()
-    prep_rail_dataset()
-    prep_trolley_dataset()
-    prep_bus_dataset()
-    prep_nata_resp_dataset()
-    prep_obesity_dataset()
-
-# Compute all aggregated scores
+    run_stages(prep_stages, "community_impact_index", "set_up_stage_worker")
+    display_score_rasters(["ipd_score_ras", "pop_density_score_ras", "employment_score_ras",
+                           "circuit_trails_score_ras", "no_vehicle_score_ras", "rail_score_ras",
+                           "trolley_score_ras", "bus_score_ras", "nata_resp_score_ras", "obesity_score_ras"])
+
+# Compute all aggregated scores (the intermediary scores run in parallel)
 def compute_all_aggregated_scores():
-    compute_density_scores()
-    compute_transportation_scores()
-    compute_health_scores()
-    compute_CII_overall_scores()
+    # Start from an empty tile store, so that no raster from a previous run gets reused
+    clear_tile_store()
+    run_stages(aggregation_stages, "community_impact_index", "set_up_stage_worker")
+    display_score_rasters(["density_score_ras", "transportation_score_ras", "health_score_ras",
+                           "cii_overall_score_ras"])
 
-load_and_initiate():
+def load_and_initiate():
     load_ancillary_layers()
     set_up_env("CII")
     prep_gdb()
 
-preprocess_layers():
+def preprocess_layers():
     prep_all_datasets()
 
-generate_scores():
+def generate_scores():
     compute_all_aggregated_scores()
 
 # ***************************************
 # Begin Main
-print_time_stamp("Start")
-load_and_initiate()
-preprocess_layers()
-generate_scores()
-print_time_stamp("Done")
+# (only when the script is executed, not when the worker processes import it)
+if __name__ == "__main__":
+    print_time_stamp("Start")
+    load_and_initiate()
+    preprocess_layers()
+    generate_scores()
+    print_time_stamp("Done")
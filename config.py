@@ -18,6 +18,54 @@ REMOVE_INTERMEDIARY_LAYERS_OPTION = "yes" # or "no"
 # We have the option of computing everything from scratch or only recompute the final scores
 # (Note: only applies to roads.py and trails.py)
 COMPUTE_FROM_SCRATCH_OPTION = "no" # or "yes"
+# Should roads.py approximate the mean CII score in the 1 mile buffers around the LTS3 road segments
+# (fast, with the error reported on a sample of segments) instead of computing it exactly?
+FAST_BUFFER_MEANS_OPTION = "no" # or "yes"
+# Should the CII script save the full distance rasters to the trails and transit stops?
+# If not, the distance score rasters are computed directly from the distance bands.
+SAVE_DISTANCE_RASTERS_OPTION = "no" # or "yes"
+# Should the CII script only update the distance score rasters around the trails and stops that
+# were added or removed since the previous run? (only when the distance rasters are not saved)
+INCREMENTAL_DISTANCE_SCORES_OPTION = "no" # or "yes"
+# Should roads.py compute the connectivity of the LTS3 road segments (the number and length of the
+# LTS1-2 islands they join) from the network, instead of using the TOTAL attribute of the DVRPC shapefile?
+COMPUTE_CONNECTIVITY_OPTION = "no" # or "yes"
+# Should roads.py only buffer and score the LTS3 road segments that are new or changed since the
+# previous run (the scores of the other segments are kept in a persistent store)?
+INCREMENTAL_EDGE_SCORES_OPTION = "no" # or "yes"
+# Number of worker processes used by the steps that run in parallel (0 means one per core)
+NUM_OF_PROCESSES = 0
+# Memory budget (in MB) for the rasters processed tile by tile
+MEMORY_BUDGET_MB = 1024
+# Should the raster steps that only depend on their neighborhood be split into shards
+# (square tiles, or the counties of county_list) that run in parallel?
+# Only the distance band scores and the disk means of the approximate buffer means are sharded:
+# the other steps still run on the whole extent
+SHARDING_OPTION = "no" # or "tiles" or "counties"
+# Size (in cells) of the square tiles when SHARDING_OPTION is "tiles"
+# (also used to group the zones by tile for the parallel zonal statistics)
+SHARD_SIZE = 1024
+# Should the zonal statistics of the buffers (LTS3 road segments, islands) be computed in
+# parallel worker processes, with the zones sharded by spatial tile?
+PARALLEL_ZONAL_STATISTICS_OPTION = "no" # or "yes"
+# Should trails.py stream the non-circuit trails (geometry and name only) out of the kml file,
+# instead of converting it with arcpy.KMLToLayer_conversion()?
+STREAMING_KML_OPTION = "no" # or "yes"
+# Should trails.py join the trails to the islands within 50 meters with an in-memory grid index
+# of the island segments (in parallel), instead of arcpy.SpatialJoin_analysis()?
+INDEXED_PROXIMITY_JOIN_OPTION = "no" # or "yes"
+# Should the input datasets be reprojected to NAD 1983 UTM Zone 18N in one batch with numpy
+# (reprojection.py), instead of arcpy.Project_management()?
+BATCH_REPROJECTION_OPTION = "no" # or "yes"
+# Number of threads of the batch reprojection (the coordinates are transformed by chunks)
+NUM_OF_REPROJECTION_THREADS = 1
+# Port of the local scoring service for proposed alignments (scoring_service.py)
+SCORING_SERVICE_PORT = 8765
+# Should the expensive steps be served from the persistent cache when their inputs,
+# parameters and grid settings have not changed since a previous run?
+CACHE_OPTION = "yes" # or "no"
+# Maximum size (in MB) of the persistent cache (the least recently used entries are removed first)
+CACHE_MAX_SIZE_MB = 20480
 
 # *********
 # Set up global variables used in all scripts
@@ -27,10 +75,47 @@ common_util_path = data_path + "\\common_util.gdb"
 orig_datasets_path = data_path + "\\Orig_datasets"
 county_list = ["Delaware", "Montgomery", "Bucks", "Chester"]
 county_list1 = ["Delaware"]
+# Max overall trail score used to normalize the trail scores of a county, instead of the
+# max score of its trails (only for the counties listed)
+trail_max_overall_score_per_county = {"Delaware": 14.749317}
+# Extent of the analysis and boundaries of its counties (with the name of each county in the
+# field county_name_field). Point these to other layers to run the analysis on another region.
+analysis_extent = common_util_path + "\\extent_4_counties"
+county_boundaries = common_util_path + "\\boundaries_4_PA_counties"
+county_name_field = "CO_NAME"
 
 # Set up global variables used in the CII script
 gdb_output_CII_name = "\\script_output_CII3.gdb"
 gdb_output_CII = data_path + gdb_output_CII_name
+# Original datasets used in the CII script
+ipd_orig = orig_datasets_path + "\\CII\\DVRPC_2016_Indicators_of_Potential_Disadvantage\\DVRPC_2016_Indicators_of_Potential_Disadvantage.shp"
+pa_census_tracts_orig = orig_datasets_path + "\\CII\\ACS_2016_population_est\\tl_2016_42_tract\\tl_2016_42_tract.shp"
+population_table_orig = orig_datasets_path + "\\CII\\ACS_2016_population_est\\ACS_16_5YR_B01003\\ACS_16_5YR_B01003_with_ann.csv"
+employment_clipped = data_path + "\\XXXstop_gap.gdb\\Employment_BusinessPatternZip_with_pop_DVRPC_Counties"
+circuit_trails_orig = orig_datasets_path + "\\CII\\DVRPC_Circuit_Trails_20190328\\DVRPC_Circuit_Trails.shp"
+commuting_table_orig = orig_datasets_path + "\\CII\\Vehicle_available\\ACS_17_5YR_S0801\\ACS_17_5YR_S0801_with_ann.csv"
+rail_stops_orig = orig_datasets_path + "\\CII\\DVRPC_Passenger_Rail_Stations\\DVRPC_Passenger_Rail_Stations.shp"
+trolley_stops_orig = orig_datasets_path + "\\CII\\SEPTA__Trolley_Stops\\SEPTA__Trolley_Stops.shp"
+bus_stops_orig = orig_datasets_path + "\\CII\\SEPTA__Bus_Stops\\SEPTA__Bus_Stops.shp"
+ejscreen_orig = data_path + "\\XXXstop_gap.gdb\\Health_JSCREEN_Tract_DVRPC_9_Counties_proj"
+obesity_ras = data_path + "\\XXXstop_gap.gdb\\Obesity_PA_normalized_ras"
+# Census tracts rasterized once and shared by all the tract-based indicators
+census_tracts_clipped = gdb_output_CII + "\\pa_census_tracts_clipped1"
+# The tract label raster is kept outside of the output geodatabase, so that it survives between runs
+# (delete it to force the census tracts to be rasterized again)
+tract_labels_file = data_path + "\\tract_labels.npz"
+# Folder where the rasters processed tile by tile are stored as memory-mapped arrays
+tile_store_path = data_path + "\\tile_store"
+# Folder of the scratch geodatabases of the stages running in worker processes (see pipeline.py)
+stage_workspaces_path = data_path + "\\stage_workspaces"
+# Folder of the persistent cache of intermediary datasets (kept outside of the output
+# geodatabases, which are deleted by prep_gdb())
+cache_path = data_path + "\\cache"
+# Folder where the sources and distance scores of the previous run are kept for the incremental update
+distance_scores_state_path = data_path + "\\distance_scores_state"
+
+# Folder of the persistent store of the CII scores per LTS3 road segment, for the incremental rescoring
+edge_scores_path = data_path + "\\edge_scores"
 
 # Set up global variables used in roads.py script
 gdb_output_roads_name = "\\script_output_roads3.gdb"
@@ -0,0 +1,210 @@
+# ***************************************
+# ***Overview***
+# Script name: connectivity.py
+# Purpose: This Python module computes the connectivity of the LTS3 road segments in-house, instead of
+#          taking it from the attributes of the DVRPC shapefile (TOTAL, Top30percent, TOP10PERCENT).
+#          The LTS1-2 islands are the STRONG ids of the islands shapefile, as in trails.py (which
+#          dissolves them on STRONG): the length of an island is the total length of its parts.
+#          The end points of the island parts and of the LTS3 segments, snapped together by distance
+#          (with a vectorized union-find over the pairs of points within the snapping tolerance),
+#          are the nodes of the network. The islands found at every node are stored in compressed
+#          sparse row (CSR) form, and all the LTS3 segments are then evaluated in one batch: the
+#          islands found at their two end nodes are the islands they would join, and we add up
+#          their number and their length.
+#          This lets us recompute the connectivity of the whole region in seconds when the
+#          network or the definition of the islands changes.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from attribute_columns import *
+
+# Distance (in meters) under which two end points are the same node of the network
+node_snap_tolerance = 1.0
+# The islands shorter than this (in meters) are ignored, as in prep_islands() in trails.py
+min_island_length = 1000
+
+# *****************************************
+# Functions
+
+# Read the end points (first and last point of every part) and the length of the line segments of a
+# feature class, in the spatial reference of the analysis (islands_orig is in WGS 1984, so it is projected
+# on the fly with the same transformation as in trails.py). Returns the start points, the end points,
+# the lengths and the values of the other fields, one entry per part.
+def read_line_end_points(line_feature_class, fields=(), where_clause=None,
+                         spatial_reference=None):
+    if spatial_reference is None:
+        spatial_reference = arcpy.SpatialReference("NAD 1983 UTM Zone 18N")
+    previous_transformations = arcpy.env.geographicTransformations
+    arcpy.env.geographicTransformations = "WGS_1984_(ITRF00)_To_NAD_1983"
+    start_points = []
+    end_points = []
+    lengths = []
+    values = []
+    with arcpy.da.SearchCursor(line_feature_class, ["SHAPE@"] + list(fields), where_clause,
+                               spatial_reference) as cursor:
+        for row in cursor:
+            geometry = row[0]
+            if geometry is None:
+                continue
+            for part in geometry:
+                points = [point for point in part if point is not None]
+                if len(points) < 2:
+                    continue
+                start_points.append((points[0].X, points[0].Y))
+                end_points.append((points[-1].X, points[-1].Y))
+                coordinates = np.array([(point.X, point.Y) for point in points])
+                lengths.append(np.hypot(np.diff(coordinates[:, 0]), np.diff(coordinates[:, 1])).sum())
+                values.append(row[1:])
+    arcpy.env.geographicTransformations = previous_transformations
+    return (np.array(start_points, dtype=np.float64).reshape(-1, 2),
+            np.array(end_points, dtype=np.float64).reshape(-1, 2),
+            np.array(lengths, dtype=np.float64), values)
+
+# Find the connected components of a graph with a vectorized union-find: every edge hooks the root
+# of its larger end to the root of its smaller end, all the edges at once, then the paths to the roots
+# are compressed by pointer jumping, until both ends of every edge have the same root.
+# Returns the component (the smallest node id of the component) of every node.
+def find_connected_components(num_of_nodes, from_nodes, to_nodes):
+    parents = np.arange(num_of_nodes)
+    while True:
+        from_roots = parents[from_nodes]
+        to_roots = parents[to_nodes]
+        pending = from_roots != to_roots
+        if not pending.any():
+            return parents
+        lower_roots = np.minimum(from_roots[pending], to_roots[pending])
+        np.minimum.at(parents, from_roots[pending], lower_roots)
+        np.minimum.at(parents, to_roots[pending], lower_roots)
+        # Pointer jumping: point every node to its root
+        while True:
+            grand_parents = parents[parents]
+            if np.array_equal(grand_parents, parents):
+                break
+            parents = grand_parents
+
+# Expand ranges [firsts[i], firsts[i] + counts[i]) into one array of positions, with the range of every position
+def expand_ranges(firsts, counts):
+    ranges = np.repeat(np.arange(len(counts)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + firsts[ranges]
+    return ranges, positions
+
+# Find the pairs of points within a distance of each other (each pair once, i < j). The points are put
+# in a grid of cells of that size, so the pairs are among the points of the same or neighboring cells.
+def find_close_point_pairs(points, tolerance):
+    cells = np.floor(points / tolerance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    num_of_cols = cells[:, 0].max() + 2
+    keys = cells[:, 1] * num_of_cols + cells[:, 0]
+    order = np.argsort(keys, kind="mergesort")
+    sorted_keys = keys[order]
+    first_points = []
+    second_points = []
+    # The cell itself and 4 of its neighbors: each pair of neighboring cells is visited once
+    for row_offset, col_offset in [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]:
+        neighbor_keys = keys + row_offset * num_of_cols + col_offset
+        firsts = np.searchsorted(sorted_keys, neighbor_keys, side="left")
+        counts = np.searchsorted(sorted_keys, neighbor_keys, side="right") - firsts
+        pair_firsts, positions = expand_ranges(firsts, counts)
+        pair_seconds = order[positions]
+        if row_offset == 0 and col_offset == 0:
+            keep = pair_firsts < pair_seconds
+            pair_firsts, pair_seconds = pair_firsts[keep], pair_seconds[keep]
+        differences = points[pair_firsts] - points[pair_seconds]
+        is_close = np.hypot(differences[:, 0], differences[:, 1]) <= tolerance
+        first_points.append(pair_firsts[is_close])
+        second_points.append(pair_seconds[is_close])
+    return np.concatenate(first_points), np.concatenate(second_points)
+
+# Snap points to nodes: the points within the tolerance of each other (directly or through other
+# points) get the same node id. Returns the node id of every point and the number of nodes.
+def snap_points_to_nodes(points, tolerance=node_snap_tolerance):
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    first_points, second_points = find_close_point_pairs(points, tolerance)
+    components = find_connected_components(len(points), first_points, second_points)
+    unique_components, node_ids = np.unique(components, return_inverse=True)
+    return node_ids, len(unique_components)
+
+# Build the compressed sparse row (CSR) form of the incidence of nodes and islands: the islands found
+# at node i are islands[offsets[i]:offsets[i + 1]] (each island once per node)
+def build_csr_incidence(num_of_nodes, num_of_islands, nodes, islands):
+    pair_keys = np.unique(nodes * num_of_islands + islands)
+    offsets = np.zeros(num_of_nodes + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(pair_keys // num_of_islands, minlength=num_of_nodes))
+    return {"offsets": offsets, "islands": pair_keys % num_of_islands}
+
+# Compute the connectivity of line segments (e.g. the LTS3 segments) between islands, given by the
+# end points, the island id (STRONG) and the length of their parts. The islands shorter than min_length
+# in total are ignored. For each segment, the islands found at its two end nodes are the islands
+# it would join: returns their number and their total length, per segment.
+def compute_island_connectivity(island_start_points, island_end_points, island_ids, island_lengths,
+                                start_points, end_points, tolerance=node_snap_tolerance,
+                                min_length=min_island_length):
+    num_of_parts = len(island_start_points)
+    num_of_segments = len(start_points)
+    node_ids, num_of_nodes = snap_points_to_nodes(np.concatenate([island_start_points, island_end_points,
+                                                                  start_points, end_points]), tolerance)
+
+    # Islands: the parts grouped by island id, with the total length of every island
+    unique_ids, part_islands = np.unique(np.asarray(island_ids), return_inverse=True)
+    num_of_islands = max(len(unique_ids), 1)
+    island_total_lengths = np.bincount(part_islands, weights=island_lengths, minlength=num_of_islands)
+    part_islands = np.concatenate([part_islands, part_islands])
+    part_nodes = node_ids[:2 * num_of_parts]
+    is_kept = island_total_lengths[part_islands] >= min_length
+    incidence = build_csr_incidence(num_of_nodes, num_of_islands, part_nodes[is_kept], part_islands[is_kept])
+
+    # Evaluate all the segments at once: the islands at the start and end nodes of every segment
+    # (the first num_of_segments ends are the start points), each island once per segment
+    segment_nodes = node_ids[2 * num_of_parts:]
+    segment_ends, positions = expand_ranges(incidence["offsets"][segment_nodes],
+                                            np.diff(incidence["offsets"])[segment_nodes])
+    pair_keys = np.unique((segment_ends % num_of_segments) * num_of_islands + incidence["islands"][positions])
+    pair_segments = pair_keys // num_of_islands
+    num_of_islands_joined = np.bincount(pair_segments, minlength=num_of_segments)
+    length_of_islands_joined = np.bincount(pair_segments, weights=island_total_lengths[pair_keys % num_of_islands],
+                                           minlength=num_of_segments)
+    return num_of_islands_joined, length_of_islands_joined
+
+# Compute the connectivity of the LTS3 segments of a feature class between the LTS1-2 islands (the STRONG
+# ids > 0 of the island segments), and write it to the fields Num_of_Islands_Joined and Length_of_Islands_Joined
+# (the sum over the parts of each segment)
+def compute_lts3_connectivity(lts3_feature_class, islands_feature_class=islands_orig):
+    spatial_reference = arcpy.Describe(lts3_feature_class).spatialReference
+    island_start_points, island_end_points, island_lengths, island_values = \
+        read_line_end_points(islands_feature_class, ["STRONG"], "STRONG > 0", spatial_reference)
+    start_points, end_points, lengths, values = read_line_end_points(lts3_feature_class, ["OID@"],
+                                                                     None, spatial_reference)
+    num_of_islands_joined, length_of_islands_joined = compute_island_connectivity(
+        island_start_points, island_end_points, [value[0] for value in island_values], island_lengths,
+        start_points, end_points)
+    print(str(int((num_of_islands_joined >= 2).sum())) + " of " + str(len(start_points))
+          + " LTS3 segments join 2 islands")
+
+    # Add up the parts of every segment
+    object_ids, part_positions = np.unique(np.array([value[0] for value in values], dtype=np.int64),
+                                           return_inverse=True)
+    columns = {"Num_of_Islands_Joined": np.bincount(part_positions, weights=num_of_islands_joined,
+                                                    minlength=len(object_ids)),
+               "Length_of_Islands_Joined": np.bincount(part_positions, weights=length_of_islands_joined,
+                                                       minlength=len(object_ids))}
+    write_columns(lts3_feature_class, object_ids, columns, ["Num_of_Islands_Joined", "Length_of_Islands_Joined"])
+
+# Get the attribute of the scored LTS3 segments normalized into their Connectivity_Score: the length of
+# the islands joined with COMPUTE_CONNECTIVITY_OPTION, otherwise the TOTAL connectivity of the DVRPC shapefile
+def get_connectivity_attribute():
+    if COMPUTE_CONNECTIVITY_OPTION == "yes":
+        return "lts3_top30pct_Length_of_Islands_Joined"
+    return "lts3_top30pct_TOTAL"
@@ -0,0 +1,388 @@
+# ***************************************
+# ***Overview***
+# Script name: distance.py
+# Purpose: This Python module computes exact Euclidean distance rasters to point and line
+#          features (rail stops, trolley stops, bus stops, circuit trails), as a faster
+#          replacement for arcpy.sa.EucDistance(). The sources are rasterized on the grid
+#          defined by set_up_env(), then the distances are computed in linear time with the
+#          separable lower envelope algorithm of Felzenszwalb and Huttenlocher.
+#          Several layers can be processed in one batch, in parallel.
+#          The distance band scores can also be updated incrementally, only around the
+#          sources that were added or removed since the previous run.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import os
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from shards import *
+
+# *****************************************
+# Functions
+
+# Get the coordinates of points sampled along a polyline part, at most half a cell apart,
+# so that every cell crossed by the line gets at least one point
+def densify_line(points, step):
+    starts = points[:-1]
+    ends = points[1:]
+    lengths = np.hypot(ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1])
+    num_of_steps = np.maximum(np.ceil(lengths / step).astype(np.int64), 1)
+    segments = np.repeat(np.arange(len(num_of_steps)), num_of_steps)
+    fractions = ((np.arange(num_of_steps.sum()) - np.repeat(np.cumsum(num_of_steps) - num_of_steps, num_of_steps))
+                 / np.repeat(num_of_steps, num_of_steps).astype(np.float64))
+    samples = starts[segments] + (ends[segments] - starts[segments]) * fractions[:, None]
+    return np.vstack([samples, points[-1:]])
+
+# Get the coordinates of the vertices of a feature class (densified along the lines)
+def get_source_coordinates(feature_class, grid):
+    shape_type = arcpy.Describe(feature_class).shapeType
+    step = 0.5 * min(grid["cell_width"], grid["cell_height"])
+    coordinates = []
+    with arcpy.da.SearchCursor(feature_class, ["SHAPE@"]) as cursor:
+        for row in cursor:
+            geometry = row[0]
+            if geometry is None:
+                continue
+            if shape_type == "Point":
+                coordinates.append(np.array([[geometry.firstPoint.X, geometry.firstPoint.Y]]))
+                continue
+            for part in geometry:
+                points = np.array([(point.X, point.Y) for point in part if point is not None])
+                if len(points) == 0:
+                    continue
+                if shape_type in ["Polyline", "Polygon"] and len(points) > 1:
+                    points = densify_line(points, step)
+                coordinates.append(points)
+    if not coordinates:
+        return np.zeros((0, 2))
+    return np.concatenate(coordinates)
+
+# Convert x/y coordinates into the row and column of the cells containing them on the grid.
+# Coordinates outside of the grid are dropped.
+def get_cell_indices(coordinates, grid):
+    rows = np.floor((grid["y_max"] - coordinates[:, 1]) / grid["cell_height"]).astype(np.int64)
+    cols = np.floor((coordinates[:, 0] - grid["x_min"]) / grid["cell_width"]).astype(np.int64)
+    inside = (rows >= 0) & (rows < grid["n_rows"]) & (cols >= 0) & (cols < grid["n_cols"])
+    return rows[inside], cols[inside]
+
+# Rasterize the features of a feature class on the grid: True for the source cells
+def rasterize_sources(feature_class, grid):
+    sources = np.zeros((grid["n_rows"], grid["n_cols"]), dtype=bool)
+    rows, cols = get_cell_indices(get_source_coordinates(feature_class, grid), grid)
+    sources[rows, cols] = True
+    return sources
+
+# First pass: for every cell, get the squared distance to the nearest source cell in the same column
+def compute_column_squared_distances(sources, cell_height):
+    n_rows = sources.shape[0]
+    row_indices = np.arange(n_rows, dtype=np.float64)[:, None]
+    # Row of the nearest source above (or at) each cell, and below (or at) each cell
+    above = np.maximum.accumulate(np.where(sources, row_indices, -np.inf), axis=0)
+    below = np.minimum.accumulate(np.where(sources, row_indices, np.inf)[::-1], axis=0)[::-1]
+    row_distances = np.minimum(row_indices - above, below - row_indices) * cell_height
+    return row_distances * row_distances
+
+# Second pass: for every row, compute the lower envelope of the parabolas rooted at each cell
+# of the row, and sample it. All the rows are processed at once, one column at a time.
+# Returns, for every cell, min over p of ((q - p) * cell_width)^2 + column_distances[p].
+def compute_row_squared_distances(column_distances, cell_width):
+    n_rows, n_cols = column_distances.shape
+    squared_width = cell_width * cell_width
+    # Position of each parabola in the envelope of each row (v), the boundaries between
+    # the parabolas (z), and the index of the last parabola in the envelope (k)
+    v = np.zeros((n_rows, n_cols), dtype=np.int32)
+    z = np.full((n_rows, n_cols + 1), np.inf)
+    k = np.full(n_rows, -1, dtype=np.int64)
+
+    for q in range(n_cols):
+        f_q = column_distances[:, q]
+        rows = np.nonzero(np.isfinite(f_q))[0]
+        # Rows where this is the first parabola
+        first = rows[k[rows] < 0]
+        k[first] = 0
+        v[first, 0] = q
+        z[first, 0] = -np.inf
+        # Other rows: remove the parabolas hidden by the new one, then add it to the envelope
+        rows = rows[k[rows] >= 0]
+        rows = rows[v[rows, k[rows]] != q]
+        while rows.size:
+            p = v[rows, k[rows]]
+            s = (((f_q[rows] + squared_width * q * q) - (column_distances[rows, p] + squared_width * p * p))
+                 / (2.0 * squared_width * (q - p)))
+            hidden = s <= z[rows, k[rows]]
+            k[rows[hidden]] -= 1
+            kept = rows[~hidden]
+            k[kept] += 1
+            v[kept, k[kept]] = q
+            z[kept, k[kept]] = s[~hidden]
+            z[kept, k[kept] + 1] = np.inf
+            rows = rows[hidden]
+
+    # Sample the envelope of each row
+    squared_distances = np.full((n_rows, n_cols), np.inf)
+    rows = np.nonzero(k >= 0)[0]
+    current = np.zeros(rows.size, dtype=np.int64)
+    for q in range(n_cols):
+        # Move to the next parabola until q is within its boundaries
+        behind = z[rows, current + 1] < q
+        while behind.any():
+            current[behind] += 1
+            behind = z[rows, current + 1] < q
+        p = v[rows, current]
+        squared_distances[rows, q] = squared_width * (q - p) * (q - p) + column_distances[rows, p]
+    return squared_distances
+
+# Compute the exact Euclidean distance from every cell center to the nearest source cell center
+def compute_euclidean_distance(sources, cell_width, cell_height):
+    column_distances = compute_column_squared_distances(sources, cell_height)
+    return np.sqrt(compute_row_squared_distances(column_distances, cell_width)).astype(np.float32)
+
+# Worker function for the process pool (it only gets numpy arrays, no arcpy objects)
+def compute_euclidean_distance_worker(arguments):
+    sources, cell_width, cell_height = arguments
+    return compute_euclidean_distance(sources, cell_width, cell_height)
+
+# Compute the Euclidean distance arrays of several source feature classes in one batch.
+# The grid is set up once, the sources are rasterized, and the distance transforms
+# run in parallel (one worker process per layer, up to NUM_OF_PROCESSES).
+def compute_euclidean_distance_arrays(source_feature_classes, grid=None):
+    if grid is None:
+        grid = get_env_grid()
+    tasks = [(rasterize_sources(feature_class, grid), grid["cell_width"], grid["cell_height"])
+             for feature_class in source_feature_classes]
+    return map_in_process_pool(compute_euclidean_distance_worker, tasks), grid
+
+# Equivalent of arcpy.sa.EucDistance(source).save(distance_ras) for several layers at once.
+# distance_datasets is a list of [source feature class, output distance raster] pairs.
+def compute_euclidean_distance_rasters(distance_datasets):
+    distances, grid = compute_euclidean_distance_arrays([dataset[0] for dataset in distance_datasets])
+    for dataset, distance in zip(distance_datasets, distances):
+        distance[np.isinf(distance)] = np.nan
+        save_array_as_raster(distance, grid, dataset[1])
+
+# Build a grid index of source cells: the sources are sorted by the tile that contains them,
+# so that the sources of a row of tiles between two columns are a contiguous slice
+def build_source_tile_index(source_rows, source_cols, tile_size, n_tile_cols):
+    keys = (source_rows // tile_size) * n_tile_cols + source_cols // tile_size
+    order = np.argsort(keys, kind="mergesort")
+    return keys[order], source_rows[order], source_cols[order]
+
+# Get the sources located within a given number of tiles around a tile
+def get_nearby_sources(tile_index, tile_row, tile_col, tile_radius, n_tile_rows, n_tile_cols):
+    keys, source_rows, source_cols = tile_index
+    tile_rows = np.arange(max(tile_row - tile_radius, 0), min(tile_row + tile_radius, n_tile_rows - 1) + 1)
+    firsts = np.searchsorted(keys, tile_rows * n_tile_cols + max(tile_col - tile_radius, 0), side="left")
+    lasts = np.searchsorted(keys, tile_rows * n_tile_cols + min(tile_col + tile_radius, n_tile_cols - 1),
+                            side="right")
+    selected = np.concatenate([np.arange(first, last) for first, last in zip(firsts, lasts)])
+    return source_rows[selected], source_cols[selected]
+
+# Compute distance band scores directly from the source cells, without computing a full distance raster.
+# thresholds are the upper bounds of the bands in meters (in increasing order), and scores
+# the score of each band (one more than thresholds, the last one is for cells beyond the last threshold).
+# The grid is processed tile by tile: the distance from the tile center to the nearest source gives
+# bounds on the distance of every cell of the tile, which is enough to decide the band of the whole
+# tile most of the time. Only the tiles crossed by a band boundary are resolved cell by cell, and only
+# against the sources found in the neighboring tiles.
+def compute_band_scores(sources, cell_width, cell_height, thresholds, scores, tile_size=32):
+    n_rows, n_cols = sources.shape
+    n_tile_rows = (n_rows + tile_size - 1) // tile_size
+    n_tile_cols = (n_cols + tile_size - 1) // tile_size
+    bands = np.full((n_rows, n_cols), len(thresholds), dtype=np.uint8)
+    source_rows, source_cols = np.nonzero(sources)
+    if source_rows.size == 0:
+        return np.array(scores, dtype=np.uint8)[bands]
+    tile_index = build_source_tile_index(source_rows, source_cols, tile_size, n_tile_cols)
+    thresholds = np.array(thresholds, dtype=np.float64)
+    # Any source closer than the last threshold to a cell of a tile is within this number of tiles
+    tile_radius = int(np.ceil(thresholds[-1] / (tile_size * min(cell_width, cell_height)))) + 1
+
+    for tile_row in range(n_tile_rows):
+        first_row = tile_row * tile_size
+        last_row = min(first_row + tile_size, n_rows)
+        for tile_col in range(n_tile_cols):
+            first_col = tile_col * tile_size
+            last_col = min(first_col + tile_size, n_cols)
+            nearby_rows, nearby_cols = get_nearby_sources(tile_index, tile_row, tile_col, tile_radius,
+                                                          n_tile_rows, n_tile_cols)
+            if nearby_rows.size == 0:
+                continue
+
+            # Bounds on the distance to the nearest source for every cell of the tile
+            center_row = (first_row + last_row - 1) / 2.0
+            center_col = (first_col + last_col - 1) / 2.0
+            half_diagonal = 0.5 * np.hypot((last_row - first_row - 1) * cell_height,
+                                           (last_col - first_col - 1) * cell_width)
+            center_distances = np.hypot((nearby_rows - center_row) * cell_height,
+                                        (nearby_cols - center_col) * cell_width)
+            nearest = center_distances.min()
+            lower_bound = nearest - half_diagonal
+            upper_bound = nearest + half_diagonal
+
+            # Cheap band test: no threshold falls between the bounds
+            if not np.any((thresholds >= lower_bound) & (thresholds < upper_bound)):
+                bands[first_row:last_row, first_col:last_col] = np.sum(thresholds < lower_bound)
+                continue
+
+            # Otherwise, compute the exact distances of the tile cells to the sources that
+            # can be the nearest source of one of these cells
+            candidates = center_distances <= upper_bound + half_diagonal
+            cell_rows, cell_cols = np.mgrid[first_row:last_row, first_col:last_col]
+            row_offsets = (cell_rows.ravel()[:, None] - nearby_rows[candidates][None, :]) * cell_height
+            col_offsets = (cell_cols.ravel()[:, None] - nearby_cols[candidates][None, :]) * cell_width
+            nearest_squared = (row_offsets * row_offsets + col_offsets * col_offsets).min(axis=1)
+            tile_bands = np.sum(nearest_squared[:, None] > (thresholds * thresholds)[None, :], axis=1)
+            bands[first_row:last_row, first_col:last_col] = tile_bands.reshape(last_row - first_row,
+                                                                               last_col - first_col)
+    return np.array(scores, dtype=np.uint8)[bands]
+
+# Worker function for the process pool (it only gets numpy arrays, no arcpy objects)
+def compute_band_scores_worker(arguments):
+    return compute_band_scores(*arguments)
+
+# Compute distance band scores shard by shard, in parallel. A cell only needs the sources
+# within the last threshold to get its band, so the shards have a halo margin that wide.
+def compute_sharded_band_scores(sources, grid, thresholds, scores):
+    shards = get_shards(grid, get_halo_num_of_cells(max(thresholds), grid))
+    return run_sharded_function(compute_band_scores, [sources], shards,
+                                (grid["cell_width"], grid["cell_height"], thresholds, scores))
+
+# Compute the distance band score rasters of several source feature classes in one batch,
+# without computing the distance rasters (this gives the same result as arcpy.sa.EucDistance()
+# followed by arcpy.sa.Reclassify() with a RemapRange).
+# band_datasets is a list of [source feature class, thresholds, scores, output score raster].
+# With SHARDING_OPTION, each layer is split into shards with a halo margin as wide as the last threshold.
+def compute_band_score_rasters(band_datasets, grid=None):
+    if grid is None:
+        grid = get_env_grid()
+    tasks = [(rasterize_sources(dataset[0], grid), grid["cell_width"], grid["cell_height"],
+              dataset[1], dataset[2]) for dataset in band_datasets]
+    if SHARDING_OPTION == "no":
+        band_scores = map_in_process_pool(compute_band_scores_worker, tasks)
+    else:
+        band_scores = [compute_sharded_band_scores(task[0], grid, task[3], task[4]) for task in tasks]
+    for dataset, scores in zip(band_datasets, band_scores):
+        save_array_as_raster(scores, grid, dataset[3], 0)
+
+# Get the path of the file keeping the sources and scores of a distance score raster between runs
+def get_distance_scores_state_path(score_ras):
+    return os.path.join(distance_scores_state_path, score_ras.split("\\")[-1] + ".npz")
+
+# Load the sources and scores saved by the previous run for a distance score raster.
+# Returns None if there are none, or if they were computed on another grid or with other bands.
+def load_distance_scores_state(score_ras, grid, thresholds, scores):
+    state_path = get_distance_scores_state_path(score_ras)
+    if not os.path.exists(state_path):
+        return None
+    state = np.load(state_path)
+    if not (np.array_equal(state["grid_signature"], get_grid_signature(grid))
+            and np.array_equal(state["thresholds"], np.array(thresholds, dtype=np.float64))
+            and np.array_equal(state["scores"], np.array(scores, dtype=np.uint8))):
+        return None
+    return state["sources"], state["band_scores"]
+
+# Save the sources and scores of a distance score raster for the next run
+def save_distance_scores_state(score_ras, grid, thresholds, scores, sources, band_scores):
+    if not os.path.exists(distance_scores_state_path):
+        os.makedirs(distance_scores_state_path)
+    np.savez_compressed(get_distance_scores_state_path(score_ras), sources=sources, band_scores=band_scores,
+                        grid_signature=get_grid_signature(grid),
+                        thresholds=np.array(thresholds, dtype=np.float64),
+                        scores=np.array(scores, dtype=np.uint8))
+
+# Get the windows (first row, last row, first col, last col) around the changed source cells
+# where the scores can change: within radius cells of a changed source cell.
+# Overlapping windows are merged.
+def get_changed_windows(changed_rows, changed_cols, radius, n_rows, n_cols):
+    windows = [[max(row - radius, 0), min(row + radius + 1, n_rows),
+                max(col - radius, 0), min(col + radius + 1, n_cols)]
+               for row, col in zip(changed_rows.tolist(), changed_cols.tolist())]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(windows)):
+            for j in range(len(windows) - 1, i, -1):
+                first, second = windows[i], windows[j]
+                if (first[0] < second[1] and second[0] < first[1]
+                        and first[2] < second[3] and second[2] < first[3]):
+                    windows[i] = [min(first[0], second[0]), max(first[1], second[1]),
+                                  min(first[2], second[2]), max(first[3], second[3])]
+                    del windows[j]
+                    merged = True
+    return windows
+
+# Update distance band scores after some sources were added or removed. The nearest source of a cell
+# can only have changed in a way that moves it to another band if an added or removed source is
+# closer to it than the last threshold, so only the windows within that distance of the changed
+# source cells are recomputed (against the sources within that distance of the windows).
+# Returns the updated scores and the windows that were recomputed.
+def update_band_scores(sources, old_sources, old_band_scores, cell_width, cell_height,
+                       thresholds, scores, tile_size=32):
+    n_rows, n_cols = sources.shape
+    changed_rows, changed_cols = np.nonzero(sources != old_sources)
+    radius = int(np.ceil(max(thresholds) / min(cell_width, cell_height))) + 1
+    band_scores = old_band_scores.copy()
+    windows = get_changed_windows(changed_rows, changed_cols, radius, n_rows, n_cols)
+    for first_row, last_row, first_col, last_col in windows:
+        # The sources that can be within the last threshold of a cell of the window
+        source_first_row = max(first_row - radius, 0)
+        source_first_col = max(first_col - radius, 0)
+        window_sources = sources[source_first_row:min(last_row + radius, n_rows),
+                                 source_first_col:min(last_col + radius, n_cols)]
+        window_scores = compute_band_scores(window_sources, cell_width, cell_height, thresholds, scores, tile_size)
+        band_scores[first_row:last_row, first_col:last_col] = \
+            window_scores[first_row - source_first_row:last_row - source_first_row,
+                          first_col - source_first_col:last_col - source_first_col]
+    return band_scores, windows
+
+# Worker function for the process pool (it only gets numpy arrays, no arcpy objects).
+# Without saved scores from the previous run, all the scores are computed.
+def update_band_scores_worker(arguments):
+    sources, state, cell_width, cell_height, thresholds, scores = arguments
+    if state is None:
+        return compute_band_scores(sources, cell_width, cell_height, thresholds, scores), None
+    return update_band_scores(sources, state[0], state[1], cell_width, cell_height, thresholds, scores)
+
+# Write the recomputed windows into an existing score raster, without rewriting the rest of it
+def patch_score_raster(band_scores, windows, grid, score_ras):
+    for i, (first_row, last_row, first_col, last_col) in enumerate(windows):
+        window_grid = get_window_grid(grid, first_row, last_row, first_col, last_col)
+        patch_raster = os.path.join(arcpy.env.scratchFolder,
+                                    score_ras.split("\\")[-1] + "_patch" + str(i) + ".tif")
+        save_array_as_raster(band_scores[first_row:last_row, first_col:last_col], window_grid, patch_raster, 0,
+                             with_statistics=False)
+        arcpy.Mosaic_management(patch_raster, score_ras, "LAST")
+        arcpy.Delete_management(patch_raster)
+
+# Same as compute_band_score_rasters(), but only the scores around the sources that were added or removed
+# since the previous run are recomputed, and patched into the score rasters if they already exist.
+# The sources and scores are saved for the next run.
+def update_band_score_rasters(band_datasets, grid=None):
+    if grid is None:
+        grid = get_env_grid()
+    tasks = []
+    for source_feature_class, thresholds, scores, score_ras in band_datasets:
+        tasks.append((rasterize_sources(source_feature_class, grid),
+                      load_distance_scores_state(score_ras, grid, thresholds, scores),
+                      grid["cell_width"], grid["cell_height"], thresholds, scores))
+    results = map_in_process_pool(update_band_scores_worker, tasks)
+    for dataset, task, (band_scores, windows) in zip(band_datasets, tasks, results):
+        score_ras = dataset[3]
+        if windows is not None and arcpy.Exists(score_ras):
+            print("Update " + score_ras.split("\\")[-1] + ": " + str(int((task[0] != task[1][0]).sum()))
+                  + " changed source cells, " + str(len(windows)) + " windows")
+            patch_score_raster(band_scores, windows, grid, score_ras)
+            save_array_statistics(band_scores, score_ras, 0)
+        else:
+            save_array_as_raster(band_scores, grid, score_ras, 0)
+        save_distance_scores_state(score_ras, grid, dataset[1], dataset[2], task[0], band_scores)
@@ -0,0 +1,129 @@
+# ***************************************
+# ***Overview***
+# Script name: edge_scores.py
+# Purpose: This Python module keeps a persistent store of the CII scores of the LTS3 road segments,
+#          so that an update of the LTS3 connections shapefile only rescores what changed.
+#          Every segment is stored under its EDGE id with a hash of its geometry, and the whole store
+#          is tagged with a version of the CII raster (a hash of its cells) and the buffer distance.
+#          On a new run, only the segments that are new or whose geometry changed are buffered and
+#          scored (all of them if the CII raster or the buffer distance changed); the scores of the
+#          other segments come from the store.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import hashlib
+import os
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from zonal_statistics import *
+from cache import *
+
+# *****************************************
+# Functions
+
+# Get the path of the score store of a zonal table
+def get_edge_scores_store_path(out_table):
+    return os.path.join(edge_scores_path, out_table.split("\\")[-1] + ".npz")
+
+# Get the version of a raster: the hash of its cells and grid
+def get_raster_version(raster):
+    hasher = hashlib.sha1()
+    hash_dataset(raster, hasher)
+    return hasher.hexdigest()
+
+# Get the hash of the geometries of an edge (the order of its segments does not matter)
+def get_geometry_hash(geometries):
+    hasher = hashlib.sha1()
+    for geometry_hash in sorted([hashlib.sha1(bytes(geometry.WKB)).hexdigest() for geometry in geometries]):
+        hasher.update(geometry_hash.encode("utf-8"))
+    return hasher.hexdigest()
+
+# Read the geometries of the line segments of a feature class, grouped by edge id
+def read_edge_geometries(line_feature_class, edge_field):
+    edge_geometries = {}
+    with arcpy.da.SearchCursor(line_feature_class, [edge_field, "SHAPE@"]) as cursor:
+        for edge, geometry in cursor:
+            if geometry is not None:
+                edge_geometries.setdefault(edge, []).append(geometry)
+    return edge_geometries
+
+# Load the score store: a dictionary edge id -> [geometry hash, count, sum], or an empty
+# dictionary if there is no store yet, or if it was computed on another raster version or buffer distance
+def load_edge_scores_store(out_table, raster_version, buffer_distance):
+    store_path = get_edge_scores_store_path(out_table)
+    if not os.path.exists(store_path):
+        return {}
+    store = np.load(store_path)
+    if str(store["raster_version"]) != raster_version or float(store["buffer_distance"]) != buffer_distance:
+        print("The CII raster or the buffer distance changed: all the segments are rescored")
+        return {}
+    return dict((edge.item(), [str(geometry_hash), int(count), float(total)])
+                for edge, geometry_hash, count, total
+                in zip(store["edges"], store["geometry_hashes"], store["counts"], store["sums"]))
+
+# Save the score store for the next run
+def save_edge_scores_store(out_table, raster_version, buffer_distance, edge_scores, edge_dtype):
+    if not os.path.exists(edge_scores_path):
+        os.makedirs(edge_scores_path)
+    edges = sorted(edge_scores)
+    np.savez_compressed(get_edge_scores_store_path(out_table),
+                        edges=np.array(edges, dtype=edge_dtype),
+                        geometry_hashes=np.array([edge_scores[edge][0] for edge in edges]),
+                        counts=np.array([edge_scores[edge][1] for edge in edges], dtype=np.int64),
+                        sums=np.array([edge_scores[edge][2] for edge in edges], dtype=np.float64),
+                        raster_version=np.array(raster_version),
+                        buffer_distance=np.array(buffer_distance, dtype=np.float64))
+
+# Buffer the line segments of some edges and compute the count and sum of the raster values in their buffers
+# (as compute_overlapping_zonal_statistics(), in parallel with PARALLEL_ZONAL_STATISTICS_OPTION)
+def compute_edge_zone_sums(edge_geometries, edges, value_raster, buffer_distance):
+    zones = [[edge, get_polygon_rings(geometry.buffer(buffer_distance))]
+             for edge in edges for geometry in edge_geometries[edge]]
+    if PARALLEL_ZONAL_STATISTICS_OPTION == "yes":
+        return compute_parallel_zone_sums(zones, value_raster)
+    values, grid = read_raster_as_array(value_raster)
+    counts = {}
+    sums = {}
+    accumulate_zone_sums(values, grid, zones, counts, sums)
+    return counts, sums, grid
+
+# Equivalent of buffering the line segments and running zonal_statistics_as_table() on the buffers,
+# that only buffers and scores the edges that are new or changed since the previous run
+def incremental_buffer_zonal_statistics_as_table(line_feature_class, edge_field, value_raster,
+                                                 buffer_distance, out_table):
+    raster_version = get_raster_version(value_raster)
+    stored_scores = load_edge_scores_store(out_table, raster_version, buffer_distance)
+    edge_geometries = read_edge_geometries(line_feature_class, edge_field)
+    geometry_hashes = dict((edge, get_geometry_hash(edge_geometries[edge])) for edge in edge_geometries)
+    changed_edges = [edge for edge in edge_geometries
+                     if edge not in stored_scores or stored_scores[edge][0] != geometry_hashes[edge]]
+    print(str(len(changed_edges)) + " new or changed segments rescored, "
+          + str(len(edge_geometries) - len(changed_edges)) + " segments taken from the score store")
+
+    # Keep the scores of the unchanged edges (the edges no longer in the feature class are dropped)
+    changed_edge_set = set(changed_edges)
+    edge_scores = dict((edge, stored_scores[edge]) for edge in edge_geometries if edge not in changed_edge_set)
+    if changed_edges:
+        counts, sums, grid = compute_edge_zone_sums(edge_geometries, changed_edges, value_raster, buffer_distance)
+        # The edges without any valid cell are stored too, so that they are not rescored next time
+        for edge in changed_edges:
+            edge_scores[edge] = [geometry_hashes[edge], counts.get(edge, 0), sums.get(edge, 0.0)]
+    else:
+        grid = get_raster_grid(value_raster)
+    edge_dtype = arcpy.da.FeatureClassToNumPyArray(line_feature_class, [edge_field]).dtype[0]
+    save_edge_scores_store(out_table, raster_version, buffer_distance, edge_scores, edge_dtype)
+
+    cell_area = grid["cell_width"] * grid["cell_height"]
+    zonal_stats = dict((edge, [count, count * cell_area, total / count])
+                       for edge, (geometry_hash, count, total) in edge_scores.items() if count > 0)
+    save_zonal_statistics_table(zonal_stats, edge_field, edge_dtype, out_table)
@@ -0,0 +1,128 @@
+# ***************************************
+# ***Overview***
+# Script name: kml_reader.py
+# Purpose: This Python module reads the line features of a KML file (e.g. Non_Circuit_Trails.kml) as a
+#          stream, instead of converting the whole file with arcpy.KMLToLayer_conversion() (which builds
+#          a layer package on disk, with many fields we delete right after).
+#          The file is parsed incrementally (iterparse): each Placemark is processed as soon as it has
+#          been read and then discarded, so no document tree is ever built. Only the coordinates of its
+#          LineStrings and its name are kept, in a compact coordinate array with part and feature offsets.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import array
+import os
+import numpy as np
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+# Import local modules:
+from config import *
+
+# KML elements that contain the Placemarks
+container_tags = ["kml", "Document", "Folder"]
+
+# *****************************************
+# Functions
+
+# Get the name of an XML tag without its namespace
+def get_local_tag(tag):
+    return tag.rsplit("}", 1)[-1]
+
+# Parse the text of a KML coordinates element ("lon,lat[,alt] lon,lat[,alt] ...") into an (n, 2) array
+def parse_kml_coordinates(text):
+    tuples = text.split()
+    if not tuples:
+        return np.zeros((0, 2))
+    values = np.array(",".join(tuples).split(","), dtype=np.float64)
+    return values.reshape(len(tuples), -1)[:, :2]
+
+# Read the LineStrings of the Placemarks of a KML file, streaming through the file.
+# Returns a dictionary with:
+#   "coordinates": the (n, 2) array of the longitudes and latitudes of all the vertices,
+#   "part_offsets": the vertices of part i are coordinates[part_offsets[i]:part_offsets[i + 1]],
+#   "feature_offsets": the parts of feature j are the parts feature_offsets[j] to feature_offsets[j + 1] - 1,
+#   "names": the name of every feature.
+# The Placemarks without any LineString (e.g. points) are skipped.
+def read_kml_lines(kml_file):
+    coordinates = array.array("d")
+    part_offsets = array.array("l", [0])
+    feature_offsets = array.array("l", [0])
+    names = []
+    name = None
+    in_line_string = False
+    # Elements being read (from the root down to the current element)
+    open_elements = []
+    for event, element in ElementTree.iterparse(kml_file, events=("start", "end")):
+        tag = get_local_tag(element.tag)
+        if event == "start":
+            open_elements.append(element)
+            if tag == "Placemark":
+                name = None
+            elif tag == "LineString":
+                in_line_string = True
+            continue
+        open_elements.pop()
+        if tag == "name" and name is None:
+            name = element.text
+        elif tag == "coordinates" and in_line_string:
+            points = parse_kml_coordinates(element.text or "")
+            if len(points) > 0:
+                coordinates.extend(points.ravel())
+                part_offsets.append(len(coordinates) // 2)
+        elif tag == "LineString":
+            in_line_string = False
+        elif tag == "Placemark":
+            if len(part_offsets) - 1 > feature_offsets[-1]:
+                feature_offsets.append(len(part_offsets) - 1)
+                names.append(name)
+        # Once read, the elements directly under a container (e.g. a Placemark or a Style under a
+        # Folder) are discarded, so that the memory stays flat however big the file is
+        if tag not in container_tags and open_elements and get_local_tag(open_elements[-1].tag) in container_tags:
+            open_elements[-1].remove(element)
+    return {"coordinates": np.frombuffer(coordinates, dtype=np.float64).reshape(-1, 2),
+            "part_offsets": np.frombuffer(part_offsets, dtype=part_offsets.typecode).astype(np.int64),
+            "feature_offsets": np.frombuffer(feature_offsets, dtype=feature_offsets.typecode).astype(np.int64),
+            "names": names}
+
+# Get the parts of feature j of lines read by read_kml_lines(), as a list of (n, 2) arrays
+def get_kml_feature_parts(lines, j):
+    part_offsets = lines["part_offsets"]
+    return [lines["coordinates"][part_offsets[i]:part_offsets[i + 1]]
+            for i in range(lines["feature_offsets"][j], lines["feature_offsets"][j + 1])]
+
+# Write lines read by read_kml_lines() to a new polyline feature class, with a Name field
+# (the coordinates are in WGS 1984, or in the spatial reference given)
+def save_kml_lines_as_feature_class(lines, out_feature_class, spatial_reference=None):
+    if spatial_reference is None:
+        spatial_reference = arcpy.SpatialReference(4326)
+    out_path = out_feature_class
+    if "\\" not in out_path:
+        out_path = os.path.join(arcpy.env.workspace, out_feature_class)
+    if arcpy.Exists(out_path):
+        arcpy.Delete_management(out_path)
+    arcpy.CreateFeatureclass_management(os.path.dirname(out_path), os.path.basename(out_path), "POLYLINE",
+                                        spatial_reference=spatial_reference)
+    arcpy.AddField_management(out_path, "Name", "TEXT", field_length=255)
+    with arcpy.da.InsertCursor(out_path, ["SHAPE@", "Name"]) as cursor:
+        for j in range(len(lines["names"])):
+            parts = arcpy.Array([arcpy.Array([arcpy.Point(x, y) for x, y in part])
+                                 for part in get_kml_feature_parts(lines, j)])
+            cursor.insertRow([arcpy.Polyline(parts, spatial_reference), lines["names"][j]])
+
+# Equivalent of arcpy.KMLToLayer_conversion() for the line features of a KML file, keeping only their
+# geometry and name, written directly to a feature class
+def kml_lines_to_feature_class(kml_file, out_feature_class):
+    lines = read_kml_lines(kml_file)
+    print(str(len(lines["names"])) + " lines and " + str(len(lines["coordinates"])) + " vertices read from "
+          + os.path.basename(kml_file))
+    save_kml_lines_as_feature_class(lines, out_feature_class)
@@ -0,0 +1,65 @@
+# ***************************************
+# ***Overview***
+# Script name: partitions.py
+# Purpose: This Python module splits a scored feature class into one feature class per group
+#          (e.g. per county) in a single pass: the features are read once and routed to their
+#          group, the max score of every group is computed in memory, and each group is written
+#          with its score normalized by that max. This replaces, for every county, a selection,
+#          a copy, a get_max() scan and an arcpy.CalculateField_management() pass.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import numpy as np
+
+# Import local modules:
+from config import *
+from ranking import *
+
+# *****************************************
+# Functions
+
+# Route the rows to their group (the rows of other groups are dropped)
+def partition_rows(rows, group_index, groups):
+    partitions = dict((group, []) for group in groups)
+    for row in rows:
+        group = row[group_index]
+        if group in partitions:
+            partitions[group].append(row)
+    return partitions
+
+# Split a feature class into one feature class per group of group_field (out_name_format is
+# formatted with the group, e.g. "lts3_with_cii_scores_{0}"), and add to each the field norm_field:
+# score_field normalized by its max in the group, so that each group has a max value that is a true 20.
+# max_overrides is a dictionary group -> max score to use instead of the max of the group.
+# Returns the dictionary group -> max score used.
+def write_normalized_partitions(in_feature_class, group_field, groups, out_name_format, score_field,
+                                norm_field, max_overrides=None, scale=20):
+    fields, rows = read_feature_rows(in_feature_class)
+    score_index = fields.index(score_field) + 1
+    partitions = partition_rows(rows, fields.index(group_field) + 1, groups)
+    max_scores = {}
+    for group in groups:
+        scores = np.array([np.nan if row[score_index] is None else row[score_index]
+                           for row in partitions[group]], dtype=np.float64)
+        if max_overrides and group in max_overrides:
+            max_scores[group] = max_overrides[group]
+        elif np.isnan(scores).all():
+            max_scores[group] = None
+        else:
+            max_scores[group] = float(np.nanmax(scores))
+        print(out_name_format.format(group) + ": max " + score_field + " = " + str(max_scores[group]))
+        if max_scores[group]:
+            norm_scores = scores / float(max_scores[group]) * scale
+        else:
+            norm_scores = np.full(len(scores), np.nan)
+        write_features(out_name_format.format(group), in_feature_class, fields,
+                       [list(row) + [None if np.isnan(norm_score) else float(norm_score)]
+                        for row, norm_score in zip(partitions[group], norm_scores)],
+                       [[norm_field, "DOUBLE"]])
+    return max_scores
@@ -0,0 +1,188 @@
+# ***************************************
+# ***Overview***
+# Script name: pipeline.py
+# Purpose: This Python module runs the steps (stages) of a script as a dependency graph.
+#          Each stage declares the datasets it reads (inputs) and writes (outputs), and
+#          a stage depends on the stages that write its inputs. Stages whose dependencies
+#          are done run at the same time in a pool of worker processes, so the total time
+#          is close to the longest chain of dependent stages instead of the sum of all stages.
+#          Every stage runs through the persistent cache (see cache.py), keyed on its inputs.
+#          In a worker process, a stage writes into its own scratch geodatabase, and its outputs
+#          are copied into the output geodatabase by the main process once the stage is done
+#          (so that the stages running at the same time never write to the same geodatabase).
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import modules:
+import arcpy
+import importlib
+import multiprocessing
+import os
+import time
+
+# Import local modules:
+from config import *
+from utilities import *
+from cache import *
+
+# *****************************************
+# Functions
+
+# Create a stage: a function of a script module, with the datasets it reads and writes,
+# and the parameters (config options) that change its outputs.
+# The outputs are dataset names: the stage writes them in the current workspace (its scratch
+# geodatabase in a worker process). The inputs are names or full paths: the stage reads the
+# outputs of the other stages from the output geodatabase, by their full path.
+def make_stage(function, inputs, outputs, parameters=None):
+    return {"name": function.__name__, "function": function,
+            "inputs": list(inputs), "outputs": list(outputs), "parameters": parameters}
+
+# Get the full path of a dataset given by name in a workspace (or already given by its path)
+def get_workspace_path(dataset, workspace):
+    if "\\" in dataset:
+        return dataset
+    return workspace + "\\" + dataset
+
+# Get the dependencies of every stage: the stages that write at least one of its inputs
+# (in the output geodatabase, the workspace). Inputs that are not written by any stage
+# are original datasets.
+def get_stage_dependencies(stages, workspace):
+    writers = {}
+    for stage in stages:
+        for output in stage["outputs"]:
+            writers[get_workspace_path(output, workspace)] = stage["name"]
+    dependencies = {}
+    for stage in stages:
+        input_paths = [get_workspace_path(dataset, workspace) for dataset in stage["inputs"]]
+        dependencies[stage["name"]] = set([writers[path] for path in input_paths
+                                           if path in writers and writers[path] != stage["name"]])
+    return dependencies
+
+# Get an order in which the stages can run one after the other
+def get_stage_order(stages, workspace):
+    dependencies = get_stage_dependencies(stages, workspace)
+    order = []
+    done = set()
+    while len(order) < len(stages):
+        ready = [stage for stage in stages
+                 if stage["name"] not in done and dependencies[stage["name"]] <= done]
+        if not ready:
+            raise RuntimeError("Circular dependency between the stages: "
+                               + str(sorted(set(dependencies) - done)))
+        for stage in ready:
+            order.append(stage)
+            done.add(stage["name"])
+    return order
+
+# Initialize a worker process: import the script module and set up its environment once
+def initialize_stage_worker(module_name, set_up_function_name):
+    module = importlib.import_module(module_name)
+    getattr(module, set_up_function_name)()
+
+# Run one stage through the cache, and return its elapsed time and cache status
+def run_stage(function, stage):
+    start_time = time.time()
+    cache_status = run_cached_function(function, stage["inputs"], stage["outputs"], stage["parameters"])
+    return time.time() - start_time, cache_status
+
+# Get the scratch geodatabase of a stage running in a worker process
+def get_stage_workspace(stage_name):
+    return stage_workspaces_path + "\\" + stage_name + ".gdb"
+
+# Create an empty scratch geodatabase for a stage (the one of a previous run is removed)
+def create_stage_workspace(stage_name):
+    stage_workspace = get_stage_workspace(stage_name)
+    if arcpy.Exists(stage_workspace):
+        arcpy.Delete_management(stage_workspace)
+    if not os.path.exists(stage_workspaces_path):
+        os.makedirs(stage_workspaces_path)
+    arcpy.CreateFileGDB_management(stage_workspaces_path, stage_name + ".gdb")
+    return stage_workspace
+
+# Run one stage in a worker process, in its own scratch geodatabase. The function is passed
+# by name, as the functions of the script may not be importable under the name they had
+# in the main process.
+def run_stage_worker(arguments):
+    module_name, function_name, stage = arguments
+    arcpy.env.workspace = create_stage_workspace(stage["name"])
+    return run_stage(getattr(importlib.import_module(module_name), function_name), stage)
+
+# Copy the outputs of a stage from its scratch geodatabase into the output geodatabase
+# (the workspace of the main process)
+def copy_stage_outputs(stage, workspace):
+    stage_workspace = get_stage_workspace(stage["name"])
+    for output in stage["outputs"]:
+        output_path = get_workspace_path(output, workspace)
+        if arcpy.Exists(output_path):
+            arcpy.Delete_management(output_path)
+        arcpy.Copy_management(get_workspace_path(output, stage_workspace), output_path)
+
+# Get a copy of a stage that can be sent to a worker process (without the function).
+# Its inputs are given by their full path, as the worker runs it in another workspace.
+def get_stage_description(stage, workspace):
+    description = dict((key, stage[key]) for key in stage if key != "function")
+    description["inputs"] = [get_workspace_path(dataset, workspace) for dataset in stage["inputs"]]
+    return description
+
+# Run the stages in dependency order, with the current workspace as the output geodatabase.
+# With more than one process, the ready stages run in parallel in a pool of worker processes,
+# each initialized with set_up_function_name() from the module_name script module.
+# With a single process (or within a worker process, which cannot start processes of its own),
+# they run one after the other, directly in the output geodatabase.
+def run_stages(stages, module_name, set_up_function_name, num_of_processes=NUM_OF_PROCESSES):
+    workspace = arcpy.env.workspace
+    # Fail early if the dependency graph has a cycle
+    order = get_stage_order(stages, workspace)
+    if num_of_processes <= 0:
+        num_of_processes = multiprocessing.cpu_count()
+    cache_statuses = {}
+    if num_of_processes == 1 or len(stages) == 1 or is_worker_process():
+        for stage in order:
+            print_time_stamp(stage["name"])
+            # The inputs are given by their full path, as in the worker processes
+            # (so that the cache keys do not depend on the number of processes)
+            cache_statuses[stage["name"]] = run_stage(stage["function"],
+                                                      get_stage_description(stage, workspace))[1]
+        print_cache_report(cache_statuses)
+        return
+
+    dependencies = get_stage_dependencies(stages, workspace)
+    pending = dict((stage["name"], stage) for stage in stages)
+    running = {}
+    running_stages = {}
+    done = set()
+    pool = get_process_pool(min(num_of_processes, len(stages)), initialize_stage_worker,
+                            (module_name, set_up_function_name))
+    try:
+        while pending or running:
+            # Start all the stages whose dependencies are done
+            for name in [name for name in pending if dependencies[name] <= done]:
+                print_time_stamp("Start " + name)
+                running[name] = pool.apply_async(run_stage_worker,
+                                                 ((module_name, pending[name]["function"].__name__,
+                                                   get_stage_description(pending[name], workspace)),))
+                running_stages[name] = pending.pop(name)
+            # Wait for at least one of the running stages to finish
+            finished = [name for name in running if running[name].ready()]
+            while not finished:
+                time.sleep(0.2)
+                finished = [name for name in running if running[name].ready()]
+            for name in finished:
+                # get() raises the exception of the stage if it failed
+                elapsed_time, cache_statuses[name] = running.pop(name).get()
+                # The stages that depend on this one only start once its outputs are copied
+                copy_stage_outputs(running_stages.pop(name), workspace)
+                done.add(name)
+                print_time_stamp("Done " + name + " (" + str(round(elapsed_time, 1)) + " s, cache "
+                                 + cache_statuses[name] + ")")
+    finally:
+        pool.close()
+        pool.join()
+    # The workers store new cache entries, but only the main process evicts old ones
+    if CACHE_OPTION == "yes":
+        evict_cache_entries()
+    print_cache_report(cache_statuses)
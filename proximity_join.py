@@ -0,0 +1,215 @@
+# ***************************************
+# ***Overview***
+# Script name: proximity_join.py
+# Purpose: This Python module joins line features to the line features within a search radius of them
+#          (e.g. the non-circuit trails to the LTS1-2 islands within 50 meters) and aggregates the
+#          attributes of the joined features (sum, count, mean), like arcpy.SpatialJoin_analysis() with
+#          a search radius and field mapping merge rules.
+#          The lines are split into their segments, and the segments of the joined features are put in
+#          a grid index (cells of a fixed size, each listing the segments that come within the search
+#          radius of it). The candidate pairs of segments are found by looking up the cells under each
+#          target segment, and the exact segment-to-segment distances are then tested in batches.
+#          The targets are processed in chunks, in parallel worker processes.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from ranking import *
+
+# Size (in meters) of the cells of the grid index
+index_cell_size = 250.0
+# Number of target features per task of the process pool
+num_of_targets_per_task = 500
+# Index and features of the joined segments, set once per process by set_joined_segments()
+# (so that the tasks of the process pool only carry the target segments)
+joined_segments = {}
+
+# *****************************************
+# Functions
+
+# Get the segments of a line geometry as two arrays of start and end points
+def get_line_segments(geometry):
+    start_points = []
+    end_points = []
+    for part in geometry:
+        points = np.array([(point.X, point.Y) for point in part if point is not None]).reshape(-1, 2)
+        if len(points) == 1:
+            points = np.concatenate([points, points])
+        start_points.append(points[:-1])
+        end_points.append(points[1:])
+    if not start_points:
+        return np.zeros((0, 2)), np.zeros((0, 2))
+    return np.concatenate(start_points), np.concatenate(end_points)
+
+# Get the segments of a list of line geometries, with the position of the feature of every segment
+def get_feature_segments(geometries):
+    start_points = [np.zeros((0, 2))]
+    end_points = [np.zeros((0, 2))]
+    features = [np.zeros(0, dtype=np.int64)]
+    for i, geometry in enumerate(geometries):
+        if geometry is None:
+            continue
+        feature_start_points, feature_end_points = get_line_segments(geometry)
+        start_points.append(feature_start_points)
+        end_points.append(feature_end_points)
+        features.append(np.full(len(feature_start_points), i, dtype=np.int64))
+    return np.concatenate(start_points), np.concatenate(end_points), np.concatenate(features)
+
+# Get the cells of the grid index covered by boxes (min x, min y, max x, max y, one row per box).
+# Returns the position of the box and the key of the cell, for every box and cell it covers.
+def get_box_cells(boxes, cell_size):
+    first_cols = np.floor(boxes[:, 0] / cell_size).astype(np.int64)
+    first_rows = np.floor(boxes[:, 1] / cell_size).astype(np.int64)
+    num_of_cols = np.floor(boxes[:, 2] / cell_size).astype(np.int64) - first_cols + 1
+    num_of_rows = np.floor(boxes[:, 3] / cell_size).astype(np.int64) - first_rows + 1
+    num_of_cells = num_of_cols * num_of_rows
+    box_positions = np.repeat(np.arange(len(boxes)), num_of_cells)
+    # Position of every cell within its box
+    cell_positions = np.arange(num_of_cells.sum()) - np.repeat(np.cumsum(num_of_cells) - num_of_cells, num_of_cells)
+    cols = first_cols[box_positions] + cell_positions % num_of_cols[box_positions]
+    rows = first_rows[box_positions] + cell_positions // num_of_cols[box_positions]
+    # One key per cell (the grid index never spans more than 2^31 cells in each direction)
+    return box_positions, rows * (2 ** 31) + cols
+
+# Get the bounding boxes of segments, grown by a margin
+def get_segment_boxes(start_points, end_points, margin=0.0):
+    return np.column_stack([np.minimum(start_points[:, 0], end_points[:, 0]) - margin,
+                            np.minimum(start_points[:, 1], end_points[:, 1]) - margin,
+                            np.maximum(start_points[:, 0], end_points[:, 0]) + margin,
+                            np.maximum(start_points[:, 1], end_points[:, 1]) + margin])
+
+# Build the grid index of segments: every segment is listed in the cells its bounding box grown by
+# the search radius covers, so the candidates of a target segment are the segments of the cells under it
+def build_segment_grid_index(start_points, end_points, search_radius, cell_size=index_cell_size):
+    segments, keys = get_box_cells(get_segment_boxes(start_points, end_points, search_radius), cell_size)
+    order = np.argsort(keys, kind="mergesort")
+    return {"keys": keys[order], "segments": segments[order], "cell_size": cell_size,
+            "start_points": start_points, "end_points": end_points}
+
+# Get the distances from points to segments (pairwise, same length arrays)
+def get_point_segment_distances(points, start_points, end_points):
+    directions = end_points - start_points
+    squared_lengths = (directions * directions).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((points - start_points) * directions).sum(axis=1) / squared_lengths
+    t = np.clip(np.where(squared_lengths > 0, t, 0), 0, 1)
+    closest_points = start_points + t[:, None] * directions
+    return np.hypot(points[:, 0] - closest_points[:, 0], points[:, 1] - closest_points[:, 1])
+
+# Get the distances between two lists of segments (pairwise): 0 if they cross, otherwise the smallest
+# distance from an end point of one of them to the other one
+def get_segment_distances(start_points1, end_points1, start_points2, end_points2):
+    def cross(origins, points1, points2):
+        return ((points1[:, 0] - origins[:, 0]) * (points2[:, 1] - origins[:, 1])
+                - (points1[:, 1] - origins[:, 1]) * (points2[:, 0] - origins[:, 0]))
+    crossing = ((np.sign(cross(start_points1, end_points1, start_points2))
+                 * np.sign(cross(start_points1, end_points1, end_points2)) < 0)
+                & (np.sign(cross(start_points2, end_points2, start_points1))
+                   * np.sign(cross(start_points2, end_points2, end_points1)) < 0))
+    distances = np.minimum(np.minimum(get_point_segment_distances(start_points1, start_points2, end_points2),
+                                      get_point_segment_distances(end_points1, start_points2, end_points2)),
+                           np.minimum(get_point_segment_distances(start_points2, start_points1, end_points1),
+                                      get_point_segment_distances(end_points2, start_points1, end_points1)))
+    return np.where(crossing, 0.0, distances)
+
+# Find the pairs (target segment, joined segment) within the search radius of each other
+def find_segment_pairs(index, start_points, end_points, search_radius):
+    target_segments, keys = get_box_cells(get_segment_boxes(start_points, end_points), index["cell_size"])
+    first_positions = np.searchsorted(index["keys"], keys, side="left")
+    num_of_candidates = np.searchsorted(index["keys"], keys, side="right") - first_positions
+    pair_targets = np.repeat(target_segments, num_of_candidates)
+    candidate_positions = (np.arange(num_of_candidates.sum())
+                           - np.repeat(np.cumsum(num_of_candidates) - num_of_candidates, num_of_candidates)
+                           + np.repeat(first_positions, num_of_candidates))
+    pair_segments = index["segments"][candidate_positions]
+    # A pair can be found in several cells: keep it once
+    pair_keys = np.unique(pair_targets * len(index["start_points"]) + pair_segments)
+    pair_targets = pair_keys // len(index["start_points"])
+    pair_segments = pair_keys % len(index["start_points"])
+    distances = get_segment_distances(start_points[pair_targets], end_points[pair_targets],
+                                      index["start_points"][pair_segments], index["end_points"][pair_segments])
+    is_near = distances <= search_radius
+    return pair_targets[is_near], pair_segments[is_near]
+
+# Initializer of the process pool: keep the index and features of the joined segments in the process
+def set_joined_segments(index, joined_features):
+    joined_segments["index"] = index
+    joined_segments["joined_features"] = joined_features
+
+# Worker function for the process pool: find the joined features within the search radius of a chunk
+# of target features. Returns the pairs (target feature, joined feature), each pair once.
+def find_feature_pairs_worker(arguments):
+    start_points, end_points, target_features, search_radius = arguments
+    index = joined_segments["index"]
+    joined_features = joined_segments["joined_features"]
+    pair_targets, pair_segments = find_segment_pairs(index, start_points, end_points, search_radius)
+    num_of_joined_features = int(joined_features.max()) + 1 if len(joined_features) > 0 else 1
+    pair_keys = np.unique(target_features[pair_targets] * num_of_joined_features + joined_features[pair_segments])
+    return pair_keys // num_of_joined_features, pair_keys % num_of_joined_features
+
+# Join target line features to the joined line features within the search radius of them, and
+# aggregate the attributes of the joined features per target feature. aggregations is a list of
+# [values of the joined features (None for null values), merge rule ("Sum", "Count" or "Mean")].
+# Returns the number of joined features and the aggregated values (None where there is no value), per target.
+def compute_proximity_join(target_geometries, joined_geometries, aggregations, search_radius):
+    joined_start_points, joined_end_points, joined_features = get_feature_segments(joined_geometries)
+    start_points, end_points, target_features = get_feature_segments(target_geometries)
+    index = build_segment_grid_index(joined_start_points, joined_end_points, search_radius)
+
+    # Chunks of target features, processed in parallel (the index is sent once to each worker process)
+    tasks = []
+    for first_target in range(0, len(target_geometries), num_of_targets_per_task):
+        in_chunk = (target_features >= first_target) & (target_features < first_target + num_of_targets_per_task)
+        if in_chunk.any():
+            tasks.append([start_points[in_chunk], end_points[in_chunk], target_features[in_chunk], search_radius])
+    results = map_in_process_pool(find_feature_pairs_worker, tasks, initializer=set_joined_segments,
+                                  initargs=(index, joined_features))
+    pair_targets = np.concatenate([np.zeros(0, dtype=np.int64)] + [result[0] for result in results])
+    pair_joined = np.concatenate([np.zeros(0, dtype=np.int64)] + [result[1] for result in results])
+
+    num_of_targets = len(target_geometries)
+    join_counts = np.bincount(pair_targets, minlength=num_of_targets)
+    aggregated = []
+    for values, merge_rule in aggregations:
+        values = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        pair_values = values[pair_joined]
+        is_valid = ~np.isnan(pair_values)
+        counts = np.bincount(pair_targets[is_valid], minlength=num_of_targets)
+        sums = np.bincount(pair_targets[is_valid], weights=pair_values[is_valid], minlength=num_of_targets)
+        if merge_rule == "Count":
+            aggregated.append([int(count) for count in counts])
+        elif merge_rule == "Sum":
+            aggregated.append([float(total) if count > 0 else None for total, count in zip(sums, counts)])
+        else:
+            aggregated.append([float(total) / count if count > 0 else None for total, count in zip(sums, counts)])
+    return join_counts, aggregated
+
+# Equivalent of arcpy.SpatialJoin_analysis(target, join, out, "JOIN_ONE_TO_ONE", "KEEP_ALL", field_mappings,
+# "INTERSECT", search_radius) for line features, with the merged fields renamed: the target features are
+# written with the fields Join_Count and the aggregated fields. aggregations is a list of
+# [field of the joined features, merge rule, output field, output field type].
+def proximity_join_as_feature_class(target_feature_class, join_feature_class, out_feature_class,
+                                    aggregations, search_radius):
+    fields, rows = read_feature_rows(target_feature_class)
+    with arcpy.da.SearchCursor(join_feature_class, ["SHAPE@"] + [aggregation[0] for aggregation in aggregations],
+                               spatial_reference=arcpy.Describe(target_feature_class).spatialReference) as cursor:
+        joined_rows = [row for row in cursor]
+    join_counts, aggregated = compute_proximity_join(
+        [row[0] for row in rows], [row[0] for row in joined_rows],
+        [[[row[i + 1] for row in joined_rows], aggregation[1]] for i, aggregation in enumerate(aggregations)],
+        search_radius)
+    out_rows = [list(row) + [int(join_counts[i])] + [values[i] for values in aggregated]
+                for i, row in enumerate(rows)]
+    write_features(out_feature_class, target_feature_class, fields, out_rows,
+                   [["Join_Count", "LONG"]] + [[aggregation[2], aggregation[3]] for aggregation in aggregations])
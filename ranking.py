@@ -0,0 +1,142 @@
+# ***************************************
+# ***Overview***
+# Script name: ranking.py
+# Purpose: This Python module ranks the features of a feature class by one or more attributes
+#          and writes the top ranked subsets (e.g. the top third and the top 20), without
+#          arcpy.Sort_management() on the whole feature class followed by a select-and-copy
+#          pass per subset. The feature class is read once, the ranks are computed in memory
+#          (with a partial selection when only the top rows are needed), optionally within
+#          groups (e.g. per county), and only the requested subsets are written.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import os
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+
+# *****************************************
+# Functions
+
+# Get the fields of a feature class that can be copied to a new feature class
+# (not the object id, the geometry, or the fields computed from the geometry)
+def get_copyable_fields(feature_class):
+    describe = arcpy.Describe(feature_class)
+    computed_fields = [describe.shapeFieldName.lower() + "_length", describe.shapeFieldName.lower() + "_area",
+                       "shape_length", "shape_area", "shape.len", "shape.area", "shape_leng"]
+    return [field.name for field in arcpy.ListFields(feature_class)
+            if field.type not in ("OID", "Geometry") and field.name.lower() not in computed_fields]
+
+# Read all the rows of a feature class in one scan: geometry first, then the copyable fields
+def read_feature_rows(feature_class):
+    fields = get_copyable_fields(feature_class)
+    with arcpy.da.SearchCursor(feature_class, ["SHAPE@"] + fields) as cursor:
+        rows = [row for row in cursor]
+    return fields, rows
+
+# Get the values of an attribute as an array (missing values become -inf, so that they rank last)
+def get_ranking_values(values):
+    return np.array([-np.inf if value is None else value for value in values], dtype=np.float64)
+
+# Get the positions of the rows in decreasing order of value (ties keep the order of the rows,
+# and missing values come last). With num_of_rows, only the top rows are returned, found with a
+# partial selection instead of a full sort.
+def get_rank_order(values, num_of_rows=None):
+    values = get_ranking_values(values)
+    if num_of_rows is not None and num_of_rows < len(values):
+        if num_of_rows <= 0:
+            return np.zeros(0, dtype=np.int64)
+        # The top values, plus any row tied with the last of them (so that the ties are kept in order)
+        threshold = -np.partition(-values, num_of_rows - 1)[num_of_rows - 1]
+        candidates = np.nonzero(values >= threshold)[0]
+    else:
+        candidates = np.arange(len(values))
+    order = candidates[np.lexsort((candidates, -values[candidates]))]
+    return order if num_of_rows is None else order[:num_of_rows]
+
+# Get dense ranks (tied values share a rank, and the next value gets the next rank)
+def get_dense_ranks(values):
+    values = get_ranking_values(values)
+    unique_values = np.unique(-values)
+    return np.searchsorted(unique_values, -values) + 1
+
+# Get the number of rows of a subset of the ranked values: None for all the rows, an integer for the
+# top rows, a float fraction (e.g. 1 / 3.0 for the top third, rounded down), or ["min_value", value]
+# for the rows whose value is at least value (e.g. the rows flagged with 1 by a 0/1 attribute)
+def get_subset_num_of_rows(size, values):
+    num_of_rows = len(values)
+    if size is None:
+        return num_of_rows
+    if isinstance(size, list):
+        return int(np.sum(get_ranking_values(values) >= size[1]))
+    if isinstance(size, float):
+        return int(np.floor(num_of_rows * size + 1e-9))
+    return min(size, num_of_rows)
+
+# Write rows to a new feature class with the schema of a template feature class, plus extra fields
+# (a list of [field name, field type], whose values come at the end of the rows)
+def write_features(out_feature_class, template_feature_class, fields, rows, extra_fields=()):
+    out_path = out_feature_class
+    if "\\" not in out_path:
+        out_path = os.path.join(arcpy.env.workspace, out_feature_class)
+    if arcpy.Exists(out_path):
+        arcpy.Delete_management(out_path)
+    describe = arcpy.Describe(template_feature_class)
+    arcpy.CreateFeatureclass_management(os.path.dirname(out_path), os.path.basename(out_path),
+                                        describe.shapeType, template_feature_class,
+                                        spatial_reference=describe.spatialReference)
+    for field_name, field_type in extra_fields:
+        arcpy.AddField_management(out_path, field_name, field_type)
+    with arcpy.da.InsertCursor(out_path, ["SHAPE@"] + fields + [field_name for field_name, field_type
+                                                                 in extra_fields]) as cursor:
+        for row in rows:
+            cursor.insertRow(row)
+
+# Write rows to a new feature class with the schema of a template feature class, plus a Rank field
+def write_ranked_features(out_feature_class, template_feature_class, fields, rows, ranks):
+    write_features(out_feature_class, template_feature_class, fields,
+                   [list(row) + [int(rank)] for row, rank in zip(rows, ranks)], [["Rank", "LONG"]])
+
+# Rank the features of a feature class and write the requested subsets, reading it only once.
+# rankings is a list of [ranking attribute, subsets], and subsets a list of [output feature class,
+# size] (see get_subset_num_of_rows() for the sizes). The Rank field gets the position of the feature
+# in decreasing order of the attribute (as with the OBJECTID of arcpy.Sort_management()), or its dense
+# rank if rank_method is "dense".
+# With a group_field, the features are ranked within each group (all of them, or only the given
+# groups), and the output names are formatted with the group value
+# (e.g. "lts3_overall_score_ranked_{0}_top20").
+def write_ranked_subsets(in_feature_class, rankings, group_field=None, groups=None, rank_method="ordinal"):
+    fields, rows = read_feature_rows(in_feature_class)
+    if group_field is None:
+        positions_per_group = {None: np.arange(len(rows))}
+    else:
+        group_index = fields.index(group_field) + 1
+        group_values = np.array([str(row[group_index]) for row in rows])
+        if groups is None:
+            groups = np.unique(group_values)
+        positions_per_group = dict((group, np.nonzero(group_values == str(group))[0]) for group in groups)
+
+    for ranking_attribute, subsets in rankings:
+        value_index = fields.index(ranking_attribute) + 1
+        for group in positions_per_group:
+            positions = positions_per_group[group]
+            values = [rows[position][value_index] for position in positions]
+            sizes = [get_subset_num_of_rows(size, values) for out_feature_class, size in subsets]
+            order = get_rank_order(values, max(sizes) if sizes and max(sizes) < len(values) else None)
+            if rank_method == "dense":
+                ranks = get_dense_ranks(values)[order]
+            else:
+                ranks = np.arange(1, len(order) + 1)
+            for (out_feature_class, size), num_of_rows in zip(subsets, sizes):
+                write_ranked_features(out_feature_class.format(group), in_feature_class, fields,
+                                      [rows[position] for position in positions[order[:num_of_rows]]],
+                                      ranks[:num_of_rows])
@@ -0,0 +1,130 @@
+# ***************************************
+# ***Overview***
+# Script name: raster_statistics.py
+# Purpose: This Python module computes the statistics of the rasters while they are written:
+#          min, max, mean, standard deviation, number of NoData cells and a histogram, updated
+#          tile after tile in a single pass. The statistics are saved in a JSON file next to the
+#          raster (for a raster in a geodatabase, in a folder next to the geodatabase), and set as
+#          the statistics of the raster in ArcGIS, so that lyr.symbology.reclassify() works without
+#          arcpy.CalculateStatistics_management() re-reading the raster.
+#          The histogram has a fixed number of bins: when a tile has values outside of its range,
+#          the width of the bins is doubled (merging the bins two by two) until they fit.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import json
+import os
+import numpy as np
+
+# Import local modules:
+from config import *
+
+# Number of bins of the histograms (must be even)
+num_of_statistics_histogram_bins = 256
+
+# *****************************************
+# Functions
+
+# Create an empty statistics accumulator
+def make_statistics_accumulator(num_of_bins=num_of_statistics_histogram_bins):
+    return {"count": 0, "nodata_count": 0, "sum": 0.0, "sum_of_squares": 0.0,
+            "min": None, "max": None, "bin_low": None, "bin_width": None,
+            "histogram": np.zeros(num_of_bins, dtype=np.int64)}
+
+# Double the width of the histogram bins, so that the histogram reaches further up or down
+def widen_histogram(accumulator, downward):
+    histogram = accumulator["histogram"]
+    num_of_bins = len(histogram)
+    merged_bins = histogram.reshape(num_of_bins // 2, 2).sum(axis=1)
+    histogram[:] = 0
+    if downward:
+        histogram[num_of_bins // 2:] = merged_bins
+        accumulator["bin_low"] -= num_of_bins * accumulator["bin_width"]
+    else:
+        histogram[:num_of_bins // 2] = merged_bins
+    accumulator["bin_width"] *= 2
+
+# Update the statistics with the cells of a tile (NoData cells are NaN, or nodata_value)
+def update_statistics(accumulator, tile, nodata_value=None):
+    tile = np.asarray(tile, dtype=np.float64)
+    is_nodata = np.isnan(tile)
+    if nodata_value is not None:
+        is_nodata |= tile == nodata_value
+    values = tile[~is_nodata]
+    accumulator["nodata_count"] += int(is_nodata.sum())
+    if values.size == 0:
+        return
+    tile_min = float(values.min())
+    tile_max = float(values.max())
+    accumulator["count"] += int(values.size)
+    accumulator["sum"] += float(values.sum())
+    accumulator["sum_of_squares"] += float((values * values).sum())
+    accumulator["min"] = tile_min if accumulator["min"] is None else min(accumulator["min"], tile_min)
+    accumulator["max"] = tile_max if accumulator["max"] is None else max(accumulator["max"], tile_max)
+
+    histogram = accumulator["histogram"]
+    num_of_bins = len(histogram)
+    if accumulator["bin_low"] is None:
+        accumulator["bin_low"] = tile_min
+        accumulator["bin_width"] = max((tile_max - tile_min) / num_of_bins, 1e-9)
+    while tile_min < accumulator["bin_low"]:
+        widen_histogram(accumulator, True)
+    # The last bin includes its upper edge
+    while tile_max > accumulator["bin_low"] + num_of_bins * accumulator["bin_width"]:
+        widen_histogram(accumulator, False)
+    bins = np.minimum(((values - accumulator["bin_low"]) / accumulator["bin_width"]).astype(np.int64),
+                      num_of_bins - 1)
+    histogram += np.bincount(bins, minlength=num_of_bins)
+
+# Get the final statistics from an accumulator
+def finish_statistics(accumulator):
+    statistics = {"count": accumulator["count"], "nodata_count": accumulator["nodata_count"],
+                  "min": accumulator["min"], "max": accumulator["max"],
+                  "mean": None, "std": None, "histogram": accumulator["histogram"].tolist(),
+                  "bin_low": accumulator["bin_low"], "bin_width": accumulator["bin_width"]}
+    if accumulator["count"] > 0:
+        mean = accumulator["sum"] / accumulator["count"]
+        statistics["mean"] = mean
+        statistics["std"] = float(np.sqrt(max(accumulator["sum_of_squares"] / accumulator["count"] - mean * mean, 0)))
+    return statistics
+
+# Get the path of the statistics file of a raster: next to the raster, or for a raster
+# in a geodatabase, in a folder next to the geodatabase (<geodatabase>_statistics)
+def get_raster_statistics_path(raster):
+    if not os.path.isabs(raster) and "\\" not in raster:
+        raster = os.path.join(arcpy.env.workspace, raster)
+    folder, name = os.path.split(raster)
+    if folder.lower().endswith(".gdb"):
+        return os.path.join(folder[:-4] + "_statistics", name + ".json")
+    return raster + ".statistics.json"
+
+# Save the statistics of a raster next to it, and set them as its statistics in ArcGIS
+def save_raster_statistics(statistics, raster):
+    statistics_path = get_raster_statistics_path(raster)
+    if not os.path.exists(os.path.dirname(statistics_path)):
+        os.makedirs(os.path.dirname(statistics_path))
+    with open(statistics_path, "w") as statistics_file:
+        json.dump(statistics, statistics_file)
+    if statistics["count"] > 0:
+        arcpy.SetRasterProperties_management(raster, statistics="1 " + " ".join(
+            [str(statistics[key]) for key in ["min", "max", "mean", "std"]]))
+
+# Load the statistics saved with a raster (None if there are none)
+def load_raster_statistics(raster):
+    statistics_path = get_raster_statistics_path(raster)
+    if not os.path.exists(statistics_path):
+        return None
+    with open(statistics_path) as statistics_file:
+        return json.load(statistics_file)
+
+# Compute and save the statistics of an array written as a raster
+def save_array_statistics(array, raster, nodata_value=None):
+    accumulator = make_statistics_accumulator()
+    update_statistics(accumulator, array, nodata_value)
+    save_raster_statistics(finish_statistics(accumulator), raster)
@@ -0,0 +1,298 @@
+# ***************************************
+# ***Overview***
+# Script name: reprojection.py
+# Purpose: This Python module reprojects whole feature classes to NAD 1983 UTM Zone 18N with numpy,
+#          instead of arcpy.Project_management() feature by feature.
+#          The transformation pipeline (datum shift and Transverse Mercator projection) is built once
+#          per pair of coordinate systems and kept in a cache. It is checked against arcpy on a few
+#          control points when it is built: when the coordinate systems are not supported, or when the
+#          check fails, the datasets are projected with arcpy.Project_management() as before.
+#          All the vertices of a feature class are read at once (as WKB), transformed as coordinate
+#          arrays (optionally in several threads, by chunks), and written back in one insert pass.
+#          Supported: geographic WGS 1984 or NAD 1983 coordinates, with the WGS_1984_(ITRF00)_To_NAD_1983
+#          transformation between them, to a Transverse Mercator projection (e.g. UTM) in meters.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import os
+import struct
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+# Import local modules:
+from config import *
+from utilities import *
+from ranking import *
+
+# Ellipsoids: semi-major axis and flattening
+ellipsoids = {"D_WGS_1984": [6378137.0, 1 / 298.257223563],
+              "D_North_American_1983": [6378137.0, 1 / 298.257222101]}
+# Datum transformations (Coordinate Frame method): translations (meters), rotations (arc-seconds)
+# and scale difference (ppm), from the datum of the source to the datum of the target
+datum_transformations = {"WGS_1984_(ITRF00)_To_NAD_1983": {"source": "D_WGS_1984", "target": "D_North_American_1983",
+                                                           "translations": [0.9956, -1.9013, -0.5215],
+                                                           "rotations": [0.025915, 0.009426, 0.011599],
+                                                           "scale_difference": 0.00062}}
+# Maximum distance (in meters) between our transformation and arcpy's on the control points
+max_control_point_error = 0.01
+# Number of vertices per chunk when the coordinates are transformed in several threads
+num_of_vertices_per_chunk = 1000000
+# Cache of the transformation pipelines (None for the pairs of coordinate systems that are not supported)
+transformation_pipelines = {}
+
+# *****************************************
+# Functions
+
+# Convert geodetic coordinates (in radians) to geocentric (earth-centered) coordinates
+def geodetic_to_geocentric(lon, lat, ellipsoid):
+    a, f = ellipsoid
+    e2 = f * (2 - f)
+    sin_lat = np.sin(lat)
+    n = a / np.sqrt(1 - e2 * sin_lat * sin_lat)
+    return n * np.cos(lat) * np.cos(lon), n * np.cos(lat) * np.sin(lon), n * (1 - e2) * sin_lat
+
+# Convert geocentric coordinates to geodetic coordinates (in radians)
+def geocentric_to_geodetic(x, y, z, ellipsoid):
+    a, f = ellipsoid
+    e2 = f * (2 - f)
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - e2))
+    for i in range(4):
+        sin_lat = np.sin(lat)
+        n = a / np.sqrt(1 - e2 * sin_lat * sin_lat)
+        height = p / np.cos(lat) - n
+        lat = np.arctan2(z, p * (1 - e2 * n / (n + height)))
+    return np.arctan2(y, x), lat
+
+# Apply a datum transformation (Coordinate Frame method) to geocentric coordinates
+def apply_datum_transformation(x, y, z, transformation):
+    dx, dy, dz = transformation["translations"]
+    rx, ry, rz = [np.radians(rotation / 3600.0) for rotation in transformation["rotations"]]
+    scale = 1 + transformation["scale_difference"] * 1e-6
+    return (dx + scale * (x + rz * y - ry * z),
+            dy + scale * (-rz * x + y + rx * z),
+            dz + scale * (ry * x - rx * y + z))
+
+# Get the coefficients of the Transverse Mercator projection of an ellipsoid (Kruger series, 6th order)
+def get_transverse_mercator_coefficients(ellipsoid):
+    a, f = ellipsoid
+    n = f / (2 - f)
+    rectifying_radius = a / (1 + n) * (1 + n ** 2 / 4.0 + n ** 4 / 64.0 + n ** 6 / 256.0)
+    alphas = [n / 2.0 - 2 * n ** 2 / 3.0 + 5 * n ** 3 / 16.0 + 41 * n ** 4 / 180.0 - 127 * n ** 5 / 288.0
+              + 7891 * n ** 6 / 37800.0,
+              13 * n ** 2 / 48.0 - 3 * n ** 3 / 5.0 + 557 * n ** 4 / 1440.0 + 281 * n ** 5 / 630.0
+              - 1983433 * n ** 6 / 1935360.0,
+              61 * n ** 3 / 240.0 - 103 * n ** 4 / 140.0 + 15061 * n ** 5 / 26880.0 + 167603 * n ** 6 / 181440.0,
+              49561 * n ** 4 / 161280.0 - 179 * n ** 5 / 168.0 + 6601661 * n ** 6 / 7257600.0,
+              34729 * n ** 5 / 80640.0 - 3418889 * n ** 6 / 1995840.0,
+              212378941 * n ** 6 / 319334400.0]
+    return rectifying_radius, alphas
+
+# Project geodetic coordinates (in radians) with the Transverse Mercator projection
+def project_transverse_mercator(lon, lat, pipeline):
+    e = np.sqrt(pipeline["target_ellipsoid"][1] * (2 - pipeline["target_ellipsoid"][1]))
+    delta_lon = lon - pipeline["central_meridian"]
+    sin_lat = np.sin(lat)
+    t = np.sinh(np.arctanh(sin_lat) - e * np.arctanh(e * sin_lat))
+    xi_prime = np.arctan2(t, np.cos(delta_lon))
+    eta_prime = np.arctanh(np.sin(delta_lon) / np.sqrt(1 + t * t))
+    xi = xi_prime.copy()
+    eta = eta_prime.copy()
+    for j, alpha in enumerate(pipeline["alphas"]):
+        xi += alpha * np.sin(2 * (j + 1) * xi_prime) * np.cosh(2 * (j + 1) * eta_prime)
+        eta += alpha * np.cos(2 * (j + 1) * xi_prime) * np.sinh(2 * (j + 1) * eta_prime)
+    scale = pipeline["scale_factor"] * pipeline["rectifying_radius"]
+    return (pipeline["false_easting"] + scale * eta,
+            pipeline["false_northing"] + scale * (xi - pipeline["origin_northing"]))
+
+# Transform an (n, 2) array of longitudes and latitudes (in degrees) with a pipeline
+def transform_coordinates(coordinates, pipeline):
+    lon = np.radians(coordinates[:, 0])
+    lat = np.radians(coordinates[:, 1])
+    if pipeline["datum_transformation"] is not None:
+        x, y, z = geodetic_to_geocentric(lon, lat, pipeline["source_ellipsoid"])
+        x, y, z = apply_datum_transformation(x, y, z, pipeline["datum_transformation"])
+        lon, lat = geocentric_to_geodetic(x, y, z, pipeline["target_ellipsoid"])
+    easting, northing = project_transverse_mercator(lon, lat, pipeline)
+    return np.column_stack([easting, northing])
+
+# Transform the coordinates by chunks, in several threads (numpy releases the GIL in its array math)
+def transform_coordinates_in_threads(coordinates, pipeline, num_of_threads=NUM_OF_REPROJECTION_THREADS):
+    if num_of_threads <= 1 or len(coordinates) <= num_of_vertices_per_chunk:
+        return transform_coordinates(coordinates, pipeline)
+    chunks = [coordinates[first:first + num_of_vertices_per_chunk]
+              for first in range(0, len(coordinates), num_of_vertices_per_chunk)]
+    pool = ThreadPool(num_of_threads)
+    try:
+        return np.concatenate(pool.map(lambda chunk: transform_coordinates(chunk, pipeline), chunks))
+    finally:
+        pool.close()
+        pool.join()
+
+# Get the transformation pipeline from a coordinate system to another (None if not supported)
+def make_transformation_pipeline(source_spatial_reference, target_spatial_reference, transformation_name):
+    if (source_spatial_reference.type != "Geographic" or target_spatial_reference.type != "Projected"
+            or target_spatial_reference.projectionName != "Transverse_Mercator"
+            or target_spatial_reference.metersPerUnit != 1):
+        return None
+    source_datum = source_spatial_reference.datumName
+    target_datum = target_spatial_reference.GCS.datumName
+    if source_datum not in ellipsoids or target_datum not in ellipsoids:
+        return None
+    datum_transformation = None
+    if source_datum != target_datum:
+        datum_transformation = datum_transformations.get(transformation_name)
+        if datum_transformation is None or datum_transformation["source"] != source_datum \
+                or datum_transformation["target"] != target_datum:
+            return None
+    pipeline = {"source_ellipsoid": ellipsoids[source_datum], "target_ellipsoid": ellipsoids[target_datum],
+                "datum_transformation": datum_transformation,
+                "central_meridian": np.radians(target_spatial_reference.centralMeridian),
+                "scale_factor": target_spatial_reference.scaleFactor,
+                "false_easting": target_spatial_reference.falseEasting,
+                "false_northing": target_spatial_reference.falseNorthing}
+    pipeline["rectifying_radius"], pipeline["alphas"] = get_transverse_mercator_coefficients(pipeline["target_ellipsoid"])
+    # Northing of the latitude of origin (0 for UTM)
+    pipeline["origin_northing"] = 0.0
+    if target_spatial_reference.latitudeOfOrigin != 0:
+        pipeline["origin_northing"] = project_transverse_mercator(
+            np.array([pipeline["central_meridian"]]), np.radians([target_spatial_reference.latitudeOfOrigin]),
+            dict(pipeline, false_easting=0.0, false_northing=0.0, scale_factor=1.0,
+                 rectifying_radius=1.0))[1][0]
+    return pipeline
+
+# Check a pipeline against arcpy on control points (the corners and center of an extent)
+def check_transformation_pipeline(pipeline, source_spatial_reference, target_spatial_reference,
+                                  transformation_name, extent):
+    control_points = np.array([[extent.XMin, extent.YMin], [extent.XMin, extent.YMax], [extent.XMax, extent.YMin],
+                               [extent.XMax, extent.YMax], [(extent.XMin + extent.XMax) / 2,
+                                                            (extent.YMin + extent.YMax) / 2]])
+    transformed_points = transform_coordinates(control_points, pipeline)
+    for (x, y), (easting, northing) in zip(control_points, transformed_points):
+        point = arcpy.PointGeometry(arcpy.Point(x, y), source_spatial_reference)
+        if transformation_name:
+            point = point.projectAs(target_spatial_reference, transformation_name)
+        else:
+            point = point.projectAs(target_spatial_reference)
+        error = np.hypot(point.firstPoint.X - easting, point.firstPoint.Y - northing)
+        if error > max_control_point_error:
+            print("The batch reprojection is " + str(round(error, 3)) + " meters from arcpy: using arcpy")
+            return False
+    return True
+
+# Get the cached transformation pipeline of a pair of coordinate systems, building and checking it the
+# first time (None if it is not supported, or if it does not match arcpy on the control points)
+def get_transformation_pipeline(source_spatial_reference, target_spatial_reference, transformation_name, extent):
+    key = (source_spatial_reference.exportToString(), target_spatial_reference.exportToString(),
+           transformation_name)
+    if key not in transformation_pipelines:
+        pipeline = make_transformation_pipeline(source_spatial_reference, target_spatial_reference,
+                                                transformation_name)
+        if pipeline is not None and not check_transformation_pipeline(pipeline, source_spatial_reference,
+                                                                      target_spatial_reference,
+                                                                      transformation_name, extent):
+            pipeline = None
+        transformation_pipelines[key] = pipeline
+    return transformation_pipelines[key]
+
+# Find the blocks of coordinates in a WKB geometry: returns the position after the geometry and a list of
+# [offset of the first coordinate, number of points, number of dimensions, byte order ("<" or ">")]
+def get_wkb_coordinate_blocks(wkb, start=0, blocks=None):
+    if blocks is None:
+        blocks = []
+    byte_order = "<" if wkb[start] in (1, b"\x01") else ">"
+    geometry_type = struct.unpack_from(byte_order + "I", wkb, start + 1)[0]
+    num_of_dimensions = 2
+    if geometry_type & 0x80000000 or (geometry_type % 10000) // 1000 in (1, 3):
+        num_of_dimensions += 1
+    if geometry_type & 0x40000000 or (geometry_type % 10000) // 1000 in (2, 3):
+        num_of_dimensions += 1
+    base_type = (geometry_type & 0xFFFF) % 1000
+    position = start + 5
+    if base_type == 1:
+        blocks.append([position, 1, num_of_dimensions, byte_order])
+        position += 8 * num_of_dimensions
+    elif base_type == 2:
+        num_of_points = struct.unpack_from(byte_order + "I", wkb, position)[0]
+        blocks.append([position + 4, num_of_points, num_of_dimensions, byte_order])
+        position += 4 + 8 * num_of_dimensions * num_of_points
+    elif base_type == 3:
+        num_of_rings = struct.unpack_from(byte_order + "I", wkb, position)[0]
+        position += 4
+        for i in range(num_of_rings):
+            num_of_points = struct.unpack_from(byte_order + "I", wkb, position)[0]
+            blocks.append([position + 4, num_of_points, num_of_dimensions, byte_order])
+            position += 4 + 8 * num_of_dimensions * num_of_points
+    else:
+        num_of_geometries = struct.unpack_from(byte_order + "I", wkb, position)[0]
+        position += 4
+        for i in range(num_of_geometries):
+            position = get_wkb_coordinate_blocks(wkb, position, blocks)[0]
+    return position, blocks
+
+# Transform the WKB geometries of a feature class in one batch: all their coordinates are gathered
+# into one array, transformed, and written back into (copies of) the WKB geometries
+def transform_wkb_geometries(wkb_geometries, pipeline):
+    wkb_geometries = [bytearray(wkb) for wkb in wkb_geometries]
+    views = []
+    for wkb in wkb_geometries:
+        for offset, num_of_points, num_of_dimensions, byte_order in get_wkb_coordinate_blocks(wkb)[1]:
+            views.append(np.frombuffer(wkb, dtype=byte_order + "f8", count=num_of_points * num_of_dimensions,
+                                       offset=offset).reshape(num_of_points, num_of_dimensions))
+    if not views:
+        return wkb_geometries
+    coordinates = np.concatenate([view[:, :2] for view in views])
+    transformed = transform_coordinates_in_threads(coordinates, pipeline)
+    first_point = 0
+    for view in views:
+        view[:, :2] = transformed[first_point:first_point + len(view)]
+        first_point += len(view)
+    return wkb_geometries
+
+# Reproject a feature class in one batch (falls back to arcpy.Project_management() when the
+# coordinate systems are not supported by the batch reprojection)
+def project_feature_class(in_feature_class, out_feature_class, target_spatial_reference, transformation_name=""):
+    describe = arcpy.Describe(in_feature_class)
+    pipeline = get_transformation_pipeline(describe.spatialReference, target_spatial_reference,
+                                           transformation_name, describe.extent)
+    if pipeline is None:
+        if transformation_name:
+            arcpy.Project_management(in_feature_class, out_feature_class, target_spatial_reference, transformation_name)
+        else:
+            arcpy.Project_management(in_feature_class, out_feature_class, target_spatial_reference)
+        return
+
+    fields = get_copyable_fields(in_feature_class)
+    with arcpy.da.SearchCursor(in_feature_class, ["SHAPE@WKB"] + fields) as cursor:
+        rows = [row for row in cursor]
+    wkb_geometries = transform_wkb_geometries([row[0] for row in rows if row[0] is not None], pipeline)
+
+    out_path = out_feature_class
+    if "\\" not in out_path:
+        out_path = os.path.join(arcpy.env.workspace, out_feature_class)
+    if arcpy.Exists(out_path):
+        arcpy.Delete_management(out_path)
+    arcpy.CreateFeatureclass_management(os.path.dirname(out_path), os.path.basename(out_path),
+                                        describe.shapeType, in_feature_class, spatial_reference=target_spatial_reference)
+    with arcpy.da.InsertCursor(out_path, ["SHAPE@WKB"] + fields) as cursor:
+        geometries = iter(wkb_geometries)
+        for row in rows:
+            cursor.insertRow([None if row[0] is None else next(geometries)] + list(row[1:]))
+    print(os.path.basename(out_path) + ": " + str(len(rows)) + " features reprojected in one batch")
+
+# Reproject a dataset: in one batch with numpy if BATCH_REPROJECTION_OPTION is "yes",
+# otherwise with arcpy.Project_management()
+def project_dataset(in_dataset, out_dataset, target_spatial_reference, transformation_name=""):
+    if BATCH_REPROJECTION_OPTION == "yes":
+        project_feature_class(in_dataset, out_dataset, target_spatial_reference, transformation_name)
+    elif transformation_name:
+        arcpy.Project_management(in_dataset, out_dataset, target_spatial_reference, transformation_name)
+    else:
+        arcpy.Project_management(in_dataset, out_dataset, target_spatial_reference)
@@ -21,8 +21,14 @@ import arcpy.da # Data Access
 # Import local modules:
 from config import *
 from utilities import *
-
-num_of_score_tables = 0
+from zonal_statistics import *
+from cache import *
+from buffer_means import *
+from ranking import *
+from attribute_columns import *
+from partitions import *
+from edge_scores import *
+from connectivity import *
 
 # *****************************************
 # Functions
@@ -48,93 +54,48 @@ def select_top30pct_lts3():
     arcpy.CopyFeatures_management("lts3_orig", "lts3_top30pct")
     arcpy.SelectLayerByAttribute_management("lts3_orig", "CLEAR_SELECTION")
 
+# Compute the connectivity of the top 30% LTS3 road segments from the LTS network: the number
+# and the length of the LTS1-2 islands each segment would join
+def compute_connectivity_per_lts3():
+    compute_lts3_connectivity("lts3_top30pct")
+
 # Create a 1 mile meter buffer arounds every LTS3 road segment
 def buffer_lts3():
     arcpy.Buffer_analysis("lts3_top30pct", "lts3_top30pct_buffered", "1609.34 Meters", "FULL", "ROUND")
 
-# Compute CII scores per LTS3 road segment. The loop is a work around the fact that
-# arcpy.sa.ZonalStatisticsAsTable() does not work for overlapping zone.
+# Compute CII scores per LTS3 road segment. The 1 mile buffers overlap, which
+# arcpy.sa.ZonalStatisticsAsTable() does not support, so we use our own zonal statistics
+# that read the CII raster once and compute COUNT/AREA/MEAN for all the buffers in one pass
+# (in parallel worker processes, with the buffers sharded by tile, with PARALLEL_ZONAL_STATISTICS_OPTION).
 def compute_CII_scores_per_lts3():
-    # Prepare everything before the loop
-    arcpy.CheckOutExtension("Spatial")
-    arcpy.Delete_management("lts3_unprocessed")
-    arcpy.CopyFeatures_management("lts3_top30pct_buffered", "lts3_unprocessed")
-    # Rename the EDGE field to its simplest form
-    field_list = arcpy.ListFields("lts3_unprocessed")
-    for field in field_list:
-        if field.aliasName == "EDGE":
-            arcpy.AlterField_management("lts3_unprocessed", field.name, "EDGE")
+    # Rename the EDGE field to its simplest form (Buffer_analysis() can rename it, keeping EDGE as its alias)
+    for field in arcpy.ListFields("lts3_top30pct_buffered"):
+        if field.aliasName == "EDGE" and field.name != "EDGE":
+            arcpy.AlterField_management("lts3_top30pct_buffered", field.name, "EDGE")
             break
-
-    # Initialize the number_of_rows variable and the "i" iteration counter
-    num_of_rows = int(arcpy.GetCount_management("lts3_unprocessed")[0])
-    i = 1
-
-    # Loop to perform the Zonal Statistics as Table iteratively, processing each time them
-    # subset of rows that were not already processed in the last iteration. It generates
-    # multiple table output that will be merged later on in the function
-    # aggregate_all_zonalTables()
-    while num_of_rows > 0:
-        # At each iteration we will generate a new lts3_with_CII_scores_table
-        lts3_with_CII_scores_table  = gdb_output_roads + "\\lts3_with_CII_scores_table" + str(i)
-        # Compute the CII score per LTS3 segment as zonal statistics. The output is a table
-        arcpy.sa.ZonalStatisticsAsTable("lts3_unprocessed", "EDGE", "cii_overall_score_ras1",
-                                        lts3_with_CII_scores_table, "DATA", "MEAN")
-
-        # Create a temporary feature class that contains the results of the Zonal Statistics tool
-        lts3_table = "lts3_with_CII_scores_table"  + str(i)
-        arcpy.AddJoin_management("lts3_unprocessed", "EDGE", lts3_table, "EDGE", "KEEP_ALL")
-        arcpy.CopyFeatures_management("lts3_unprocessed", "lts3_temp")
-        # Remove the join and delete lts3_unprocessed
-        arcpy.RemoveJoin_management("lts3_unprocessed") #Not needed?
-        arcpy.Delete_management("lts3_unprocessed")
-
-        # Put any LTS3 segment that didn't not get processed in a new feature class
-        # lts3_unprocessed. They can be recognized because some of their attributes are NULL.
-        expr = "lts3_with_CII_scores_table" + str(i) + "_MEAN IS NULL"
-        #print(expr)
-        arcpy.SelectLayerByAttribute_management("lts3_temp", "NEW_SELECTION", expr)
-        arcpy.CopyFeatures_management("lts3_temp", "lts3_unprocessed")
-        arcpy.SelectLayerByAttribute_management("lts3_temp", "CLEAR_SELECTION")
-
-        # Delete all fields in new_lts3_unprocessed that came from lts3_with_CII_scores_table, so that
-        # we start with a blank slate in the next round
-        drop_fields = ["lts3_with_CII_scores_table" + str(i) + "_OBJECTID",
-                       "lts3_with_CII_scores_table" + str(i) + "_EDGE",
-                       "lts3_with_CII_scores_table" + str(i) + "_COUNT",
-                       "lts3_with_CII_scores_table" + str(i) + "_AREA",
-                       "lts3_with_CII_scores_table" + str(i) + "_MEAN"]
-        arcpy.DeleteField_management("lts3_unprocessed", drop_fields)
-
-        # Rename the EDGE field to its simplest form in lts3_unprocessed
-        field_list = arcpy.ListFields("lts3_unprocessed")
-        for field in field_list:
-            if field.aliasName == "EDGE":
-                print(field.name)
-                arcpy.AlterField_management("lts3_unprocessed", field.name, "EDGE")
-                break
-
-        # Increment the counters
-        num_of_rows = int(arcpy.GetCount_management("lts3_unprocessed")[0])
-        i += 1
-        print("num_of_rows: " + str(num_of_rows))
-        print("i: "+ str(i))
-    num_of_score_tables = i - 1
-
-# Put all partial zonal tables back together
+    zonal_statistics_as_table("lts3_top30pct_buffered", "EDGE", cii_overall_score_ras,
+                              "merged_lts3_with_CII_scores_table")
+
+# Fast alternative to buffer_lts3() + compute_CII_scores_per_lts3(): approximate the mean CII score
+# in the 1 mile buffers from the CII raster averaged over 1 mile disks, sampled along each segment.
+# (it can also score the whole LTS3 network, by passing lts3_orig instead of the top 30%)
+def compute_approximate_CII_scores_per_lts3(lts3_feature_class="lts3_top30pct"):
+    approximate_buffer_means_as_table(lts3_feature_class, "EDGE", cii_overall_score_ras, 1609.34,
+                                      "merged_lts3_with_CII_scores_table")
+
+# Alternative to buffer_lts3() + compute_CII_scores_per_lts3() for an updated LTS3 shapefile: only the
+# segments that are new or changed (or all of them if the CII raster changed) are buffered and scored,
+# the scores of the other segments come from the persistent score store of the previous run
+def compute_CII_scores_per_lts3_incrementally():
+    incremental_buffer_zonal_statistics_as_table("lts3_top30pct", "EDGE", cii_overall_score_ras, 1609.34,
+                                                 "merged_lts3_with_CII_scores_table")
+
+# Join the zonal table back to the LTS3 segments
 def aggregate_all_zonalTables():
-    # Initialize local variables
-    merge_list =[]
-    # Only if entering the number of tables manually
-    num_of_score_tables=16
-    for j in range(num_of_score_tables):
-        merge_list.append("lts3_with_CII_scores_table"+ str(j+1))
-    print(merge_list)
-    arcpy.Merge_management(merge_list, "merged_lts3_with_CII_scores_table")
     arcpy.AddJoin_management("lts3_top30pct", "EDGE", "merged_lts3_with_CII_scores_table", "EDGE", "KEEP_ALL")
     arcpy.CopyFeatures_management("lts3_top30pct", "aggregated_lts3_top30pct_with_cii_scores")
 
-    # Remove the join and delete lts3_unprocessed
+    # Remove the join
     arcpy.RemoveJoin_management("lts3_top30pct")
 
 # Compute the overall LTS3 scores
@@ -143,81 +104,34 @@ def compute_overall_scores():
     # by the max CII score to truly get a score out of 20) +
     # the connectivity score (normalized by the max connectivity score).
     # The name of the original attributes are MEAN and TOTAL, respectively.
-    arcpy.AddField_management("aggregated_lts3_top30pct_with_cii_scores", "CII_Score", "Double")
-    mean_max = get_max("aggregated_lts3_top30pct_with_cii_scores",
-                        "merged_lts3_with_CII_scores_table_MEAN")
-    cii_score_norm_expr = "(float(!merged_lts3_with_CII_scores_table_MEAN!) / " + str(mean_max) + ")*20"
-    arcpy.CalculateField_management("aggregated_lts3_top30pct_with_cii_scores", "CII_Score",
-                                    cii_score_norm_expr, "PYTHON_9.3")
-
-    arcpy.AddField_management("aggregated_lts3_top30pct_with_cii_scores", "Connectivity_Score", "Double")
-    total_max = get_max("aggregated_lts3_top30pct_with_cii_scores","lts3_top30pct_TOTAL")
-    conn_score_norm_expr = "(float(!lts3_top30pct_TOTAL!) / " + str(total_max) + ")*20"
-    arcpy.CalculateField_management("aggregated_lts3_top30pct_with_cii_scores", "Connectivity_Score",
-                                        conn_score_norm_expr, "PYTHON_9.3")
-
-    arcpy.AddField_management("aggregated_lts3_top30pct_with_cii_scores", "Overall_Score", "Double")
-    #Aggregate the two scores: 2/3 CII score + 1/3 Connectivity score
-    overall_score_expr = "(!CII_Score! * 0.67) + (!Connectivity_Score!*0.33)"
-    arcpy.CalculateField_management("aggregated_lts3_top30pct_with_cii_scores", "Overall_Score",
-                                        overall_score_expr, "PYTHON_9.3")
+    # Aggregate the two scores: 2/3 CII score + 1/3 Connectivity score
+    # (the attributes are read once, and the 3 fields are written in one pass)
+    # (with the COMPUTE_CONNECTIVITY_OPTION, the connectivity is the length of the islands joined)
+    compute_normalized_scores("aggregated_lts3_top30pct_with_cii_scores",
+                              [["merged_lts3_with_CII_scores_table_MEAN", "CII_Score"],
+                               [get_connectivity_attribute(), "Connectivity_Score"]],
+                              [["CII_Score", 0.67], ["Connectivity_Score", 0.33]], "Overall_Score")
 
 # Generate LTS3 subsets per county
 def generate_LTS3_subsets_per_county():
-    for county in county_list:
-        expr = "lts3_top30pct_COUNTIES = '" + county + "'"
-        print(expr)
-        arcpy.SelectLayerByAttribute_management("aggregated_lts3_top30pct_with_cii_scores",
-                                                "NEW_SELECTION", expr)
-        arcpy.CopyFeatures_management("aggregated_lts3_top30pct_with_cii_scores", "lts3_with_cii_scores_" + county)
-        arcpy.SelectLayerByAttribute_management("aggregated_lts3_top30pct_with_cii_scores", "CLEAR_SELECTION")
-
-        # Add a field where we put a normalized overall score so that each county
-        # has a max value that is a true 20
-        arcpy.AddField_management("lts3_with_cii_scores_" + county, "Norm_Overall_Score_Per_County", "Double")
-        max_overall_score = get_max("lts3_with_cii_scores_" + county,"Overall_Score")
-        overall_score_norm_expr = "(float(!Overall_Score!) / " + str(max_overall_score) + ")*20"
-        arcpy.CalculateField_management("lts3_with_cii_scores_" + county, "Norm_Overall_Score_Per_County", overall_score_norm_expr, "PYTHON_9.3")
-
-# Rank an LTS3 subsets according to a specific attribute and select the top third.
-# Also select the top 20 rows.
-def generate_top_ranked_subset(in_feature_class, ranking_attribute, out_feature_class):
-    # Sort the feature class
-    arcpy.Sort_management(in_feature_class, out_feature_class, [[ranking_attribute, "DESCENDING"]])
-    # Add a rank attribute and populate it
-    arcpy.AddField_management(out_feature_class, "Rank", "LONG")
-    arcpy.CalculateField_management(out_feature_class, "Rank", "!OBJECTID!", "PYTHON_9.3")
-
-    # Create a new feature class with the top third rows
-    max_rank = get_max(out_feature_class,"Rank")
-    one_third_rows = max_rank / 3
-    #print(one_third_rows)
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "NEW_SELECTION", "Rank <= " + str(one_third_rows))
-    arcpy.CopyFeatures_management(out_feature_class, out_feature_class + "_top10pct" )
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "CLEAR_SELECTION")
-
-    #  Create a new feature class with the top 20 rows
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "NEW_SELECTION", "Rank <= 20")
-    arcpy.CopyFeatures_management(out_feature_class, out_feature_class + "_top20" )
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "CLEAR_SELECTION")
-
-# Generate the original top 10% subset for a specific county
-def generate_LTS3_orig_10pct_subsets_per_county(county_name):
-    # Select the top 10% LTS3 road segments using the original attribute Top10percent
-    arcpy.SelectLayerByAttribute_management("lts3_with_cii_scores_" + county_name, "NEW_SELECTION",
-                                            "lts3_top30pct_TOP10PERCE = 1")
-    # Save to a new feature class and do some clean up
-    arcpy.CopyFeatures_management("lts3_with_cii_scores_" + county_name,
-                                  "lts3_orig_10pct_ranked_" + county_name)
-    arcpy.SelectLayerByAttribute_management("lts3_with_cii_scores_" + county_name, "CLEAR_SELECTION")
+    # Read the scored segments once and write one feature class per county, with a field where
+    # we put a normalized overall score so that each county has a max value that is a true 20
+    write_normalized_partitions("aggregated_lts3_top30pct_with_cii_scores", "lts3_top30pct_COUNTIES",
+                                county_list, "lts3_with_cii_scores_{0}", "Overall_Score",
+                                "Norm_Overall_Score_Per_County")
 
 # Generate top 10% subsets for all 4 counties and on two different sorting criteria:
-# the new overall score and the original connectivity score)
+# the new overall score (the top third and the top 20 rows) and the original connectivity score
+# (the segments of the original attribute Top10percent).
+# The scored segments are read once, and ranked per county in memory. Within a county, ranking by
+# Overall_Score gives the same order as ranking by Norm_Overall_Score_Per_County (which is
+# Overall_Score divided by the max of the county).
 def generate_LTS3_10pct_subsets_per_county():
-    for county in county_list:
-        generate_top_ranked_subset("lts3_with_cii_scores_" + county, "Norm_Overall_Score_Per_County",
-                                    "lts3_overall_score_ranked_" + county)
-        generate_LTS3_orig_10pct_subsets_per_county(county)
+    write_ranked_subsets("aggregated_lts3_top30pct_with_cii_scores",
+                         [["Overall_Score", [["lts3_overall_score_ranked_{0}_top10pct", 1 / 3.0],
+                                             ["lts3_overall_score_ranked_{0}_top20", 20]]],
+                          ["lts3_top30pct_TOP10PERCE", [["lts3_orig_10pct_ranked_{0}", ["min_value", 1]]]]],
+                         "lts3_top30pct_COUNTIES", county_list)
 
 def load_and_initiate():
     if COMPUTE_FROM_SCRATCH_OPTION == "yes":
@@ -229,8 +143,18 @@ def load_and_initiate():
 def preprocess_layers():
     if COMPUTE_FROM_SCRATCH_OPTION == "yes":
         select_top30pct_lts3()
-        buffer_lts3()
-        compute_CII_scores_per_lts3()
+        if COMPUTE_CONNECTIVITY_OPTION == "yes":
+            compute_connectivity_per_lts3()
+        if FAST_BUFFER_MEANS_OPTION == "yes":
+            compute_approximate_CII_scores_per_lts3()
+        elif INCREMENTAL_EDGE_SCORES_OPTION == "yes":
+            compute_CII_scores_per_lts3_incrementally()
+        else:
+            # The buffers and zonal statistics are served from the cache if the LTS3 segments
+            # and the CII raster did not change since a previous run
+            run_cached_function(buffer_lts3, ["lts3_top30pct"], ["lts3_top30pct_buffered"])
+            run_cached_function(compute_CII_scores_per_lts3, ["lts3_top30pct_buffered", cii_overall_score_ras],
+                                ["merged_lts3_with_CII_scores_table"])
         aggregate_all_zonalTables()
 
 def generate_scores():
@@ -240,8 +164,10 @@ def generate_scores():
 
 # ***************************************
 # Begin Main
-print_time_stamp("Start")
-load_and_initiate()
-#preprocess_layers()
-generate_scores()
-print_time_stamp("Done")
+# (only when the script is executed, not when the worker processes import it)
+if __name__ == "__main__":
+    print_time_stamp("Start")
+    load_and_initiate()
+    #preprocess_layers()
+    generate_scores()
+    print_time_stamp("Done")
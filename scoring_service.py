@@ -0,0 +1,269 @@
+# ***************************************
+# ***Overview***
+# Script name: scoring_service.py
+# Purpose: This Python script runs a small local service that scores proposed bike alignments the way
+#          roads.py scores the LTS3 road segments: the mean CII score in the 1 mile buffer around the
+#          alignment, the CII and connectivity scores normalized by the maxima of the scored LTS3
+#          segments, the Overall_Score, and the rank the alignment would get among the segments of its county.
+#          The CII raster is loaded once into a prefix-sum index (the running sums of the cells of every
+#          row), so that the sum of the cells in a buffer only needs two lookups per row of the buffer:
+#          the buffer is never built nor rasterized, and each request is answered in milliseconds.
+#          The service listens on localhost only (HTTP, POST /score), or reads requests from the
+#          standard input, one JSON object per line. A request is a JSON object such as:
+#            {"paths": [[[x1, y1], [x2, y2], ...], ...], "connectivity": 12, "county": "Bucks"}
+#          with the coordinates in NAD 1983 UTM Zone 18N. "connectivity" (the connectivity value of the
+#          alignment, in the attribute roads.py normalizes: TOTAL, or the length of the islands joined with
+#          COMPUTE_CONNECTIVITY_OPTION) defaults to 0, and "county" to the county containing its midpoint.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# Commands to start the service with the ArcGIS Python interpreter (add --stdin to read the requests
+# from the standard input instead of HTTP):
+#           cd C:\Users\delph\Desktop\Github_repos\Connectivity-And-Impact
+#           python scoring_service.py --port 8765
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import argparse
+import json
+import sys
+import time
+import numpy as np
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Import local modules:
+from config import *
+from utilities import *
+from zonal_statistics import *
+from connectivity import *
+
+# Radius of the buffers (1 mile, as in roads.py)
+buffer_radius = 1609.34
+# Feature class of the scored LTS3 road segments (generated by roads.py)
+scored_lts3 = gdb_output_roads + "\\aggregated_lts3_top30pct_with_cii_scores"
+
+# *****************************************
+# Functions
+
+# Build the prefix-sum index of a raster: for every row, the running sums of the values
+# and of the number of valid cells (NoData cells count as 0), with a leading column of zeros
+def build_prefix_sum_index(values, grid):
+    is_valid = ~np.isnan(values)
+    sums = np.zeros((grid["n_rows"], grid["n_cols"] + 1), dtype=np.float64)
+    counts = np.zeros((grid["n_rows"], grid["n_cols"] + 1), dtype=np.int64)
+    np.cumsum(np.where(is_valid, values, 0), axis=1, out=sums[:, 1:])
+    np.cumsum(is_valid, axis=1, out=counts[:, 1:])
+    return {"grid": grid, "sums": sums, "counts": counts}
+
+# Get the intervals [x left, x right] where horizontal lines (at the heights row_y) cross disks of a
+# given radius around points. Returns two arrays (rows, points), NaN where a line misses a disk.
+def get_disk_intervals(points, row_y, radius):
+    dy = row_y[:, None] - points[None, :, 1]
+    with np.errstate(invalid="ignore"):
+        half_width = np.sqrt(radius * radius - dy * dy)
+    return points[None, :, 0] - half_width, points[None, :, 0] + half_width
+
+# Get the intervals where horizontal lines cross the rectangles of a given half width around segments
+# (from start_points to end_points). Returns two arrays (rows, segments), NaN where a line misses a rectangle.
+def get_rectangle_intervals(start_points, end_points, row_y, radius):
+    directions = end_points - start_points
+    lengths = np.hypot(directions[:, 0], directions[:, 1])
+    keep = lengths > 0
+    normals = np.zeros_like(directions)
+    normals[keep] = np.column_stack([-directions[keep, 1], directions[keep, 0]]) / lengths[keep, None] * radius
+    corners = [start_points + normals, end_points + normals, end_points - normals, start_points - normals]
+    lefts = np.full((len(row_y), len(start_points)), np.inf)
+    rights = np.full((len(row_y), len(start_points)), -np.inf)
+    y = row_y[:, None]
+    for i in range(4):
+        p, q = corners[i], corners[(i + 1) % 4]
+        crossing = (p[None, :, 1] <= y) != (q[None, :, 1] <= y)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x = p[None, :, 0] + (y - p[None, :, 1]) * (q[None, :, 0] - p[None, :, 0]) / (q[None, :, 1] - p[None, :, 1])
+        lefts = np.where(crossing, np.minimum(lefts, x), lefts)
+        rights = np.where(crossing, np.maximum(rights, x), rights)
+    missed = (lefts > rights) | ~keep[None, :]
+    lefts[missed] = np.nan
+    rights[missed] = np.nan
+    return lefts, rights
+
+# Get the sum and the number of valid cells of the raster in the buffer of a polyline, with the
+# same rule as the rasterization of the buffers (the cells whose center is in the buffer).
+# The buffer is the union of disks around the vertices and of rectangles around the segments: on
+# every row, their intervals are merged and the cells of the merged runs are summed from the index.
+def get_buffer_sum(index, paths, radius=buffer_radius):
+    grid = index["grid"]
+    vertices = np.concatenate(paths)
+    start_points = np.concatenate([path[:-1] for path in paths])
+    end_points = np.concatenate([path[1:] for path in paths])
+    first_row = max(int(np.floor((grid["y_max"] - vertices[:, 1].max() - radius) / grid["cell_height"])), 0)
+    last_row = min(int(np.ceil((grid["y_max"] - vertices[:, 1].min() + radius) / grid["cell_height"])), grid["n_rows"])
+    if first_row >= last_row:
+        return 0.0, 0
+    rows = np.arange(first_row, last_row)
+    row_y = grid["y_max"] - (rows + 0.5) * grid["cell_height"]
+    disk_lefts, disk_rights = get_disk_intervals(vertices, row_y, radius)
+    rectangle_lefts, rectangle_rights = get_rectangle_intervals(start_points, end_points, row_y, radius)
+    lefts = np.concatenate([disk_lefts, rectangle_lefts], axis=1)
+    rights = np.concatenate([disk_rights, rectangle_rights], axis=1)
+
+    # Columns of the cell centers in every interval: [first col, last col + 1) (empty for NaN)
+    first_cols = np.ceil((lefts - grid["x_min"]) / grid["cell_width"] - 0.5)
+    end_cols = np.floor((rights - grid["x_min"]) / grid["cell_width"] - 0.5) + 1
+    is_missed = np.isnan(first_cols)
+    first_cols = np.clip(np.where(is_missed, 0, first_cols), 0, grid["n_cols"]).astype(np.int64)
+    end_cols = np.clip(np.where(is_missed, 0, end_cols), 0, grid["n_cols"]).astype(np.int64)
+    end_cols = np.maximum(end_cols, first_cols)
+
+    # Merge the intervals of every row: sorted by first column, each interval only adds the
+    # columns past the furthest end of the intervals before it
+    order = np.argsort(first_cols, axis=1, kind="mergesort")
+    row_positions = np.arange(len(rows))[:, None]
+    first_cols = first_cols[row_positions, order]
+    end_cols = end_cols[row_positions, order]
+    previous_ends = np.zeros_like(end_cols)
+    previous_ends[:, 1:] = np.maximum.accumulate(end_cols, axis=1)[:, :-1]
+    new_first_cols = np.maximum(first_cols, previous_ends)
+    new_end_cols = np.maximum(end_cols, previous_ends)
+    row_index = rows[:, None]
+    total = (index["sums"][row_index, new_end_cols] - index["sums"][row_index, new_first_cols]).sum()
+    count = (index["counts"][row_index, new_end_cols] - index["counts"][row_index, new_first_cols]).sum()
+    return float(total), int(count)
+
+# Get the point halfway along a polyline
+def get_midpoint(paths):
+    segments = [(start, end) for path in paths for start, end in zip(path[:-1], path[1:])]
+    lengths = np.array([np.hypot(*(end - start)) for start, end in segments])
+    if len(segments) == 0 or lengths.sum() == 0:
+        return np.concatenate(paths)[0]
+    i = int(np.searchsorted(np.cumsum(lengths), lengths.sum() / 2))
+    i = min(i, len(segments) - 1)
+    start, end = segments[i]
+    fraction = (lengths.sum() / 2 - (np.cumsum(lengths)[i] - lengths[i])) / lengths[i] if lengths[i] > 0 else 0
+    return start + fraction * (end - start)
+
+# Check whether a point is inside a polygon given by its rings (even-odd rule)
+def is_point_in_rings(point, rings):
+    inside = False
+    for ring in rings:
+        x0, y0 = ring[:, 0], ring[:, 1]
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+        crossing = (y0 <= point[1]) != (y1 <= point[1])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            crossing_x = x0 + (point[1] - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= bool((crossing & (crossing_x > point[0])).sum() % 2)
+    return inside
+
+# Load everything the service needs, once: the prefix-sum index of the CII raster, the maxima
+# used by compute_overall_scores() to normalize the scores, the sorted Overall_Score of the
+# scored segments of every county, and the county boundaries
+def load_scoring_index(cii_raster=cii_overall_score_ras, scored_segments=scored_lts3):
+    values, grid = read_raster_as_array(cii_raster)
+    index = build_prefix_sum_index(values, grid)
+    with arcpy.da.SearchCursor(scored_segments, ["merged_lts3_with_CII_scores_table_MEAN", get_connectivity_attribute(),
+                                                 "Overall_Score", "lts3_top30pct_COUNTIES"]) as cursor:
+        segments = [row for row in cursor if None not in row]
+    index["mean_max"] = float(max([row[0] for row in segments]))
+    index["connectivity_max"] = float(max([row[1] for row in segments]))
+    index["county_scores"] = dict((county, np.sort([row[2] for row in segments if row[3] == county]))
+                                  for county in county_list)
+    index["counties"] = []
+    with arcpy.da.SearchCursor(county_boundaries, [county_name_field, "SHAPE@"],
+                               spatial_reference=grid["spatial_reference"]) as cursor:
+        for county, geometry in cursor:
+            if county in county_list and geometry is not None:
+                index["counties"].append([county, get_polygon_rings(geometry)])
+    return index
+
+# Score a proposed alignment (a list of paths, each a list of [x, y] in NAD 1983 UTM Zone 18N)
+# like compute_overall_scores() and generate_LTS3_subsets_per_county() score the LTS3 segments
+def score_alignment(index, paths, connectivity=0, county=None):
+    paths = [np.array(path, dtype=np.float64).reshape(-1, 2) for path in paths if len(path) > 0]
+    if not paths:
+        raise ValueError("The alignment has no vertices")
+    total, count = get_buffer_sum(index, paths)
+    if count == 0:
+        raise ValueError("The buffer of the alignment has no CII values")
+    mean = total / count
+    cii_score = mean / index["mean_max"] * 20
+    connectivity_score = float(connectivity) / index["connectivity_max"] * 20
+    overall_score = cii_score * 0.67 + connectivity_score * 0.33
+    result = {"MEAN": mean, "COUNT": count, "CII_Score": cii_score, "Connectivity_Score": connectivity_score,
+              "Overall_Score": overall_score, "county": county}
+    if county is None:
+        midpoint = get_midpoint(paths)
+        for county_name, rings in index["counties"]:
+            if is_point_in_rings(midpoint, rings):
+                result["county"] = county_name
+                break
+    if result["county"] in index["county_scores"]:
+        county_scores = index["county_scores"][result["county"]]
+        # Rank among the county's segments (1 is the best), and the score normalized by the county max
+        result["county_rank"] = int(len(county_scores) - np.searchsorted(county_scores, overall_score, side="right")) + 1
+        result["county_num_of_segments"] = len(county_scores)
+        if len(county_scores) > 0 and county_scores[-1] > 0:
+            result["Norm_Overall_Score_Per_County"] = overall_score / float(county_scores[-1]) * 20
+    return result
+
+# Answer a request (a JSON text), and return the JSON text of the response
+def answer_request(index, request_text):
+    start_time = time.time()
+    try:
+        request = json.loads(request_text)
+        response = score_alignment(index, request["paths"], request.get("connectivity", 0),
+                                   request.get("county"))
+    except (ValueError, KeyError, TypeError) as error:
+        response = {"error": str(error)}
+    response["elapsed_ms"] = (time.time() - start_time) * 1000
+    return json.dumps(response)
+
+# Create the HTTP request handler class of the service (POST /score)
+def make_request_handler(index):
+    class ScoringRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/score":
+                self.send_error(404)
+                return
+            request_text = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            response_text = answer_request(index, request_text).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response_text)))
+            self.end_headers()
+            self.wfile.write(response_text)
+    return ScoringRequestHandler
+
+# Serve the requests over HTTP, on localhost only
+def serve_http(index, port=SCORING_SERVICE_PORT):
+    server = HTTPServer(("127.0.0.1", port), make_request_handler(index))
+    print("Scoring service listening on http://127.0.0.1:" + str(port) + "/score")
+    server.serve_forever()
+
+# Serve the requests read from the standard input (one JSON object per line)
+def serve_stdin(index):
+    for line in iter(sys.stdin.readline, ""):
+        if line.strip():
+            sys.stdout.write(answer_request(index, line) + "\n")
+            sys.stdout.flush()
+
+# ***************************************
+# Begin Main
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score proposed bike alignments against the CII raster")
+    parser.add_argument("--port", type=int, default=SCORING_SERVICE_PORT)
+    parser.add_argument("--stdin", action="store_true", help="read the requests from the standard input")
+    arguments = parser.parse_args()
+    print_time_stamp("Start loading")
+    scoring_index = load_scoring_index()
+    print_time_stamp("Done loading")
+    if arguments.stdin:
+        serve_stdin(scoring_index)
+    else:
+        serve_http(scoring_index, arguments.port)
@@ -0,0 +1,133 @@
+# ***************************************
+# ***Overview***
+# Script name: shards.py
+# Purpose: This Python module splits the raster steps of the analysis into shards that run in
+#          parallel worker processes: square tiles of the grid, or the counties. Every cell of the grid
+#          belongs to exactly one shard. Each shard is computed on its window plus a halo margin as wide
+#          as the largest distance the step looks at (e.g. the 5 mile distance band), so that its cells
+#          get exactly the same values as in a single run over the whole extent. The shards are then
+#          merged into one array, each shard only giving the values of its own cells.
+#          This lets the same scripts run on bigger regions (e.g. the 9 DVRPC counties).
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from zonal_statistics import *
+
+# *****************************************
+# Functions
+
+# Get the number of cells of the halo margin needed by a step looking up to a distance (in meters)
+def get_halo_num_of_cells(distance, grid):
+    return int(np.ceil(distance / min(grid["cell_width"], grid["cell_height"]))) + 1
+
+# Create a shard: its window (first row, last row, first col, last col), the same window grown
+# by the halo margin (clipped to the grid), and the mask of its own cells in the window
+# (None when all the cells of the window are its own)
+def make_shard(name, window, halo_num_of_cells, grid, mask=None):
+    first_row, last_row, first_col, last_col = window
+    halo_window = [max(first_row - halo_num_of_cells, 0), min(last_row + halo_num_of_cells, grid["n_rows"]),
+                   max(first_col - halo_num_of_cells, 0), min(last_col + halo_num_of_cells, grid["n_cols"])]
+    return {"name": name, "window": window, "halo_window": halo_window, "mask": mask}
+
+# Split the grid into square tiles of shard_size cells
+def get_tile_shards(grid, halo_num_of_cells, shard_size=SHARD_SIZE):
+    shards = []
+    for first_row in range(0, grid["n_rows"], shard_size):
+        for first_col in range(0, grid["n_cols"], shard_size):
+            window = [first_row, min(first_row + shard_size, grid["n_rows"]),
+                      first_col, min(first_col + shard_size, grid["n_cols"])]
+            shards.append(make_shard("tile_" + str(first_row) + "_" + str(first_col), window,
+                                     halo_num_of_cells, grid))
+    return shards
+
+# Rasterize the counties of the list: every cell gets the index of the county that contains its
+# center (the first one in the list for a cell on the border of two counties), or -1
+def get_county_labels(grid, counties=county_list):
+    labels = np.full((grid["n_rows"], grid["n_cols"]), -1, dtype=np.int16)
+    with arcpy.da.SearchCursor(county_boundaries, [county_name_field, "SHAPE@"],
+                               spatial_reference=grid["spatial_reference"]) as cursor:
+        for county_name, geometry in cursor:
+            if county_name not in counties or geometry is None:
+                continue
+            window = rasterize_polygon(get_polygon_rings(geometry), grid)
+            if window is None:
+                continue
+            first_row, first_col, mask = window
+            county_window = labels[first_row:first_row + mask.shape[0], first_col:first_col + mask.shape[1]]
+            county_window[mask & (county_window == -1)] = counties.index(county_name)
+    return labels
+
+# Split a labelled grid into shards: one shard per label (the bounding box of its cells, with the
+# mask of its cells), plus tile shards for the cells without a label (-1), so that every cell of
+# the grid belongs to exactly one shard
+def get_label_shards(labels, names, grid, halo_num_of_cells, shard_size=SHARD_SIZE):
+    shards = []
+    for label, name in enumerate(names):
+        is_label = labels == label
+        rows = np.nonzero(is_label.any(axis=1))[0]
+        if len(rows) == 0:
+            continue
+        cols = np.nonzero(is_label.any(axis=0))[0]
+        window = [int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1]
+        shards.append(make_shard(name, window, halo_num_of_cells, grid,
+                                 is_label[window[0]:window[1], window[2]:window[3]]))
+    for shard in get_tile_shards(grid, halo_num_of_cells, shard_size):
+        first_row, last_row, first_col, last_col = shard["window"]
+        mask = labels[first_row:last_row, first_col:last_col] == -1
+        if mask.any():
+            shard["mask"] = None if mask.all() else mask
+            shards.append(shard)
+    return shards
+
+# Split the grid by county: one shard per county of county_list (with the cells whose center is
+# in the county), plus tile shards for the cells outside of the counties (e.g. at the corners of the extent)
+def get_county_shards(grid, halo_num_of_cells, counties=county_list):
+    return get_label_shards(get_county_labels(grid, counties), counties, grid, halo_num_of_cells)
+
+# Get the shards of the grid according to SHARDING_OPTION
+def get_shards(grid, halo_num_of_cells, sharding_option=SHARDING_OPTION):
+    if sharding_option == "counties":
+        return get_county_shards(grid, halo_num_of_cells)
+    return get_tile_shards(grid, halo_num_of_cells)
+
+# Worker function for the process pool: run the step on the arrays of one shard (with its halo)
+def run_shard_worker(arguments):
+    function, arrays, extra_arguments = arguments
+    return function(*(list(arrays) + list(extra_arguments)))
+
+# Run a step that maps arrays on the grid to an array on the grid, shard by shard in parallel,
+# and merge the results: every shard only contributes its own cells (without the halo).
+# The step is called as function(*(shard arrays + extra_arguments)).
+def run_sharded_function(function, arrays, shards, extra_arguments=()):
+    tasks = []
+    for shard in shards:
+        first_row, last_row, first_col, last_col = shard["halo_window"]
+        tasks.append((function, [array[first_row:last_row, first_col:last_col] for array in arrays],
+                      extra_arguments))
+    results = map_in_process_pool(run_shard_worker, tasks)
+    merged = None
+    for shard, result in zip(shards, results):
+        if merged is None:
+            merged = np.zeros(arrays[0].shape, dtype=result.dtype)
+        first_row, last_row, first_col, last_col = shard["window"]
+        halo_first_row, halo_first_col = shard["halo_window"][0], shard["halo_window"][2]
+        window_result = result[first_row - halo_first_row:last_row - halo_first_row,
+                               first_col - halo_first_col:last_col - halo_first_col]
+        if shard["mask"] is None:
+            merged[first_row:last_row, first_col:last_col] = window_result
+        else:
+            merged_window = merged[first_row:last_row, first_col:last_col]
+            merged_window[shard["mask"]] = window_result[shard["mask"]]
+    return merged
@@ -58,18 +58,27 @@ def symbolize_vectors():
     arcpy.RefreshActiveView()
     arcpy.RefreshTOC()
 
-# Recalculate the statistics for every rasters -- This is necessary for the step
-# lyr.symbology.reclassify() to work properly later on
+# Build the pyramids and calculate the statistics of the displayed score rasters -- This is
+# necessary for the step lyr.symbology.reclassify() to work properly later on.
+# The work is only done where it is missing (SKIP_EXISTING): the pyramids are built the first
+# time a raster is displayed, and kept until the raster is written again.
 def recalculate_raster_statistics():
-    for ras in rasters_to_symbolize:
-        # First some cleanup (we need to remove the previously displayed layer):
-        remove_intermediary_layers([ras + "1"])
+    mxd = arcpy.mapping.MapDocument("CURRENT")
+    df = arcpy.mapping.ListDataFrames(mxd)[0]
+    for layer_name in rasters_to_symbolize:
+        # The layer of a raster has its name with a "1" at the end (see community_impact_index.py)
+        ras = gdb_output_CII + "\\" + layer_name[:-1]
+        # First some cleanup (we need to remove the previously displayed layer, which locks the raster):
+        for lyr in arcpy.mapping.ListLayers(mxd, layer_name, df):
+            arcpy.mapping.RemoveLayer(df, lyr)
 
-        # Now build the pyramids, and calculate the statistics on each rasters
-        # on the drive. The Calculate_Statistics will also show the raster as a layer:
-        print("Calculate Stats:" + ras)
-        arcpy.BatchBuildPyramids_management(gdb_output + "\\" + ras)
-        arcpy.CalculateStatistics_management(gdb_output + "\\" + ras)
+        # Now build the pyramids, and calculate the statistics of the raster on the drive
+        # (nearest neighbor keeps the score values in the pyramids, and LZ77 compresses them without loss)
+        print("Calculate Stats:" + layer_name[:-1])
+        arcpy.BuildPyramids_management(ras, -1, "NONE", "NEAREST", "LZ77", 75, "SKIP_EXISTING")
+        arcpy.CalculateStatistics_management(ras, skip_existing="SKIP_EXISTING")
+        # And display the raster again
+        arcpy.MakeRasterLayer_management(ras, layer_name)
 
 # Apply the chosen symbolization to each raster
 def apply_raster_symbolization():
@@ -94,7 +103,7 @@ def apply_raster_symbolization():
     arcpy.RefreshTOC()
 
 def symbolize_rasters():
-    #recalculate_raster_statistics()
+    recalculate_raster_statistics()
     apply_raster_symbolization()
 
 # ***************************************
@@ -0,0 +1,31 @@
+# Stand-ins for the arcpy geometries read by the numpy kernels: a geometry is a list of parts, each
+# a list of points (None between the exterior ring and the interior rings of a polygon part).
+# A curved geometry only stores the end vertices of its arcs, and densify() gives the vertices
+# along the true curves.
+
+
+class FakePoint(object):
+    def __init__(self, x, y):
+        self.X = x
+        self.Y = y
+
+
+class FakeGeometry(object):
+    def __init__(self, parts, densified_parts=None):
+        self.parts = parts
+        self.hasCurves = densified_parts is not None
+        self.densified_parts = densified_parts
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def densify(self, method, distance, deviation):
+        return FakeGeometry(self.densified_parts)
+
+
+def make_part(coordinates):
+    return [None if xy is None else FakePoint(*xy) for xy in coordinates]
+
+
+def make_geometry(parts):
+    return FakeGeometry([make_part(part) for part in parts])
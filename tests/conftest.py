@@ -0,0 +1,33 @@
+# ***************************************
+# ***Overview***
+# Script name: conftest.py
+# Purpose: This pytest configuration lets the tests import the modules of the project outside of ArcGIS.
+#          The tests only cover the numpy kernels (classification, distance transforms, rasterization,
+#          union-find, proximity join, KML parsing, reprojection...), which do not call arcpy: when arcpy
+#          is not installed, a minimal stand-in module is put in its place so that the imports succeed.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+import os
+import sys
+import types
+
+# The modules of the project are at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import arcpy
+except ImportError:
+    class Environment(object):
+        pass
+    arcpy = types.ModuleType("arcpy")
+    arcpy.env = Environment()
+    sys.modules["arcpy"] = arcpy
+    for submodule_name in ["da", "sa", "mapping"]:
+        submodule = types.ModuleType("arcpy." + submodule_name)
+        setattr(arcpy, submodule_name, submodule)
+        sys.modules["arcpy." + submodule_name] = submodule
@@ -0,0 +1,49 @@
+# Tests of the code part of the cache keys (cache.py)
+
+import hashlib
+import os
+import sys
+
+import cache
+
+
+def write_module(folder, name, source, modification_time):
+    path = os.path.join(str(folder), name + ".py")
+    with open(path, "w") as module_file:
+        module_file.write(source)
+    os.utime(path, (modification_time, modification_time))
+
+
+def import_fresh(name):
+    sys.modules.pop(name, None)
+    return __import__(name)
+
+
+def get_function_hash(function):
+    hasher = hashlib.sha1()
+    cache.hash_function(function, hasher)
+    return hasher.hexdigest()
+
+
+def test_editing_a_helper_in_another_module_changes_the_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "project_folder", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(tmp_path, "cache_test_helpers", "def helper():\n    return 1\n", 1000000)
+    write_module(tmp_path, "cache_test_steps",
+                 "from cache_test_helpers import *\n\ndef step():\n    return helper()\n", 1000000)
+    import_fresh("cache_test_helpers")
+    step = import_fresh("cache_test_steps").step
+    source_files = cache.get_function_source_files(step)
+    assert sorted(os.path.basename(path) for path in source_files) == ["cache_test_helpers.py",
+                                                                       "cache_test_steps.py"]
+    key = get_function_hash(step)
+    assert get_function_hash(step) == key
+
+    # The step itself is unchanged, only the helper it calls is edited
+    write_module(tmp_path, "cache_test_helpers", "def helper():\n    return 2\n", 1000010)
+    assert get_function_hash(step) != key
+
+
+def test_modules_outside_of_the_project_are_ignored():
+    assert cache.get_local_source_file(os) is None
+    assert cache.get_local_source_file(None) is None
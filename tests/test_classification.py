@@ -0,0 +1,91 @@
+# Tests of the Jenks natural breaks classifier (classification.py)
+
+import numpy as np
+import pytest
+
+import classification
+from classification import *
+
+
+def test_sample_mode_reports_the_fit_on_all_the_cells():
+    random = np.random.RandomState(0)
+    cell_values = np.concatenate([random.normal(10, 2, 30000), random.normal(40, 5, 20000),
+                                  random.normal(90, 3, 10000), [np.nan] * 100])
+    breaks, gvf = compute_natural_breaks(cell_values, 5, "sample")
+    valid_values = cell_values[~np.isnan(cell_values)]
+    assert gvf == compute_goodness_of_variance_fit(valid_values, np.ones(valid_values.size), np.array(breaks))
+
+
+# Best total squared deviation over every way of splitting sorted weighted values into classes
+def find_best_deviation_brute_force(values, weights, num_of_classes):
+    def deviation(first, last):
+        class_values = values[first:last + 1]
+        class_weights = weights[first:last + 1]
+        mean = np.sum(class_weights * class_values) / np.sum(class_weights)
+        return np.sum(class_weights * (class_values - mean) ** 2)
+
+    def best(first, num_of_classes_left):
+        if num_of_classes_left == 1:
+            return deviation(first, len(values) - 1)
+        return min(deviation(first, last) + best(last + 1, num_of_classes_left - 1)
+                   for last in range(first, len(values) - num_of_classes_left + 1))
+
+    return best(0, num_of_classes)
+
+
+def get_total_deviation(values, weights, class_ends):
+    total = 0.0
+    first = 0
+    for last in class_ends:
+        class_values = values[first:last + 1]
+        class_weights = weights[first:last + 1]
+        mean = np.sum(class_weights * class_values) / np.sum(class_weights)
+        total += np.sum(class_weights * (class_values - mean) ** 2)
+        first = last + 1
+    return total
+
+
+def test_weighted_jenks_is_optimal():
+    random = np.random.RandomState(3)
+    for trial in range(5):
+        values = np.sort(random.choice(np.arange(100.0), 12, replace=False))
+        weights = random.randint(1, 20, 12).astype(np.float64)
+        class_ends = compute_weighted_jenks_classes(values, weights, 4)
+        assert len(class_ends) == 4 and class_ends[-1] == 11
+        assert np.isclose(get_total_deviation(values, weights, class_ends),
+                          find_best_deviation_brute_force(values, weights, 4))
+
+
+def test_fewer_values_than_classes():
+    assert compute_weighted_jenks_classes(np.array([1.0, 2.0]), np.array([1.0, 1.0]), 5) == [0, 1]
+
+
+def test_unique_mode_separates_clear_groups():
+    cell_values = np.array([1.0] * 50 + [2.0] * 30 + [10.0] * 40 + [11.0] * 10 + [30.0] * 5 + [np.nan] * 3)
+    breaks, gvf = compute_natural_breaks(cell_values, 3, "unique")
+    assert breaks == [2.0, 11.0, 30.0]
+    assert 0.9 < gvf <= 1.0
+
+
+def test_histogram_mode_is_close_to_the_exact_breaks():
+    random = np.random.RandomState(4)
+    cell_values = np.round(np.concatenate([random.normal(10, 1, 5000), random.normal(50, 2, 5000),
+                                           random.normal(100, 3, 5000)]), 1)
+    exact_breaks, exact_gvf = compute_natural_breaks(cell_values, 3, "unique")
+    histogram_breaks, histogram_gvf = compute_natural_breaks(cell_values, 3, "histogram")
+    assert histogram_breaks[-1] == cell_values.max()
+    assert np.allclose(exact_breaks, histogram_breaks, atol=(cell_values.max() - cell_values.min()) / 100)
+    assert abs(exact_gvf - histogram_gvf) < 0.01
+
+
+def test_unknown_mode_is_an_error():
+    with pytest.raises(ValueError, match="Unknown natural breaks mode: exact"):
+        compute_natural_breaks(np.array([1.0, 2.0, 3.0]), 2, "exact")
+
+
+def test_raster_without_values_is_an_error_naming_it(monkeypatch):
+    monkeypatch.setattr(classification, "read_raster_as_array", lambda raster: (np.full((3, 4), np.nan), None))
+    with pytest.raises(ValueError, match="nata_resp_ras"):
+        slice_natural_breaks("nata_resp_ras", 20, "nata_resp_score_ras")
+    with pytest.raises(ValueError, match="NoData"):
+        compute_natural_breaks(np.full(5, np.nan), 20)
@@ -0,0 +1,73 @@
+# Tests of the snapping, union-find and island connectivity of the LTS3 segments (connectivity.py)
+
+import numpy as np
+
+from connectivity import *
+
+
+# Connected components by depth-first search, labeled by their smallest node
+def find_components_reference(num_of_nodes, from_nodes, to_nodes):
+    neighbors = [[] for i in range(num_of_nodes)]
+    for a, b in zip(from_nodes, to_nodes):
+        neighbors[a].append(b)
+        neighbors[b].append(a)
+    components = -np.ones(num_of_nodes, dtype=np.int64)
+    for start in range(num_of_nodes):
+        if components[start] >= 0:
+            continue
+        stack = [start]
+        members = []
+        components[start] = start
+        while stack:
+            node = stack.pop()
+            members.append(node)
+            for neighbor in neighbors[node]:
+                if components[neighbor] < 0:
+                    components[neighbor] = start
+                    stack.append(neighbor)
+    return components
+
+
+def test_union_find_matches_depth_first_search():
+    random = np.random.RandomState(0)
+    from_nodes = random.randint(0, 500, 400)
+    to_nodes = random.randint(0, 500, 400)
+    assert np.array_equal(find_connected_components(500, from_nodes, to_nodes),
+                          find_components_reference(500, from_nodes, to_nodes))
+
+
+def test_snapping_is_by_distance():
+    # Close points across a cell boundary get the same node, far points in the same cell do not
+    points = np.array([[100.45, 0.2], [100.55, 0.2], [200.05, 0.05], [200.95, 0.95], [300.0, 0.0]])
+    node_ids, num_of_nodes = snap_points_to_nodes(points, 1.0)
+    assert num_of_nodes == 4
+    assert node_ids[0] == node_ids[1]
+    assert node_ids[2] != node_ids[3]
+
+
+def test_snapping_matches_all_pairs():
+    random = np.random.RandomState(1)
+    points = random.uniform(0, 30, (300, 2))
+    node_ids, num_of_nodes = snap_points_to_nodes(points, 1.0)
+    differences = points[:, None, :] - points[None, :, :]
+    first_points, second_points = np.nonzero(np.hypot(differences[..., 0], differences[..., 1]) <= 1.0)
+    assert np.array_equal(np.unique(node_ids, return_inverse=True)[1],
+                          np.unique(find_connected_components(300, first_points, second_points),
+                                    return_inverse=True)[1])
+
+
+def test_island_connectivity_groups_the_parts_by_island_id():
+    # Island 7 has two parts that do not touch (600 m + 500 m), island 9 is one part of 2000 m,
+    # island 4 is too short (300 m)
+    island_start_points = np.array([[0.0, 0.0], [5000.0, 0.0], [0.0, 3000.0], [8000.0, 0.0]])
+    island_end_points = np.array([[600.0, 0.0], [5500.0, 0.0], [2000.0, 3000.0], [8300.0, 0.0]])
+    island_ids = [7, 7, 9, 4]
+    island_lengths = np.array([600.0, 500.0, 2000.0, 300.0])
+    # Segments: part 1 of island 7 to island 9, part 1 to part 2 of island 7 (the same island),
+    # island 9 to the short island, and a segment touching no island
+    start_points = np.array([[600.3, 0.0], [600.0, 0.0], [2000.0, 3000.0], [-100.0, -100.0]])
+    end_points = np.array([[0.0, 3000.0], [5000.0, 0.4], [8000.0, 0.0], [-200.0, -200.0]])
+    num_of_islands_joined, length_of_islands_joined = compute_island_connectivity(
+        island_start_points, island_end_points, island_ids, island_lengths, start_points, end_points)
+    assert list(num_of_islands_joined) == [2, 1, 1, 0]
+    assert list(length_of_islands_joined) == [3100.0, 1100.0, 2000.0, 0.0]
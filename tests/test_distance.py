@@ -0,0 +1,64 @@
+# Tests of the exact distance transform and of the distance band scores (distance.py)
+
+import numpy as np
+
+from distance import *
+
+
+# Distance from every cell center to the nearest source cell center, by comparing all the pairs
+def compute_distance_brute_force(sources, cell_width, cell_height):
+    rows, cols = np.mgrid[0:sources.shape[0], 0:sources.shape[1]]
+    source_rows, source_cols = np.nonzero(sources)
+    distances = np.hypot((rows.ravel()[:, None] - source_rows[None, :]) * cell_height,
+                         (cols.ravel()[:, None] - source_cols[None, :]) * cell_width)
+    return distances.min(axis=1).reshape(sources.shape)
+
+
+def make_sources(n_rows, n_cols, num_of_sources, seed):
+    random = np.random.RandomState(seed)
+    sources = np.zeros((n_rows, n_cols), dtype=bool)
+    sources[random.randint(0, n_rows, num_of_sources), random.randint(0, n_cols, num_of_sources)] = True
+    return sources
+
+
+def test_euclidean_distance_is_exact():
+    for seed, (cell_width, cell_height) in enumerate([(30.0, 30.0), (10.0, 25.0)]):
+        sources = make_sources(60, 80, 12, seed)
+        assert np.allclose(compute_euclidean_distance(sources, cell_width, cell_height),
+                           compute_distance_brute_force(sources, cell_width, cell_height))
+
+
+def test_band_scores_match_the_reclassified_distances():
+    thresholds = [400.0, 800.0, 1600.0]
+    scores = [20, 15, 10, 1]
+    sources = make_sources(150, 170, 6, 5)
+    distances = compute_distance_brute_force(sources, 30.0, 30.0)
+    # A cell at exactly a threshold belongs to the band below it, as with a RemapRange
+    expected = np.array(scores, dtype=np.uint8)[np.searchsorted(thresholds, distances, side="left")]
+    assert np.array_equal(compute_band_scores(sources, 30.0, 30.0, thresholds, scores), expected)
+
+
+def test_band_scores_without_sources():
+    band_scores = compute_band_scores(np.zeros((10, 10), dtype=bool), 30.0, 30.0, [100.0], [5, 1])
+    assert np.all(band_scores == 1)
+
+
+def test_updated_band_scores_match_a_full_recomputation():
+    thresholds = [300.0, 900.0]
+    scores = [10, 5, 1]
+    old_sources = make_sources(200, 200, 10, 6)
+    old_band_scores = compute_band_scores(old_sources, 30.0, 30.0, thresholds, scores)
+    sources = old_sources.copy()
+    sources[np.nonzero(old_sources)[0][0], np.nonzero(old_sources)[1][0]] = False
+    sources[20, 180] = True
+    band_scores, windows = update_band_scores(sources, old_sources, old_band_scores, 30.0, 30.0,
+                                              thresholds, scores)
+    assert len(windows) > 0
+    assert np.array_equal(band_scores, compute_band_scores(sources, 30.0, 30.0, thresholds, scores))
+
+
+def test_densified_lines_cross_every_cell():
+    points = np.array([[0.0, 0.0], [100.0, 0.0], [100.0, 37.0]])
+    samples = densify_line(points, 15.0)
+    assert np.array_equal(samples[0], points[0]) and np.array_equal(samples[-1], points[-1])
+    assert np.hypot(*np.diff(samples, axis=0).T).max() <= 15.0
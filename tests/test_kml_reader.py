@@ -0,0 +1,56 @@
+# Tests of the streaming reader of the line features of KML files (kml_reader.py)
+
+import numpy as np
+
+from kml_reader import *
+
+kml_text = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>Trails</name>
+    <Style id="line"><LineStyle><width>2</width></LineStyle></Style>
+    <Folder>
+      <name>Non circuit trails</name>
+      <Placemark>
+        <name>Trail A</name>
+        <LineString><coordinates>-75.1,40.1,0 -75.2,40.2,0
+          -75.3,40.3,0</coordinates></LineString>
+      </Placemark>
+      <Placemark>
+        <name>Trailhead</name>
+        <Point><coordinates>-75.0,40.0,0</coordinates></Point>
+      </Placemark>
+      <Folder>
+        <Placemark>
+          <name>Trail B</name>
+          <MultiGeometry>
+            <LineString><coordinates>-75.4,40.4 -75.5,40.5</coordinates></LineString>
+            <LineString><coordinates>-75.6,40.6 -75.7,40.7</coordinates></LineString>
+          </MultiGeometry>
+        </Placemark>
+      </Folder>
+    </Folder>
+  </Document>
+</kml>
+"""
+
+
+def test_read_kml_lines(tmp_path):
+    kml_file = str(tmp_path / "trails.kml")
+    with open(kml_file, "w") as output:
+        output.write(kml_text)
+    lines = read_kml_lines(kml_file)
+    # The point placemark is skipped, and the names of the containers are not taken as line names
+    assert lines["names"] == ["Trail A", "Trail B"]
+    assert list(lines["part_offsets"]) == [0, 3, 5, 7]
+    assert list(lines["feature_offsets"]) == [0, 1, 3]
+    assert np.allclose(lines["coordinates"][:3], [[-75.1, 40.1], [-75.2, 40.2], [-75.3, 40.3]])
+    parts = get_kml_feature_parts(lines, 1)
+    assert len(parts) == 2
+    assert np.allclose(parts[1], [[-75.6, 40.6], [-75.7, 40.7]])
+
+
+def test_parse_kml_coordinates():
+    assert np.allclose(parse_kml_coordinates(" 1,2,3\n 4,5,6 "), [[1, 2], [4, 5]])
+    assert np.allclose(parse_kml_coordinates("1,2 4,5"), [[1, 2], [4, 5]])
+    assert parse_kml_coordinates("   ").shape == (0, 2)
@@ -0,0 +1,38 @@
+# Tests of the dependency graph of the stages (pipeline.py)
+
+import pipeline
+
+workspace = "C:\\Data\\script_output_CII3.gdb"
+
+
+def do_nothing():
+    pass
+
+
+def make_stage(name, inputs, outputs):
+    stage = pipeline.make_stage(do_nothing, inputs, outputs)
+    stage["name"] = name
+    return stage
+
+
+def test_an_output_name_matches_the_full_path_of_an_input_in_the_workspace():
+    stages = [make_stage("tracts", ["C:\\Data\\orig.gdb\\tracts"], ["tracts_clipped"]),
+              make_stage("by_name", ["tracts_clipped"], ["a_ras"]),
+              make_stage("by_path", [workspace + "\\tracts_clipped"], ["b_ras"]),
+              make_stage("other_gdb", ["C:\\Data\\other.gdb\\tracts_clipped"], ["c_ras"])]
+
+    dependencies = pipeline.get_stage_dependencies(stages, workspace)
+
+    assert dependencies == {"tracts": set(), "by_name": set(["tracts"]),
+                            "by_path": set(["tracts"]), "other_gdb": set()}
+    assert [stage["name"] for stage in pipeline.get_stage_order(stages, workspace)][0] == "tracts"
+
+
+def test_the_inputs_sent_to_a_worker_are_full_paths_and_the_outputs_stay_names():
+    stage = make_stage("by_name", ["tracts_clipped", "C:\\Data\\orig.gdb\\stops"], ["a_ras"])
+
+    description = pipeline.get_stage_description(stage, workspace)
+
+    assert "function" not in description
+    assert description["inputs"] == [workspace + "\\tracts_clipped", "C:\\Data\\orig.gdb\\stops"]
+    assert description["outputs"] == ["a_ras"]
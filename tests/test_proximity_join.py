@@ -0,0 +1,88 @@
+# Tests of the grid-indexed proximity join of line features (proximity_join.py)
+
+import numpy as np
+
+import proximity_join
+from proximity_join import *
+
+from arcpy_fakes import *
+
+
+# Distance from a point to a segment
+def get_point_segment_distance(point, start, end):
+    direction = end - start
+    squared_length = direction.dot(direction)
+    t = 0.0 if squared_length == 0 else min(max((point - start).dot(direction) / squared_length, 0.0), 1.0)
+    return np.hypot(*(point - (start + t * direction)))
+
+
+# Distance between two segments: 0 if they cross, otherwise the smallest end point to segment distance
+def get_segment_distance(start1, end1, start2, end2):
+    def orientation(a, b, c):
+        return np.sign((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+    if (orientation(start1, end1, start2) * orientation(start1, end1, end2) < 0
+            and orientation(start2, end2, start1) * orientation(start2, end2, end1) < 0):
+        return 0.0
+    return min(get_point_segment_distance(start1, start2, end2), get_point_segment_distance(end1, start2, end2),
+               get_point_segment_distance(start2, start1, end1), get_point_segment_distance(end2, start1, end1))
+
+
+def get_line_distance(parts1, parts2):
+    return min(get_segment_distance(np.array(part1[i]), np.array(part1[i + 1]),
+                                    np.array(part2[j]), np.array(part2[j + 1]))
+               for part1 in parts1 for part2 in parts2
+               for i in range(len(part1) - 1) for j in range(len(part2) - 1))
+
+
+def make_random_lines(num_of_lines, seed, extent=5000.0):
+    random = np.random.RandomState(seed)
+    lines = []
+    for i in range(num_of_lines):
+        parts = []
+        for j in range(random.randint(1, 3)):
+            start = random.uniform(0, extent, 2)
+            parts.append([tuple(point) for point in start + np.cumsum(random.normal(0, 80, (random.randint(2, 6), 2)),
+                                                                      axis=0)])
+        lines.append(parts)
+    return lines
+
+
+def test_proximity_join_matches_all_pairs():
+    search_radius = 50.0
+    targets = make_random_lines(60, 7)
+    joined = make_random_lines(80, 8)
+    joined_values = [float(i) if i % 7 else None for i in range(len(joined))]
+    join_counts, aggregated = compute_proximity_join(
+        [make_geometry(parts) for parts in targets], [make_geometry(parts) for parts in joined],
+        [[joined_values, "Sum"], [joined_values, "Count"], [joined_values, "Mean"]], search_radius)
+
+    for i, target_parts in enumerate(targets):
+        near = [j for j, joined_parts in enumerate(joined) if get_line_distance(target_parts, joined_parts) <= search_radius]
+        near_values = [joined_values[j] for j in near if joined_values[j] is not None]
+        assert join_counts[i] == len(near)
+        assert aggregated[1][i] == len(near_values)
+        if near_values:
+            assert np.isclose(aggregated[0][i], sum(near_values))
+            assert np.isclose(aggregated[2][i], sum(near_values) / len(near_values))
+        else:
+            assert aggregated[0][i] is None and aggregated[2][i] is None
+
+
+def test_segment_distances_of_crossing_and_parallel_segments():
+    distances = get_segment_distances(np.array([[0.0, 0.0], [0.0, 0.0]]), np.array([[10.0, 10.0], [10.0, 0.0]]),
+                                      np.array([[0.0, 10.0], [2.0, 3.0]]), np.array([[10.0, 0.0], [8.0, 3.0]]))
+    assert np.allclose(distances, [0.0, 3.0])
+
+
+def test_chunks_in_the_process_pool_give_the_same_join(monkeypatch):
+    targets = [make_geometry(parts) for parts in make_random_lines(60, 9)]
+    joined = [make_geometry(parts) for parts in make_random_lines(80, 10)]
+    joined_values = [float(i) for i in range(len(joined))]
+    join_counts, aggregated = compute_proximity_join(targets, joined, [[joined_values, "Sum"]], 50.0)
+
+    # Chunks of 7 targets: 9 tasks, sharing the index of the joined segments set once per worker process
+    monkeypatch.setattr(proximity_join, "num_of_targets_per_task", 7)
+    chunked_join_counts, chunked_aggregated = compute_proximity_join(targets, joined, [[joined_values, "Sum"]], 50.0)
+
+    assert np.array_equal(join_counts, chunked_join_counts)
+    assert chunked_aggregated == aggregated
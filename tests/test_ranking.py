@@ -0,0 +1,61 @@
+# Tests of the in-memory ranking of the features (ranking.py)
+
+import numpy as np
+
+import ranking
+
+
+def test_the_partial_selection_gives_the_top_of_the_full_order():
+    values = np.random.RandomState(0).randint(0, 30, 500).astype(float).tolist()
+    values[7] = None
+    full_order = ranking.get_rank_order(values)
+
+    assert full_order[-1] == 7
+    for num_of_rows in [1, 20, 166, 499, 500, 600]:
+        assert np.array_equal(ranking.get_rank_order(values, num_of_rows), full_order[:num_of_rows])
+    # Ties keep the order of the rows
+    for first, second in zip(full_order[:-2], full_order[1:-1]):
+        assert values[first] > values[second] or (values[first] == values[second] and first < second)
+
+
+def test_the_subset_sizes():
+    values = [3.0, 1.0, None, 1.0, 0.0, 2.0, 0.0]
+
+    assert ranking.get_subset_num_of_rows(None, values) == 7
+    assert ranking.get_subset_num_of_rows(20, values) == 7
+    assert ranking.get_subset_num_of_rows(2, values) == 2
+    assert ranking.get_subset_num_of_rows(1 / 3.0, values) == 2
+    assert ranking.get_subset_num_of_rows(["min_value", 1], values) == 4
+
+
+def test_all_the_groups_and_rankings_are_written_from_one_read(monkeypatch):
+    fields = ["COUNTY", "Score", "Flag"]
+    rows = [[None, "Bucks", 5.0, 0], [None, "Chester", 9.0, 1], [None, "Bucks", 7.0, 1],
+            [None, "Bucks", 1.0, 1], [None, "Chester", 3.0, 0], [None, "Other", 99.0, 1],
+            [None, "Bucks", 6.0, 0]]
+    reads = []
+    written = {}
+
+    def read_feature_rows(feature_class):
+        reads.append(feature_class)
+        return fields, rows
+
+    def write_ranked_features(out_feature_class, template_feature_class, fields, rows, ranks):
+        written[out_feature_class] = ([row[2] for row in rows], list(ranks))
+
+    monkeypatch.setattr(ranking, "read_feature_rows", read_feature_rows)
+    monkeypatch.setattr(ranking, "write_ranked_features", write_ranked_features)
+
+    ranking.write_ranked_subsets("scored", [["Score", [["ranked_{0}_top_third", 1 / 3.0],
+                                                       ["ranked_{0}_top2", 2]]],
+                                            ["Flag", [["flagged_{0}", ["min_value", 1]]]]],
+                                 "COUNTY", ["Bucks", "Chester"])
+
+    assert reads == ["scored"]
+    assert sorted(written) == ["flagged_Bucks", "flagged_Chester", "ranked_Bucks_top2", "ranked_Bucks_top_third",
+                               "ranked_Chester_top2", "ranked_Chester_top_third"]
+    assert written["ranked_Bucks_top2"] == ([7.0, 6.0], [1, 2])
+    assert written["ranked_Bucks_top_third"] == ([7.0], [1])
+    assert written["ranked_Chester_top2"] == ([9.0, 3.0], [1, 2])
+    assert written["flagged_Bucks"] == ([7.0, 1.0], [1, 2])
+    assert written["flagged_Chester"] == ([9.0], [1])
@@ -0,0 +1,95 @@
+# Tests of the numpy transformation pipeline of the batch reprojection (reprojection.py)
+
+import struct
+
+import numpy as np
+
+from reprojection import *
+
+
+def make_utm_pipeline(datum_transformation=None):
+    pipeline = {"source_ellipsoid": ellipsoids["D_WGS_1984"],
+                "target_ellipsoid": ellipsoids["D_WGS_1984" if datum_transformation is None
+                                              else "D_North_American_1983"],
+                "datum_transformation": datum_transformation, "central_meridian": np.radians(-75.0),
+                "scale_factor": 0.9996, "false_easting": 500000.0, "false_northing": 0.0, "origin_northing": 0.0}
+    pipeline["rectifying_radius"], pipeline["alphas"] = get_transverse_mercator_coefficients(
+        pipeline["target_ellipsoid"])
+    return pipeline
+
+
+# Transverse Mercator with the series of Snyder (Map Projections, a Working Manual, p. 61)
+def project_transverse_mercator_snyder(lon, lat, central_meridian, ellipsoid, scale_factor, false_easting):
+    a, f = ellipsoid
+    e2 = f * (2 - f)
+    ep2 = e2 / (1 - e2)
+    lat = np.radians(lat)
+    n = a / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    t = np.tan(lat) ** 2
+    c = ep2 * np.cos(lat) ** 2
+    big_a = np.radians(lon - central_meridian) * np.cos(lat)
+    m = a * ((1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256) * lat
+             - (3 * e2 / 8 + 3 * e2 ** 2 / 32 + 45 * e2 ** 3 / 1024) * np.sin(2 * lat)
+             + (15 * e2 ** 2 / 256 + 45 * e2 ** 3 / 1024) * np.sin(4 * lat)
+             - (35 * e2 ** 3 / 3072) * np.sin(6 * lat))
+    x = scale_factor * n * (big_a + (1 - t + c) * big_a ** 3 / 6
+                            + (5 - 18 * t + t * t + 72 * c - 58 * ep2) * big_a ** 5 / 120) + false_easting
+    y = scale_factor * (m + n * np.tan(lat) * (big_a ** 2 / 2 + (5 - t + 9 * c + 4 * c * c) * big_a ** 4 / 24
+                                               + (61 - 58 * t + t * t + 600 * c - 330 * ep2) * big_a ** 6 / 720))
+    return x, y
+
+
+def test_transverse_mercator_matches_snyder():
+    pipeline = make_utm_pipeline()
+    random = np.random.RandomState(0)
+    coordinates = np.column_stack([random.uniform(-76.5, -74.5, 100), random.uniform(39.5, 40.8, 100)])
+    easting, northing = transform_coordinates(coordinates, pipeline).T
+    expected_easting, expected_northing = project_transverse_mercator_snyder(
+        coordinates[:, 0], coordinates[:, 1], -75.0, ellipsoids["D_WGS_1984"], 0.9996, 500000.0)
+    assert np.abs(easting - expected_easting).max() < 0.001
+    assert np.abs(northing - expected_northing).max() < 0.001
+
+
+def test_central_meridian_and_equator():
+    easting, northing = transform_coordinates(np.array([[-75.0, 0.0], [-75.0, 40.0]]), make_utm_pipeline()).T
+    assert np.allclose(easting, 500000.0) and np.isclose(northing[0], 0.0)
+
+
+def test_geocentric_round_trip():
+    lon = np.radians(np.array([-75.3, -74.9, -76.0]))
+    lat = np.radians(np.array([40.1, 39.8, 40.6]))
+    x, y, z = geodetic_to_geocentric(lon, lat, ellipsoids["D_WGS_1984"])
+    round_trip_lon, round_trip_lat = geocentric_to_geodetic(x, y, z, ellipsoids["D_WGS_1984"])
+    assert np.allclose(round_trip_lon, lon, atol=1e-12) and np.allclose(round_trip_lat, lat, atol=1e-12)
+
+
+def test_datum_shift_is_about_a_meter():
+    coordinates = np.array([[-75.2, 40.0]])
+    shift = (transform_coordinates(coordinates, make_utm_pipeline(datum_transformations["WGS_1984_(ITRF00)_To_NAD_1983"]))
+             - transform_coordinates(coordinates, make_utm_pipeline()))
+    assert 0.5 < np.hypot(*shift[0]) < 2.0
+
+
+def test_wkb_geometries_with_mixed_byte_orders_and_z():
+    pipeline = make_utm_pipeline()
+    line1 = struct.pack("<BII", 1, 2, 2) + struct.pack("<4d", -75.0, 40.0, -75.1, 40.1)
+    line2 = struct.pack(">BII", 0, 1002, 1) + struct.pack(">3d", -75.2, 40.2, 7.0)
+    wkb = struct.pack("<BII", 1, 5, 2) + line1 + line2
+    position, blocks = get_wkb_coordinate_blocks(wkb)
+    assert position == len(wkb)
+    assert blocks == [[18, 2, 2, "<"], [59, 1, 3, ">"]]
+    transformed = transform_wkb_geometries([wkb], pipeline)[0]
+    expected = transform_coordinates(np.array([[-75.0, 40.0], [-75.1, 40.1], [-75.2, 40.2]]), pipeline)
+    assert np.allclose(struct.unpack_from("<4d", transformed, 18), expected[:2].ravel())
+    # The Z value is kept
+    assert np.allclose(struct.unpack_from(">3d", transformed, 59), list(expected[2]) + [7.0])
+
+
+def test_threads_give_the_same_coordinates(monkeypatch):
+    import reprojection
+    monkeypatch.setattr(reprojection, "num_of_vertices_per_chunk", 1000)
+    pipeline = make_utm_pipeline()
+    random = np.random.RandomState(1)
+    coordinates = np.column_stack([random.uniform(-76, -74, 5500), random.uniform(39, 41, 5500)])
+    assert np.array_equal(transform_coordinates_in_threads(coordinates, pipeline, 4),
+                          transform_coordinates(coordinates, pipeline))
@@ -0,0 +1,90 @@
+# Tests of the buffer sums of the alignment scoring service (scoring_service.py)
+
+import numpy as np
+
+from scoring_service import build_prefix_sum_index, get_buffer_sum
+
+
+def make_grid(n_rows, n_cols, cell_size):
+    return {"x_min": 1000.0, "y_max": 5000.0, "cell_width": cell_size, "cell_height": cell_size,
+            "n_rows": n_rows, "n_cols": n_cols, "spatial_reference": None}
+
+
+def make_values(grid, seed):
+    random = np.random.RandomState(seed)
+    values = random.randint(1, 21, (grid["n_rows"], grid["n_cols"])).astype(np.float64)
+    values[random.rand(grid["n_rows"], grid["n_cols"]) < 0.1] = np.nan
+    return values
+
+
+def get_cell_centers(grid):
+    x = grid["x_min"] + (np.arange(grid["n_cols"]) + 0.5) * grid["cell_width"]
+    y = grid["y_max"] - (np.arange(grid["n_rows"]) + 0.5) * grid["cell_height"]
+    return np.meshgrid(x, y)
+
+
+# Distance from every cell center to a polyline (the smallest distance to its segments or vertices)
+def get_distances_to_path(path, grid):
+    center_x, center_y = get_cell_centers(grid)
+    distances = np.hypot(center_x - path[0, 0], center_y - path[0, 1])
+    for start, end in zip(path[:-1], path[1:]):
+        direction = end - start
+        squared_length = direction.dot(direction)
+        if squared_length == 0:
+            continue
+        t = np.clip(((center_x - start[0]) * direction[0] + (center_y - start[1]) * direction[1]) / squared_length,
+                    0.0, 1.0)
+        distances = np.minimum(distances, np.hypot(center_x - (start[0] + t * direction[0]),
+                                                   center_y - (start[1] + t * direction[1])))
+    return distances
+
+
+# Sum and count of the valid cells whose center is within the radius of any of the paths
+def get_buffer_sum_brute_force(values, grid, paths, radius):
+    in_buffer = np.zeros(values.shape, dtype=bool)
+    for path in paths:
+        in_buffer |= get_distances_to_path(path, grid) <= radius
+    in_buffer &= ~np.isnan(values)
+    return values[in_buffer].sum(), int(in_buffer.sum())
+
+
+def test_buffer_sums_match_an_all_pairs_distance_mask():
+    grid = make_grid(70, 90, 30.0)
+    values = make_values(grid, 0)
+    index = build_prefix_sum_index(values, grid)
+    random = np.random.RandomState(1)
+    for i in range(30):
+        # One or two paths of 2 to 6 vertices, partly outside of the grid for some of them
+        paths = []
+        for j in range(random.randint(1, 3)):
+            start = [random.uniform(900.0, 3800.0), random.uniform(2800.0, 5100.0)]
+            steps = random.normal(0.0, 300.0, (random.randint(1, 6), 2))
+            paths.append(np.vstack([start, start + np.cumsum(steps, axis=0)]))
+        radius = random.uniform(20.0, 250.0)
+        total, count = get_buffer_sum(index, paths, radius)
+        expected_total, expected_count = get_buffer_sum_brute_force(values, grid, paths, radius)
+        assert count == expected_count
+        assert np.isclose(total, expected_total)
+
+
+def test_buffer_sum_of_a_single_vertex_is_a_disk():
+    grid = make_grid(40, 40, 30.0)
+    values = make_values(grid, 2)
+    index = build_prefix_sum_index(values, grid)
+    paths = [np.array([[1611.0, 4402.0]])]
+
+    total, count = get_buffer_sum(index, paths, 200.0)
+
+    expected_total, expected_count = get_buffer_sum_brute_force(values, grid, paths, 200.0)
+    assert count == expected_count > 100
+    assert np.isclose(total, expected_total)
+
+
+def test_buffer_sum_of_a_path_off_the_grid_is_empty():
+    grid = make_grid(40, 40, 30.0)
+    index = build_prefix_sum_index(make_values(grid, 3), grid)
+
+    # Beyond every side of the grid, further than the radius
+    for path in [[[500.0, 6000.0], [2500.0, 6100.0]], [[2500.0, 3000.0], [2600.0, 3200.0]],
+                 [[300.0, 4000.0], [700.0, 4500.0]], [[2500.0, 4000.0], [3000.0, 4300.0]]]:
+        assert get_buffer_sum(index, [np.array(path)], 150.0) == (0.0, 0)
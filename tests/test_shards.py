@@ -0,0 +1,58 @@
+# Tests of the sharded execution of the raster steps (shards.py)
+
+import numpy as np
+
+import shards
+
+
+def make_grid(n_rows, n_cols):
+    return {"x_min": 0.0, "y_max": n_rows * 30.0, "cell_width": 30.0, "cell_height": 30.0,
+            "n_rows": n_rows, "n_cols": n_cols, "spatial_reference": None}
+
+
+# Two counties whose bounding boxes overlap (an L shape around a square), and cells outside of both
+def make_county_labels(n_rows, n_cols):
+    labels = np.full((n_rows, n_cols), -1, dtype=np.int16)
+    labels[5:60, 5:15] = 0
+    labels[50:60, 15:70] = 0
+    labels[10:45, 20:60] = 1
+    return labels
+
+
+# Sum of the values within a square of 2 * radius + 1 cells (a step that depends on a neighborhood)
+def sum_neighborhood(values, radius):
+    padded = np.pad(values, radius, mode="constant")
+    total = np.zeros(values.shape)
+    for row_offset in range(2 * radius + 1):
+        for col_offset in range(2 * radius + 1):
+            total += padded[row_offset:row_offset + values.shape[0], col_offset:col_offset + values.shape[1]]
+    return total
+
+
+def test_every_cell_belongs_to_exactly_one_shard():
+    grid = make_grid(64, 80)
+    labels = make_county_labels(64, 80)
+
+    county_shards = shards.get_label_shards(labels, ["Chester", "Bucks"], grid, 3, shard_size=16)
+
+    num_of_shards_per_cell = np.zeros(labels.shape, dtype=np.int64)
+    for shard in county_shards:
+        first_row, last_row, first_col, last_col = shard["window"]
+        mask = np.ones((last_row - first_row, last_col - first_col), dtype=bool) if shard["mask"] is None \
+            else shard["mask"]
+        num_of_shards_per_cell[first_row:last_row, first_col:last_col] += mask
+    assert (num_of_shards_per_cell == 1).all()
+    assert [shard["name"] for shard in county_shards][:2] == ["Chester", "Bucks"]
+
+
+def test_county_shards_give_the_same_result_as_a_single_run(monkeypatch):
+    monkeypatch.setattr(shards, "map_in_process_pool", lambda function, tasks: [function(task) for task in tasks])
+    grid = make_grid(64, 80)
+    values = np.random.RandomState(0).rand(64, 80)
+    radius = 4
+
+    county_shards = shards.get_label_shards(make_county_labels(64, 80), ["Chester", "Bucks"], grid, radius,
+                                            shard_size=16)
+    merged = shards.run_sharded_function(sum_neighborhood, [values], county_shards, (radius,))
+
+    assert np.allclose(merged, sum_neighborhood(values, radius), rtol=0, atol=1e-12)
@@ -0,0 +1,86 @@
+# Tests of the reuse of the saved label raster of the census tracts (tracts.py)
+
+import numpy as np
+import pytest
+
+import tracts
+
+
+class FakeSpatialReference(object):
+    def exportToString(self):
+        return "NAD_1983_UTM_Zone_18N"
+
+
+class FakeDescribe(object):
+    spatialReference = FakeSpatialReference()
+
+
+# Stand-in for arcpy.da.SearchCursor over the rows of the fake tracts (id, WKB)
+class FakeSearchCursor(object):
+    rows = []
+
+    def __init__(self, dataset, fields):
+        pass
+
+    def __enter__(self):
+        return iter(FakeSearchCursor.rows)
+
+    def __exit__(self, *arguments):
+        return False
+
+
+def test_labels_are_rebuilt_when_the_tracts_change(tmp_path, monkeypatch):
+    grid = {"x_min": 0.0, "y_max": 4.0, "cell_width": 1.0, "cell_height": 1.0, "n_rows": 4, "n_cols": 4,
+            "spatial_reference": None}
+    builds = []
+
+    def build_tract_labels(tracts_feature_class, id_field, grid):
+        builds.append(tracts_feature_class)
+        return np.zeros((4, 4), dtype=np.int32), np.array(["42001"])
+
+    monkeypatch.setattr(tracts, "tract_labels_file", str(tmp_path / "tract_labels.npz"))
+    monkeypatch.setattr(tracts, "build_tract_labels", build_tract_labels)
+    monkeypatch.setattr(tracts, "get_grid_signature", lambda grid: np.array([1.0, 2.0]), raising=False)
+    monkeypatch.setattr(tracts.arcpy, "Describe", lambda dataset: FakeDescribe(), raising=False)
+    monkeypatch.setattr(tracts.arcpy.da, "SearchCursor", FakeSearchCursor, raising=False)
+
+    FakeSearchCursor.rows = [("42001", b"\x01\x03\x00\x00\x00")]
+    tracts.get_tract_labels("tracts", "GEOID", grid)
+    tracts.get_tract_labels("tracts", "GEOID", grid)
+    assert len(builds) == 1
+
+    # Same grid, but a tract geometry changed
+    FakeSearchCursor.rows = [("42001", b"\x01\x03\x00\x00\x01")]
+    tracts.get_tract_labels("tracts", "GEOID", grid)
+    assert len(builds) == 2
+
+
+def test_tract_ids_are_normalized_to_the_11_digit_geoid():
+    assert tracts.normalize_tract_id(42101000100.0) == "42101000100"
+    assert tracts.normalize_tract_id(np.float64(42101000100)) == "42101000100"
+    assert tracts.normalize_tract_id(1001020100) == "01001020100"
+    assert tracts.normalize_tract_id(u"42101000100") == "42101000100"
+    assert tracts.normalize_tract_id(" 1001020100 ") == "01001020100"
+    assert tracts.normalize_tract_id("1400000US42101000100") == "1400000US42101000100"
+
+
+def test_numeric_ids_match_the_tracts_and_unmatched_ids_are_reported(monkeypatch, capsys):
+    labels = np.array([[0, 1], [-1, 0]])
+    saved = []
+    monkeypatch.setattr(tracts, "get_tract_labels", lambda feature_class, id_field: (
+        labels, np.array(["42101000100", "01001020100"]), None))
+    monkeypatch.setattr(tracts, "save_array_as_raster", lambda array, grid, out_raster: saved.append(array))
+
+    tracts.tract_values_to_raster({42101000100.0: 5.0, 1001020100: 7.0, 42101999999.0: 9.0}, "ras")
+
+    np.testing.assert_array_equal(saved[0], np.array([[5.0, 7.0], [np.nan, 5.0]], dtype=np.float32))
+    assert "1 of the 3 tract ids of ras do not match" in capsys.readouterr().out
+
+
+def test_no_matching_id_is_an_error(monkeypatch):
+    monkeypatch.setattr(tracts, "get_tract_labels", lambda feature_class, id_field: (
+        np.zeros((2, 2), dtype=np.int32), np.array(["42101000100"]), None))
+    monkeypatch.setattr(tracts, "save_array_as_raster", lambda array, grid, out_raster: None)
+
+    with pytest.raises(ValueError, match="ras"):
+        tracts.tract_values_to_raster({"4210100010": 5.0}, "ras")
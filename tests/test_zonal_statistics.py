@@ -0,0 +1,88 @@
+# Tests of the rasterization of the zones and of the overlapping zonal statistics (zonal_statistics.py)
+
+import numpy as np
+
+from zonal_statistics import *
+
+from arcpy_fakes import *
+
+
+def make_grid(n_rows, n_cols, cell_size=1.0):
+    return {"x_min": 0.0, "y_max": n_rows * cell_size, "cell_width": cell_size, "cell_height": cell_size,
+            "n_rows": n_rows, "n_cols": n_cols, "spatial_reference": None}
+
+
+# Rasterize with the cell center rule by testing every cell center against every edge (even-odd rule)
+def rasterize_brute_force(rings, grid):
+    rows, cols = np.mgrid[0:grid["n_rows"], 0:grid["n_cols"]]
+    x = grid["x_min"] + (cols + 0.5) * grid["cell_width"]
+    y = grid["y_max"] - (rows + 0.5) * grid["cell_height"]
+    inside = np.zeros(x.shape, dtype=bool)
+    for ring in rings:
+        for (x0, y0), (x1, y1) in zip(ring, np.roll(ring, -1, axis=0)):
+            if y0 == y1:
+                continue
+            crosses = ((y0 <= y) != (y1 <= y)) & (x0 + (y - y0) * (x1 - x0) / (y1 - y0) <= x)
+            inside ^= crosses
+    return inside
+
+
+def get_full_mask(rings, grid):
+    full_mask = np.zeros((grid["n_rows"], grid["n_cols"]), dtype=bool)
+    window = rasterize_polygon(rings, grid)
+    if window is not None:
+        first_row, first_col, mask = window
+        full_mask[first_row:first_row + mask.shape[0], first_col:first_col + mask.shape[1]] = mask
+    return full_mask
+
+
+def test_rasterize_polygon_with_hole_matches_brute_force():
+    grid = make_grid(40, 50)
+    polygon = FakeGeometry([make_part([(3.2, 2.7), (45.1, 6.3), (38.4, 35.9), (11.6, 31.2), (3.2, 2.7), None,
+                                      (15.5, 12.5), (25.2, 12.1), (20.3, 22.8), (15.5, 12.5)])])
+    rings = get_polygon_rings(polygon)
+    assert len(rings) == 2
+    assert np.array_equal(get_full_mask(rings, grid), rasterize_brute_force(rings, grid))
+
+
+def test_rasterize_polygon_outside_the_grid():
+    grid = make_grid(10, 10)
+    assert rasterize_polygon([np.array([[20.0, 20.0], [30.0, 20.0], [30.0, 30.0]])], grid) is None
+
+
+def test_curved_polygon_is_densified_before_rasterization():
+    # A circle of radius 10 stored as 4 arcs: the stored vertices alone make a square of area 200
+    grid = make_grid(40, 40)
+    angles = np.linspace(0, 2 * np.pi, 721)
+    circle = [(20 + 10 * np.cos(angle), 20 + 10 * np.sin(angle)) for angle in angles]
+    polygon = FakeGeometry([make_part([circle[0], circle[180], circle[360], circle[540], circle[0]])],
+                          [make_part(circle)])
+    num_of_cells = get_full_mask(get_polygon_rings(polygon), grid).sum()
+    assert abs(num_of_cells - np.pi * 100) < 0.03 * np.pi * 100
+
+
+def test_overlapping_zones_and_shared_zone_values():
+    grid = make_grid(20, 20)
+    values = np.arange(400, dtype=np.float64).reshape(20, 20)
+    values[5, 5] = np.nan
+    square1 = [np.array([[0.0, 10.0], [10.0, 10.0], [10.0, 20.0], [0.0, 20.0]])]
+    square2 = [np.array([[5.0, 5.0], [15.0, 5.0], [15.0, 15.0], [5.0, 15.0]])]
+    square3 = [np.array([[15.0, 0.0], [20.0, 0.0], [20.0, 5.0], [15.0, 5.0]])]
+    counts = {}
+    sums = {}
+    accumulate_zone_sums(values, grid, [["a", square1], ["b", square2], ["a", square3]], counts, sums)
+    # Zone "a": the top left 10 x 10 cells (one of them NoData) and the bottom right 5 x 5 cells
+    assert counts["a"] == 99 + 25
+    assert sums["a"] == np.nansum(values[:10, :10]) + values[15:, 15:].sum()
+    # Zone "b" overlaps zone "a" (and shares its NoData cell)
+    assert counts["b"] == 99
+    assert sums["b"] == np.nansum(values[5:15, 5:15])
+
+
+def test_zone_tasks_cover_every_zone_once():
+    grid = make_grid(100, 100)
+    zones = [[i, [np.array([[i % 10 * 10.0, i // 10 * 10.0], [i % 10 * 10.0 + 5, i // 10 * 10.0],
+                            [i % 10 * 10.0, i // 10 * 10.0 + 5]])]] for i in range(100)]
+    tasks = get_zone_tasks(zones, grid, 32, 7)
+    assert max(len(task) for task in tasks) <= 7
+    assert sorted(zone[0] for task in tasks for zone in task) == list(range(100))
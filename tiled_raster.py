@@ -0,0 +1,171 @@
+# ***************************************
+# ***Overview***
+# Script name: tiled_raster.py
+# Purpose: This Python module processes rasters tile by tile, so that the map algebra of the
+#          CII script never holds whole-extent rasters in memory. Rasters are kept in a tile
+#          store on disk as memory-mapped arrays (.npy files), and every operation streams
+#          through them in horizontal tiles sized to fit within MEMORY_BUDGET_MB.
+#          This lets us run bigger regions or smaller cell sizes on machines with little RAM.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import json
+import os
+import shutil
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+
+# *****************************************
+# Functions
+
+# Get the paths of the memory-mapped array and of the grid description of a raster in the tile store
+def get_tile_store_paths(name):
+    name = name.split("\\")[-1]
+    return (os.path.join(tile_store_path, name + ".npy"),
+            os.path.join(tile_store_path, name + ".json"))
+
+# Check whether a raster is already in the tile store
+def is_in_tile_store(name):
+    array_path, grid_path = get_tile_store_paths(name)
+    return os.path.exists(array_path) and os.path.exists(grid_path)
+
+# Create a new raster in the tile store, as a memory-mapped array filled with NoData (NaN).
+# With num_of_bands, the raster is a stack of bands of shape (num_of_bands, n_rows, n_cols).
+def create_tiled_raster(name, grid, dtype=np.float32, num_of_bands=None):
+    if not os.path.exists(tile_store_path):
+        os.makedirs(tile_store_path)
+    array_path, grid_path = get_tile_store_paths(name)
+    shape = (grid["n_rows"], grid["n_cols"])
+    if num_of_bands is not None:
+        shape = (num_of_bands,) + shape
+    array = np.lib.format.open_memmap(array_path, mode="w+", dtype=dtype, shape=shape)
+    array[:] = np.nan
+    # The spatial reference is not JSON serializable, so it is saved as a string
+    grid_description = dict(grid)
+    if grid["spatial_reference"] is not None:
+        grid_description["spatial_reference"] = grid["spatial_reference"].exportToString()
+    with open(grid_path, "w") as grid_file:
+        json.dump(grid_description, grid_file)
+    return array
+
+# Open a raster of the tile store as a memory-mapped array (nothing is loaded into memory)
+def open_tiled_raster(name, mode="r"):
+    array_path, grid_path = get_tile_store_paths(name)
+    with open(grid_path) as grid_file:
+        grid = json.load(grid_file)
+    if grid["spatial_reference"] is not None:
+        spatial_reference = arcpy.SpatialReference()
+        spatial_reference.loadFromString(grid["spatial_reference"])
+        grid["spatial_reference"] = spatial_reference
+    return np.load(array_path, mmap_mode=mode), grid
+
+# Get the number of rows per tile, so that the given number of tiles of this
+# item size (one per raster used at the same time) fit within the memory budget
+def get_tile_num_of_rows(grid, num_of_arrays, itemsize=8):
+    row_size = grid["n_cols"] * itemsize * num_of_arrays
+    return int(max(1, min(grid["n_rows"], MEMORY_BUDGET_MB * 1024 * 1024 // row_size)))
+
+# Iterate over the tiles of a grid as (first row, last row) pairs
+def iterate_tiles(grid, tile_num_of_rows):
+    for first_row in range(0, grid["n_rows"], tile_num_of_rows):
+        yield first_row, min(first_row + tile_num_of_rows, grid["n_rows"])
+
+# Get the grid of a raster (without reading its cells)
+def get_raster_grid(raster):
+    ras = arcpy.Raster(raster)
+    return {"x_min": ras.extent.XMin,
+            "y_max": ras.extent.YMax,
+            "cell_width": ras.meanCellWidth,
+            "cell_height": ras.meanCellHeight,
+            "n_rows": ras.height,
+            "n_cols": ras.width,
+            "spatial_reference": ras.spatialReference}
+
+# Read a tile of rows of an arcpy raster on a grid (NoData cells become NaN)
+def read_raster_tile(raster, grid, first_row, last_row):
+    ras = arcpy.Raster(raster)
+    lower_left = arcpy.Point(grid["x_min"], grid["y_max"] - last_row * grid["cell_height"])
+    tile = arcpy.RasterToNumPyArray(ras, lower_left, grid["n_cols"], last_row - first_row).astype(np.float64)
+    if ras.noDataValue is not None:
+        tile[tile == ras.noDataValue] = np.nan
+    return tile
+
+# Copy an arcpy raster into the tile store, tile by tile, on the current analysis grid
+def import_raster_to_tile_store(raster, grid=None):
+    if grid is None:
+        grid = get_env_grid()
+    array = create_tiled_raster(raster, grid)
+    for first_row, last_row in iterate_tiles(grid, get_tile_num_of_rows(grid, 2)):
+        array[first_row:last_row] = read_raster_tile(raster, grid, first_row, last_row)
+    array.flush()
+    return array, grid
+
+# Save a raster of the tile store as an arcpy raster. Each tile is saved as a small raster
+# in the scratch folder, and the tiles are then mosaicked together. The statistics of the
+# raster are computed from the tiles as they are written.
+# For a stack of bands, band is the index of the band to save.
+def export_tile_store_raster(name, out_raster, band=None):
+    array, grid = open_tiled_raster(name)
+    if band is not None:
+        array = array[band]
+    tile_rasters = []
+    accumulator = make_statistics_accumulator()
+    for first_row, last_row in iterate_tiles(grid, get_tile_num_of_rows(grid, 2)):
+        tile_grid = get_window_grid(grid, first_row, last_row, 0, grid["n_cols"])
+        tile_raster = os.path.join(arcpy.env.scratchFolder,
+                                   name.split("\\")[-1] + "_tile" + str(len(tile_rasters)) + ".tif")
+        tile = np.array(array[first_row:last_row])
+        save_array_as_raster(tile, tile_grid, tile_raster, with_statistics=False)
+        update_statistics(accumulator, tile)
+        tile_rasters.append(tile_raster)
+    if len(tile_rasters) > 1:
+        arcpy.Mosaic_management(tile_rasters[1:], tile_rasters[0])
+    arcpy.CopyRaster_management(tile_rasters[0], out_raster)
+    for tile_raster in tile_rasters:
+        arcpy.Delete_management(tile_raster)
+    save_raster_statistics(finish_statistics(accumulator), out_raster)
+
+# Compute and save the statistics of a raster written by an arcpy tool, reading it tile by tile
+def compute_raster_statistics(raster):
+    grid = get_raster_grid(raster)
+    accumulator = make_statistics_accumulator()
+    for first_row, last_row in iterate_tiles(grid, get_tile_num_of_rows(grid, 1)):
+        update_statistics(accumulator, read_raster_tile(raster, grid, first_row, last_row))
+    save_raster_statistics(finish_statistics(accumulator), raster)
+
+# Get a raster from the tile store, importing it first if needed
+def get_tiled_raster(raster):
+    if not is_in_tile_store(raster):
+        import_raster_to_tile_store(raster)
+    return open_tiled_raster(raster)
+
+# Compute the weighted sum of several rasters, streaming tile by tile through the tile store
+# (NoData in any input gives NoData, as with map algebra). The result is kept in the tile store
+# so that later steps can reuse it, and saved as an arcpy raster.
+# weighted_rasters is a list of [raster, weight] pairs.
+def compute_weighted_sum_raster(weighted_rasters, out_raster):
+    inputs = [[get_tiled_raster(raster)[0], weight] for raster, weight in weighted_rasters]
+    grid = open_tiled_raster(weighted_rasters[0][0])[1]
+    output = create_tiled_raster(out_raster, grid)
+    for first_row, last_row in iterate_tiles(grid, get_tile_num_of_rows(grid, len(inputs) + 1)):
+        total = np.zeros((last_row - first_row, grid["n_cols"]))
+        for array, weight in inputs:
+            total += array[first_row:last_row] * weight
+        output[first_row:last_row] = total
+    output.flush()
+    del output
+    export_tile_store_raster(out_raster, out_raster)
+
+# Remove all the rasters from the tile store (they are only valid for the current run)
+def clear_tile_store():
+    if os.path.exists(tile_store_path):
+        shutil.rmtree(tile_store_path)
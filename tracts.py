@@ -0,0 +1,114 @@
+# ***************************************
+# ***Overview***
+# Script name: tracts.py
+# Purpose: This Python module converts census tract attributes into rasters without
+#          calling arcpy.PolygonToRaster_conversion() for every indicator. The census tracts
+#          are rasterized only once into a label raster (the index of the tract of every cell),
+#          which is saved to disk and reused as long as the grid and the tracts do not change. Each indicator
+#          raster is then a simple lookup of the tract values through the label raster.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import hashlib
+import os
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from zonal_statistics import *
+
+# *****************************************
+# Functions
+
+# Get the id of a census tract as a string. Integer-like ids (e.g. a GEOID10 stored as a number,
+# which reads as 42101000100.0) become the 11-digit GEOID, with its leading zeros.
+def normalize_tract_id(tract_id):
+    if isinstance(tract_id, (float, np.floating)) and float(tract_id).is_integer():
+        tract_id = int(tract_id)
+    tract_id = str(tract_id).strip()
+    if tract_id.isdigit():
+        return tract_id.zfill(11)
+    return tract_id
+
+# Rasterize the census tracts: every cell gets the index of the tract that contains its center
+# in the list of tract ids (or -1 if it is not in any tract)
+def build_tract_labels(tracts_feature_class, id_field, grid):
+    labels = np.full((grid["n_rows"], grid["n_cols"]), -1, dtype=np.int32)
+    tract_ids = []
+    with arcpy.da.SearchCursor(tracts_feature_class, [id_field, "SHAPE@"]) as cursor:
+        for tract_id, geometry in cursor:
+            if geometry is None:
+                continue
+            window = rasterize_polygon(get_polygon_rings(geometry), grid)
+            tract_ids.append(normalize_tract_id(tract_id))
+            if window is None:
+                continue
+            first_row, first_col, mask = window
+            tract_window = labels[first_row:first_row + mask.shape[0], first_col:first_col + mask.shape[1]]
+            tract_window[mask] = len(tract_ids) - 1
+    return labels, np.array(tract_ids)
+
+# Get a hash of the census tracts: their ids and geometries (as WKB), in their coordinate system
+def get_tracts_signature(tracts_feature_class, id_field):
+    hasher = hashlib.sha1()
+    hasher.update(arcpy.Describe(tracts_feature_class).spatialReference.exportToString().encode("utf-8"))
+    with arcpy.da.SearchCursor(tracts_feature_class, [id_field, "SHAPE@WKB"]) as cursor:
+        for tract_id, wkb in cursor:
+            hasher.update(str(tract_id).encode("utf-8"))
+            hasher.update(bytes(wkb) if wkb is not None else b"")
+    return hasher.hexdigest()
+
+# Get the label raster of the census tracts on the current grid. It is loaded from tract_labels_file
+# if it was built for the same grid and the same tracts, otherwise it is built and saved there.
+def get_tract_labels(tracts_feature_class, id_field, grid=None):
+    if grid is None:
+        grid = get_env_grid()
+    tracts_signature = get_tracts_signature(tracts_feature_class, id_field)
+    if os.path.exists(tract_labels_file):
+        saved = np.load(tract_labels_file)
+        if np.array_equal(saved["grid_signature"], get_grid_signature(grid)) \
+                and "tracts_signature" in saved.files and str(saved["tracts_signature"]) == tracts_signature:
+            return saved["labels"], saved["tract_ids"], grid
+
+    print("Rasterize census tracts: " + tracts_feature_class)
+    labels, tract_ids = build_tract_labels(tracts_feature_class, id_field, grid)
+    np.savez_compressed(tract_labels_file, labels=labels, tract_ids=tract_ids,
+                        grid_signature=get_grid_signature(grid), tracts_signature=tracts_signature)
+    return labels, tract_ids, grid
+
+# Convert a tract-level attribute into a raster: the value of each tract is looked up
+# (by tract id) and gathered through the label raster. Tracts with no value become NoData.
+# (replaces arcpy.PolygonToRaster_conversion(feature_class, value_field, out_raster))
+def tract_values_to_raster(values_by_tract_id, out_raster, tracts_feature_class=census_tracts_clipped):
+    labels, tract_ids, grid = get_tract_labels(tracts_feature_class, "GEOID")
+    values_by_tract_id = dict((normalize_tract_id(tract_id), value)
+                              for tract_id, value in values_by_tract_id.items())
+    # Report the ids of the source that are not census tracts (and fail if none of them is)
+    unmatched_ids = set(values_by_tract_id) - set(tract_ids)
+    if unmatched_ids:
+        print(str(len(unmatched_ids)) + " of the " + str(len(values_by_tract_id)) + " tract ids of "
+              + str(out_raster) + " do not match any census tract (e.g. " + sorted(unmatched_ids)[0] + ")")
+    if len(unmatched_ids) == len(values_by_tract_id):
+        raise ValueError("None of the tract ids of " + str(out_raster) + " match the census tracts")
+    # One value per tract, plus NoData at the end for the cells outside of the tracts (label -1)
+    tract_values = np.full(len(tract_ids) + 1, np.nan)
+    for index, tract_id in enumerate(tract_ids):
+        if tract_id in values_by_tract_id and values_by_tract_id[tract_id] is not None:
+            tract_values[index] = values_by_tract_id[tract_id]
+    save_array_as_raster(tract_values[labels].astype(np.float32), grid, out_raster)
+
+# Same as tract_values_to_raster(), reading the tract ids and values from a feature class or table
+def tract_field_to_raster(feature_class, id_field, value_field, out_raster):
+    values_by_tract_id = {}
+    with arcpy.da.SearchCursor(feature_class, [id_field, value_field]) as cursor:
+        for tract_id, value in cursor:
+            values_by_tract_id[tract_id] = value
+    tract_values_to_raster(values_by_tract_id, out_raster)
@@ -21,6 +21,13 @@ import arcpy.da # Data Access
 # Import local modules:
 from config import *
 from utilities import *
+from ranking import *
+from attribute_columns import *
+from partitions import *
+from zonal_statistics import *
+from proximity_join import *
+from kml_reader import *
+from reprojection import *
 
 # *****************************************
 # Functions
@@ -33,18 +40,24 @@ def load_main_data():
 
     # Either we generate all the layers from scratch:
     if COMPUTE_FROM_SCRATCH_OPTION == "yes":
-        # Convert the non-circuit trails from kml
-        arcpy.KMLToLayer_conversion (trails_orig, trails_converted_path, "trails_converted")
-        # Reproject the converted non-circuit trails feature class
         target_spatial_reference = arcpy.SpatialReference('NAD 1983 UTM Zone 18N')
-        arcpy.Project_management("trails_converted\\Polylines", "trails_proj", target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
+        if STREAMING_KML_OPTION == "yes":
+            # Stream the lines of the non-circuit trails (geometry and name only) out of the kml
+            kml_lines_to_feature_class(trails_orig, "trails_kml")
+            # Reproject the non-circuit trails feature class
+            project_dataset("trails_kml", "trails_proj", target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
+        else:
+            # Convert the non-circuit trails from kml
+            arcpy.KMLToLayer_conversion (trails_orig, trails_converted_path, "trails_converted")
+            # Reproject the converted non-circuit trails feature class
+            project_dataset("trails_converted\\Polylines", "trails_proj", target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
 
         # Load the LTS1-2 Islands feature class, and reproject it
         arcpy.MakeFeatureLayer_management(islands_orig, "islands_orig")
-        arcpy.Project_management("islands_orig", "islands_proj", target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
+        project_dataset("islands_orig", "islands_proj", target_spatial_reference, "WGS_1984_(ITRF00)_To_NAD_1983")
 
         # Remove intermediary layers
-        remove_intermediary_layers(["trails_converted", "islands_orig"])
+        remove_intermediary_layers(["trails_converted", "trails_kml", "islands_orig"])
 
     # Or we can load the layers already preprocessed:
     else:
@@ -70,7 +83,7 @@ def prep_islands():
     arcpy.SelectLayerByAttribute_management("islands_gt_0", "CLEAR_SELECTION")
 
     # Select only the island polylines that intersects with 4 PA counties, with a spatial join
-    arcpy.SpatialJoin_analysis("islands_gte_1000m", "extent_4_counties", "islands",
+    arcpy.SpatialJoin_analysis("islands_gte_1000m", analysis_extent, "islands",
                                "JOIN_ONE_TO_ONE", "KEEP_COMMON", match_option="INTERSECT")
 
     # Add new field "Orig_Length". We will use it later.
@@ -86,10 +99,15 @@ def prep_islands():
 
 # Compute the CII score per LTS1-2 island
 def compute_CII_per_island():
-    # Compute the CII score per island as zonal statistics
-    arcpy.CheckOutExtension("Spatial")
-    arcpy.sa.ZonalStatisticsAsTable("buffered_islands", "STRONG", "cii_overall_score_ras1",
-                                    "islands_with_CII_scores_table", "DATA", "MEAN")
+    # Compute the CII score per island as zonal statistics (with the PARALLEL_ZONAL_STATISTICS_OPTION,
+    # the island buffers are sharded by spatial tile and processed in parallel worker processes)
+    if PARALLEL_ZONAL_STATISTICS_OPTION == "yes":
+        zonal_statistics_as_table("buffered_islands", "STRONG", cii_overall_score_ras,
+                                  "islands_with_CII_scores_table")
+    else:
+        arcpy.CheckOutExtension("Spatial")
+        arcpy.sa.ZonalStatisticsAsTable("buffered_islands", "STRONG", "cii_overall_score_ras1",
+                                        "islands_with_CII_scores_table", "DATA", "MEAN")
     # Rename field MEAN to CII_Score_Overall
     arcpy.AlterField_management("islands_with_CII_scores_table", "MEAN", "CII_Score_Overall")
     # Join the resulting table back to the original islands feature class
@@ -123,12 +141,14 @@ def prep_trails():
     # Add new field "Trail_ID" and copy the OID in it for clarity
     arcpy.AddField_management("trails_proj", "Trail_ID", "LONG")
     arcpy.CalculateField_management("trails_proj", "Trail_ID", "!OID!", "PYTHON_9.3")
-    # Delete some unnecessary fields
+    # Delete some unnecessary fields (the trails streamed from the kml only have their Name)
     dropFields = ["FolderPath","SymbolID", "AltMode", "Base", "Clamped", "Extruded", "Snippet", "PopupInfo"]
-    arcpy.DeleteField_management("trails_proj", dropFields)
+    dropFields = [field.name for field in arcpy.ListFields("trails_proj") if field.name in dropFields]
+    if dropFields:
+        arcpy.DeleteField_management("trails_proj", dropFields)
 
     # Clip to the boundaries of 4_counties_dissolved
-    arcpy.SpatialJoin_analysis("trails_proj", "extent_4_counties", "trails",
+    arcpy.SpatialJoin_analysis("trails_proj", analysis_extent, "trails",
                             "JOIN_ONE_TO_ONE", "KEEP_COMMON", match_option="INTERSECT")
 
     # Remove intermediary layers
@@ -147,6 +167,14 @@ def set_up_merge_rules(field_name, merge_rule, field_mappings):
 
 # For each trail, find all intersecting islands
 def find_trail_island_intersections():
+    # With the INDEXED_PROXIMITY_JOIN_OPTION, the spatial join is done in memory with a grid index
+    # of the island segments, and the merge rules are computed directly as the renamed fields
+    if INDEXED_PROXIMITY_JOIN_OPTION == "yes":
+        proximity_join_as_feature_class("trails", "islands_with_score", "trails_intersecting",
+                                        [["Orig_Length", "Sum", "Length_of_All_Islands", "DOUBLE"],
+                                         ["STRONG", "Count", "Num_of_Islands", "LONG"],
+                                         ["CII_Score_Overall", "Mean", "Trail_CII_Score", "DOUBLE"]], 50)
+        return
     # Create the field mapping object that will be used in the spatial join
     field_mappings = arcpy.FieldMappings()
     # Populate the field mapping object with the fields from both feature classes of interest
@@ -183,87 +211,43 @@ def filter_2_or_more_islands():
 
 # Compute the final score for each Non-Circuit Trail
 def compute_trail_scores():
-    #Get the maximum values in the whole table for all 3 subscores
-    length_of_all_islands_max = get_max("trails_intersecting_gte_2","Length_of_All_Islands")
-    num_of_islands_max = get_max("trails_intersecting_gte_2","Num_of_Islands")
-    trail_CII_score_max = get_max("trails_intersecting_gte_2","Trail_CII_Score")
-
-    # Create 3 fields to add the normalized sub-scores
-    arcpy.AddField_management("trails_intersecting_gte_2", "Norm_Length_of_All_Islands", "DOUBLE")
-    arcpy.AddField_management("trails_intersecting_gte_2", "Norm_Num_of_Islands", "DOUBLE")
-    arcpy.AddField_management("trails_intersecting_gte_2", "Norm_Trail_CII_Score", "DOUBLE")
-
-    # Put together the normalized score formula and apply it, so that its max value is a true 20
-    expr = ("(!Length_of_all_Islands! /" + str(length_of_all_islands_max)+ ")*20")
-    print(expr)
-    arcpy.CalculateField_management("trails_intersecting_gte_2", "Norm_Length_of_All_Islands",
-                                    expr, "PYTHON_9.3")
-    expr = ("(float(!Num_of_Islands!) /" + str(num_of_islands_max)+ ")*20")
-    print(expr)
-    arcpy.CalculateField_management("trails_intersecting_gte_2", "Norm_Num_of_Islands",
-                                    expr, "PYTHON_9.3")
-    expr = ("(!Trail_CII_Score! /" + str(trail_CII_score_max)+ ")*20")
-    print(expr)
-    arcpy.CalculateField_management("trails_intersecting_gte_2", "Norm_Trail_CII_Score",
-                                    expr, "PYTHON_9.3")
-
-    # Add new field "Overall_Score" where we will compute the
-    # total connectivity score for each trail
-    arcpy.AddField_management("trails_intersecting_gte_2", "Overall_Score", "DOUBLE")
-
-    # Put together the overall score formula and apply it; we get a score out of 20
-    expr = ("(!Norm_Length_of_All_Islands! + !Norm_Num_of_Islands! + !Norm_Trail_CII_Score!)/3")
-    print(expr)
-    arcpy.CalculateField_management("trails_intersecting_gte_2", "Overall_Score",
-                                    expr, "PYTHON_9.3")
-
-# Rank a feature class features according to a specific attribute value
-def generate_ranked_subset(in_feature_class, ranking_attribute, out_feature_class):
-    # Sort the attribute table
-    arcpy.Sort_management(in_feature_class, out_feature_class, [[ranking_attribute, "DESCENDING"]])
-    # Add a Rank attribute and populate it
-    arcpy.AddField_management(out_feature_class, "Rank", "LONG")
-    arcpy.CalculateField_management(out_feature_class, "Rank", "!OBJECTID!", "PYTHON_9.3")
-    # Also generate a separate feature class with the top 20 values
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "NEW_SELECTION", "Rank <= 20")
-    arcpy.CopyFeatures_management(out_feature_class, out_feature_class + "_Top20" )
-    arcpy.SelectLayerByAttribute_management(out_feature_class, "CLEAR_SELECTION")
-
-# Generate trail feature classes ranked by the final overall score or only by the length of all intersecting islands
+    # Normalize the 3 subscores by their maximum values in the whole table, so that their
+    # max value is a true 20, and average them into the field "Overall_Score": we get
+    # the total connectivity score for each trail, out of 20.
+    # (the subscores are read once, and the 4 fields are written in one pass)
+    compute_normalized_scores("trails_intersecting_gte_2",
+                              [["Length_of_All_Islands", "Norm_Length_of_All_Islands"],
+                               ["Num_of_Islands", "Norm_Num_of_Islands"],
+                               ["Trail_CII_Score", "Norm_Trail_CII_Score"]],
+                              [["Norm_Length_of_All_Islands", 1 / 3.0], ["Norm_Num_of_Islands", 1 / 3.0],
+                               ["Norm_Trail_CII_Score", 1 / 3.0]], "Overall_Score")
+
+# Generate the top 20 trails ranked by the final overall score or only by the length of all intersecting islands
 def generate_ranked_subsets():
-    generate_ranked_subset("trails_intersecting_gte_2", "Overall_Score", "trails_top_score_ranked")
-    generate_ranked_subset("trails_intersecting_gte_2", "Length_of_All_Islands", "trails_longest_islands_ranked")
+    # Both rankings are computed from a single read of the feature class
+    write_ranked_subsets("trails_intersecting_gte_2",
+                         [["Overall_Score", [["trails_top_score_ranked_Top20", 20]]],
+                          ["Length_of_All_Islands", [["trails_longest_islands_ranked_Top20", 20]]]])
 
 # Generate scored trail features classes for each county
 def generate_trail_subsets_per_county():
     # Use a spatial join to add the name of the county for each trail
     arcpy.SpatialJoin_analysis("trails_intersecting_gte_2", "boundaries_4_PA_counties", "trails_intersect_gte2_counties",
                                 "JOIN_ONE_TO_ONE", "KEEP_all", match_option="INTERSECT")
-    # Generate one feature class per county
-    for county in county_list:
-        expr = "CO_NAME = '" + county + "'"
-        print(expr)
-        arcpy.SelectLayerByAttribute_management("trails_intersect_gte2_counties",
-                                                "NEW_SELECTION", expr)
-        arcpy.CopyFeatures_management("trails_intersect_gte2_counties", "trails_intersect_gte_2_" + county)
-        arcpy.SelectLayerByAttribute_management("trails_intersect_gte2_counties", "CLEAR_SELECTION")
-
-        # Add a field where we put a normalized overall score so that each county
-        # has a max value that is a true 20
-        arcpy.AddField_management("trails_intersect_gte_2_" + county, "Norm_Overall_Score_Per_County", "Double")
-        max_overall_score = get_max("trails_intersect_gte_2_" + county,"Overall_Score")
-        if county == "Delaware":
-            max_overall_score = 14.749317
-        print("trails_intersect_gte_2_" + county)
-        print(max_overall_score)
-        overall_score_norm_expr = "(float(!Overall_Score!) / " + str(max_overall_score) + ")*20"
-        print(overall_score_norm_expr)
-        arcpy.CalculateField_management("trails_intersect_gte_2_" + county, "Norm_Overall_Score_Per_County", overall_score_norm_expr, "PYTHON_9.3")
-
-# Rank each county-specific trail feature class
+    # Generate one feature class per county (in one pass), with a field where we put a normalized
+    # overall score so that each county has a max value that is a true 20 (or the max set for the
+    # county in trail_max_overall_score_per_county)
+    write_normalized_partitions("trails_intersect_gte2_counties", county_name_field, county_list,
+                                "trails_intersect_gte_2_{0}", "Overall_Score", "Norm_Overall_Score_Per_County",
+                                trail_max_overall_score_per_county)
+
+# Generate the top 20 trails of each county. The trails joined to their county are read once, and
+# ranked per county in memory. Within a county, ranking by Overall_Score gives the same order as
+# ranking by Norm_Overall_Score_Per_County (which is Overall_Score divided by the max of the county).
 def generate_ranked_subsets_per_county():
-    for county in county_list:
-        generate_ranked_subset("trails_intersect_gte_2_" + county, "Norm_Overall_Score_Per_County", "trails_top_score_ranked_" + county)
+    write_ranked_subsets("trails_intersect_gte2_counties",
+                         [["Overall_Score", [["trails_top_score_ranked_{0}_Top20", 20]]]],
+                         county_name_field, county_list)
 
 def load_and_initiate():
     if COMPUTE_FROM_SCRATCH_OPTION == "yes":
@@ -288,8 +272,10 @@ def generate_scores():
 
 # ***************************************
 # Begin Main
-print_time_stamp("Start")
-load_and_initiate()
-preprocess_layers()
-generate_scores()
-print_time_stamp("Done")
+# (only when the script is executed, not when the worker processes import it)
+if __name__ == "__main__":
+    print_time_stamp("Start")
+    load_and_initiate()
+    preprocess_layers()
+    generate_scores()
+    print_time_stamp("Done")
@@ -13,7 +13,12 @@
 
 import arcpy
 import datetime
+import multiprocessing
+import os
+import sys
+import numpy as np
 from config import *
+from raster_statistics import *
 
 # *****************************************
 # Functions
@@ -26,8 +31,8 @@ def print_time_stamp(action):
 
 # Load ancillary layers like the 4 counties' boundaries:
 def load_ancillary_layers():
-    arcpy.MakeFeatureLayer_management(common_util_path + "\\extent_4_counties", "extent_4_counties")
-    arcpy.MakeFeatureLayer_management(common_util_path + "\\boundaries_4_PA_counties", "boundaries_4_PA_counties")
+    arcpy.MakeFeatureLayer_management(analysis_extent, "extent_4_counties")
+    arcpy.MakeFeatureLayer_management(county_boundaries, "boundaries_4_PA_counties")
     arcpy.MakeFeatureLayer_management(common_util_path + "\\municipalities_4_PA_counties", "municipalities_4_PA_counties")
     arcpy.MakeFeatureLayer_management(common_util_path + "\\major_cities_4_PA_counties", "major_cities_4_PA_counties")
 
@@ -41,13 +46,18 @@ def set_up_env(script_type):
         arcpy.env.workspace = gdb_output_trails
 
     arcpy.env.overwriteOutput = True
-    current_extent = "extent_4_counties"
+    # The extent of the analysis is the one of config.py (not the layer of the mxd document,
+    # which the scripts that do not load the ancillary layers, and the worker processes, may not have)
+    current_extent = analysis_extent
     arcpy.env.extent = current_extent
     arcpy.env.outputCoordinateSystem = current_extent
     arcpy.env.mask = current_extent
     arcpy.env.snapraster = current_extent
     arcpy.env.outputCoordinateSystem = current_extent
     arcpy.env.cellSize = 30
+    # The score rasters (values from 1 to 20) are written as 8-bit unsigned rasters,
+    # compressed without loss
+    arcpy.env.compression = "LZ77"
 
 # Create a new geodatabase and to put all the output for this batch
 def prep_gdb():
@@ -57,7 +67,7 @@ def prep_gdb():
 
 # Optionally remove intermediary layers generated during the analysis
 def remove_intermediary_layers(layers_to_remove):
-    if REMOVE_INTERMEDIARY_LAYERS_OPTION == "yes":
+    if REMOVE_INTERMEDIARY_LAYERS_OPTION == "yes" and not is_worker_process():
         mxd=arcpy.mapping.MapDocument("CURRENT")
         df = arcpy.mapping.ListDataFrames(mxd)[0]
         for lyr in arcpy.mapping.ListLayers(mxd, "", df):
@@ -72,3 +82,96 @@ def get_max(feat_class, attribute):
             #print(max(cursor))
             max_value = max(cursor)
     return max_value[0]
+
+# Read a raster into a float numpy array (NoData cells become NaN), together with a
+# dictionary describing its grid: origin, cell size, shape and spatial reference
+def read_raster_as_array(raster):
+    ras = arcpy.Raster(raster)
+    array = arcpy.RasterToNumPyArray(ras).astype(np.float64)
+    if ras.noDataValue is not None:
+        array[array == ras.noDataValue] = np.nan
+    grid = {"x_min": ras.extent.XMin,
+            "y_max": ras.extent.YMax,
+            "cell_width": ras.meanCellWidth,
+            "cell_height": ras.meanCellHeight,
+            "n_rows": ras.height,
+            "n_cols": ras.width,
+            "spatial_reference": ras.spatialReference}
+    return array, grid
+
+# Save a numpy array as a raster on a grid returned by read_raster_as_array(),
+# with its statistics (unless with_statistics is False, e.g. for temporary tiles).
+# The pixel type of the raster follows the type of the array (8-bit unsigned for np.uint8).
+def save_array_as_raster(array, grid, out_raster, nodata_value=None, with_statistics=True):
+    lower_left = arcpy.Point(grid["x_min"], grid["y_max"] - grid["n_rows"] * grid["cell_height"])
+    if nodata_value is None:
+        ras = arcpy.NumPyArrayToRaster(array, lower_left, grid["cell_width"], grid["cell_height"])
+    else:
+        ras = arcpy.NumPyArrayToRaster(array, lower_left, grid["cell_width"], grid["cell_height"],
+                                       nodata_value)
+    ras.save(out_raster)
+    if grid["spatial_reference"] is not None:
+        arcpy.DefineProjection_management(out_raster, grid["spatial_reference"])
+    if with_statistics:
+        save_array_statistics(array, out_raster, nodata_value)
+
+# Get the grid defined by set_up_env(): extent, cell size and spatial reference of the analysis
+def get_env_grid():
+    extent = arcpy.env.extent
+    cell_size = float(arcpy.env.cellSize)
+    grid = {"x_min": extent.XMin,
+            "y_max": extent.YMax,
+            "cell_width": cell_size,
+            "cell_height": cell_size,
+            "n_rows": int(np.ceil((extent.YMax - extent.YMin) / cell_size)),
+            "n_cols": int(np.ceil((extent.XMax - extent.XMin) / cell_size)),
+            "spatial_reference": arcpy.env.outputCoordinateSystem}
+    return grid
+
+# Get the grid of a window of a grid (first row, last row, first col, last col)
+def get_window_grid(grid, first_row, last_row, first_col, last_col):
+    window_grid = dict(grid)
+    window_grid["x_min"] = grid["x_min"] + first_col * grid["cell_width"]
+    window_grid["y_max"] = grid["y_max"] - first_row * grid["cell_height"]
+    window_grid["n_rows"] = last_row - first_row
+    window_grid["n_cols"] = last_col - first_col
+    return window_grid
+
+# Get the grid parameters that must match for an array saved on disk to be reused
+def get_grid_signature(grid):
+    return np.array([grid["x_min"], grid["y_max"], grid["cell_width"], grid["cell_height"],
+                     grid["n_rows"], grid["n_cols"]], dtype=np.float64)
+
+# Create a pool of worker processes. In ArcGIS Desktop, sys.executable is ArcMap.exe,
+# so the workers must be told to use the Python interpreter instead.
+# An optional initializer function is run once in every worker process.
+def get_process_pool(num_of_processes=NUM_OF_PROCESSES, initializer=None, initargs=()):
+    if num_of_processes <= 0:
+        num_of_processes = multiprocessing.cpu_count()
+    python_exe = os.path.join(sys.exec_prefix, "pythonw.exe")
+    if os.path.exists(python_exe):
+        multiprocessing.set_executable(python_exe)
+    return multiprocessing.Pool(num_of_processes, initializer, initargs)
+
+# Check whether the code runs in a worker process (which has no access to the mxd document)
+def is_worker_process():
+    return multiprocessing.current_process().name != "MainProcess"
+
+# Apply a function to every task in a pool of worker processes, and return the results in
+# the same order as the tasks. The tasks run directly if there is only one, or if we are
+# already in a worker process (worker processes cannot start processes of their own).
+# The optional initializer function is run once per process (with the data shared by all the tasks).
+def map_in_process_pool(function, tasks, num_of_processes=NUM_OF_PROCESSES, initializer=None, initargs=()):
+    if len(tasks) <= 1 or is_worker_process():
+        if initializer is not None:
+            initializer(*initargs)
+        return [function(task) for task in tasks]
+    if num_of_processes <= 0:
+        num_of_processes = multiprocessing.cpu_count()
+    pool = get_process_pool(min(len(tasks), num_of_processes), initializer, initargs)
+    try:
+        results = pool.map(function, tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return results
@@ -0,0 +1,160 @@
+# ***************************************
+# ***Overview***
+# Script name: weight_sweep.py
+# Purpose: This Python module evaluates many alternative weightings of the Community Impact Index
+#          (CII) at once. The CII overall score is a weighted sum of weighted sums, so every
+#          weighting comes down to one weight per indicator raster. K weightings are a K x 10
+#          weight matrix, and all K overall score surfaces are computed in a single tiled pass
+#          over the ten indicator rasters, as one matrix product per tile. The surfaces are kept
+#          as a stack in the tile store, and summary statistics are computed for every weighting
+#          while the stack is written.
+#          Example (from the ArcGIS Python interpreter, after community_impact_index.py ran):
+#              weights = np.array([get_cii_weight_vector(), get_cii_weight_vector(group_weights=[0.4, 0.2, 0.3, 0.1])])
+#              statistics = compute_weight_sweep(weights, "cii_weight_sweep")
+#              save_weight_sweep_statistics(statistics, data_path + "\\cii_weight_sweep.csv")
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import csv
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from tiled_raster import *
+
+# The ten CII indicator rasters, in the order of the columns of the weight matrices
+cii_indicator_rasters = ["ipd_score_ras",
+                         "pop_density_score_ras", "employment_score_ras",
+                         "circuit_trails_score_ras", "no_vehicle_score_ras", "rail_score_ras",
+                         "trolley_score_ras", "bus_score_ras",
+                         "obesity_score_ras", "nata_resp_score_ras"]
+# Number of indicators in each group (IPD, density, transportation, health), in the same order
+cii_group_sizes = [1, 2, 5, 2]
+# Weights currently used by community_impact_index.py
+cii_group_weights = [0.3, 0.3, 0.3, 0.1]
+cii_indicator_weights = [1, 0.67, 0.33, 0.5, 0.27, 0.13, 0.07, 0.03, 0.5, 0.5]
+# The indicator scores are between 1 and 20
+max_indicator_score = 20
+# Number of bins of the histograms used for the median and the 90th percentile
+num_of_statistics_bins = 2000
+
+# *****************************************
+# Functions
+
+# Get the weight of each of the ten indicators in the overall score: the weight of its
+# group times its weight within the group
+def get_cii_weight_vector(group_weights=cii_group_weights, indicator_weights=cii_indicator_weights):
+    return np.repeat(np.asarray(group_weights, dtype=np.float64), cii_group_sizes) * \
+           np.asarray(indicator_weights, dtype=np.float64)
+
+# Compute the overall score of every weighting (one row of weight_matrix per weighting,
+# one column per indicator raster) in one pass over the indicator rasters, tile by tile.
+# The scores are saved in the tile store as a stack of bands (one per weighting), and the
+# summary statistics of every weighting are returned.
+def compute_weight_sweep(weight_matrix, out_stack_name, indicator_rasters=cii_indicator_rasters):
+    weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype=np.float64))
+    num_of_weightings = weight_matrix.shape[0]
+    if weight_matrix.shape[1] != len(indicator_rasters):
+        raise ValueError("The weight matrix needs one column per indicator raster ("
+                         + str(len(indicator_rasters)) + ")")
+    inputs = [get_tiled_raster(raster)[0] for raster in indicator_rasters]
+    grid = open_tiled_raster(indicator_rasters[0])[1]
+    stack = create_tiled_raster(out_stack_name, grid, num_of_bands=num_of_weightings)
+
+    # Running statistics of every weighting, and histograms of their scores between 0 and the
+    # highest possible score
+    count = np.zeros(num_of_weightings)
+    total = np.zeros(num_of_weightings)
+    total_of_squares = np.zeros(num_of_weightings)
+    minimum = np.full(num_of_weightings, np.inf)
+    maximum = np.full(num_of_weightings, -np.inf)
+    highest_scores = np.maximum(np.abs(weight_matrix).sum(axis=1) * max_indicator_score, 1e-12)
+    histograms = np.zeros(num_of_weightings * num_of_statistics_bins, dtype=np.int64)
+
+    tile_num_of_rows = get_tile_num_of_rows(grid, len(inputs) + num_of_weightings)
+    for first_row, last_row in iterate_tiles(grid, tile_num_of_rows):
+        # One row per indicator, one column per cell of the tile
+        indicators = np.vstack([np.asarray(array[first_row:last_row], dtype=np.float64).ravel()
+                                for array in inputs])
+        scores = np.dot(weight_matrix, indicators)
+        stack[:, first_row:last_row, :] = scores.reshape(num_of_weightings, last_row - first_row, grid["n_cols"])
+
+        # Only the cells with a value in all the indicators have a score (the others are NaN)
+        scores = scores[:, ~np.isnan(indicators).any(axis=0)]
+        if scores.shape[1] == 0:
+            continue
+        count += scores.shape[1]
+        total += scores.sum(axis=1)
+        total_of_squares += (scores * scores).sum(axis=1)
+        minimum = np.minimum(minimum, scores.min(axis=1))
+        maximum = np.maximum(maximum, scores.max(axis=1))
+        bins = np.clip((scores / highest_scores[:, np.newaxis] * num_of_statistics_bins).astype(np.int64),
+                       0, num_of_statistics_bins - 1)
+        bins += (np.arange(num_of_weightings) * num_of_statistics_bins)[:, np.newaxis]
+        histograms += np.bincount(bins.ravel(), minlength=len(histograms))
+    stack.flush()
+    del stack
+
+    return get_weight_sweep_statistics(weight_matrix, count, total, total_of_squares, minimum, maximum,
+                                       histograms.reshape(num_of_weightings, num_of_statistics_bins),
+                                       highest_scores)
+
+# Get the score at a quantile from a histogram of scores between 0 and highest_score
+# (the upper edge of the bin that contains the quantile)
+def get_histogram_quantile(histogram, highest_score, quantile):
+    cumulative_counts = np.cumsum(histogram)
+    if cumulative_counts[-1] == 0:
+        return np.nan
+    bin_index = np.searchsorted(cumulative_counts, quantile * cumulative_counts[-1])
+    return (bin_index + 1) * highest_score / len(histogram)
+
+# Assemble the summary statistics of every weighting
+def get_weight_sweep_statistics(weight_matrix, count, total, total_of_squares, minimum, maximum,
+                                histograms, highest_scores):
+    statistics = []
+    for k in range(len(weight_matrix)):
+        if count[k] == 0:
+            mean = std = np.nan
+        else:
+            mean = total[k] / count[k]
+            std = np.sqrt(max(total_of_squares[k] / count[k] - mean * mean, 0))
+        statistics.append({"weighting": k,
+                           "weights": list(weight_matrix[k]),
+                           "count": int(count[k]),
+                           "mean": mean,
+                           "std": std,
+                           "min": minimum[k] if count[k] else np.nan,
+                           "max": maximum[k] if count[k] else np.nan,
+                           "median": get_histogram_quantile(histograms[k], highest_scores[k], 0.5),
+                           "p90": get_histogram_quantile(histograms[k], highest_scores[k], 0.9)})
+    return statistics
+
+# Save the summary statistics of the weightings to a CSV file (one row per weighting)
+def save_weight_sweep_statistics(statistics, out_csv, indicator_rasters=cii_indicator_rasters):
+    with open(out_csv, "w") as csv_file:
+        writer = csv.writer(csv_file, lineterminator="\n")
+        writer.writerow(["weighting"] + indicator_rasters + ["count", "mean", "std", "min", "max", "median", "p90"])
+        for row in statistics:
+            writer.writerow([row["weighting"]] + row["weights"]
+                            + [row[key] for key in ["count", "mean", "std", "min", "max", "median", "p90"]])
+
+# Save some of the weightings of a stack (all of them by default) as arcpy rasters named
+# <out_raster_prefix>_<weighting>, and as one multiband raster if out_multiband_raster is given
+def export_weight_sweep_rasters(stack_name, out_raster_prefix, weightings=None, out_multiband_raster=None):
+    if weightings is None:
+        weightings = range(open_tiled_raster(stack_name)[0].shape[0])
+    out_rasters = []
+    for k in weightings:
+        out_raster = out_raster_prefix + "_" + str(k)
+        export_tile_store_raster(stack_name, out_raster, band=k)
+        out_rasters.append(out_raster)
+    if out_multiband_raster is not None:
+        arcpy.CompositeBands_management(";".join(out_rasters), out_multiband_raster)
+    return out_rasters
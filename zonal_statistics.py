@@ -0,0 +1,212 @@
+# ***************************************
+# ***Overview***
+# Script name: zonal_statistics.py
+# Purpose: This Python module computes zonal statistics (COUNT, AREA, MEAN) of a raster for
+#          polygon zones that are allowed to overlap, such as the 1 mile buffers around the
+#          LTS3 road segments. arcpy.sa.ZonalStatisticsAsTable() flattens overlapping zones,
+#          so here the raster is read once and every zone is rasterized on its own window.
+#          The zones can also be sharded by spatial tile and processed in a pool of worker
+#          processes, which share the raster through a read-only memory-mapped file.
+# Project: Connectivity and community impact analysis in Arcpy for potential bicycle infrastructure improvements.
+# Extent: 4 PA Counties in Philadelphia suburbs.
+# Last updated: October 16, 2026
+# Author: Delphine Khanna
+# Organization: Bicycle Coalition of Greater Philadelphia
+# ***************************************
+
+# Import Arcpy modules:
+import arcpy
+import arcpy.da # Data Access
+import multiprocessing
+import numpy as np
+
+# Import local modules:
+from config import *
+from utilities import *
+from tiled_raster import *
+
+# True curves (e.g. the round ends of the buffers of Buffer_analysis() and geometry.buffer()) are
+# densified into chords before rasterization: maximum distance (in meters) between two new vertices,
+# and maximum distance between a chord and the curve it replaces
+curve_densify_distance = 100.0
+curve_densify_deviation = 0.1
+
+# *****************************************
+# Functions
+
+# Get the rings of a polygon geometry as a list of (n, 2) arrays of x/y coordinates.
+# Interior rings are kept: the even-odd fill in rasterize_polygon() turns them into holes.
+# A curved segment is stored as its two end vertices only, so the curves are densified first.
+def get_polygon_rings(geometry):
+    if getattr(geometry, "hasCurves", False):
+        geometry = geometry.densify("DISTANCE", curve_densify_distance, curve_densify_deviation)
+    rings = []
+    for part in geometry:
+        ring = []
+        for point in part:
+            # A None point separates the exterior ring from the interior rings
+            if point is None:
+                if ring:
+                    rings.append(np.array(ring))
+                ring = []
+            else:
+                ring.append((point.X, point.Y))
+        if ring:
+            rings.append(np.array(ring))
+    return rings
+
+# Rasterize a polygon on a grid, using the same rule as the Spatial Analyst tools
+# (a cell belongs to the zone if its center is inside the polygon).
+# Returns the first row, the first column and the boolean mask of the polygon's window,
+# or None if the polygon does not cover any cell center of the grid.
+def rasterize_polygon(rings, grid):
+    points = np.concatenate(rings)
+    cell_width = grid["cell_width"]
+    cell_height = grid["cell_height"]
+    # Find the window of the grid covered by the polygon's bounding box
+    first_row = max(int(np.floor((grid["y_max"] - points[:, 1].max()) / cell_height)), 0)
+    last_row = min(int(np.ceil((grid["y_max"] - points[:, 1].min()) / cell_height)), grid["n_rows"])
+    first_col = max(int(np.floor((points[:, 0].min() - grid["x_min"]) / cell_width)), 0)
+    last_col = min(int(np.ceil((points[:, 0].max() - grid["x_min"]) / cell_width)), grid["n_cols"])
+    if first_row >= last_row or first_col >= last_col:
+        return None
+    n_cols = last_col - first_col
+
+    # Put together the edges of all the rings
+    x0 = np.concatenate([ring[:, 0] for ring in rings])
+    y0 = np.concatenate([ring[:, 1] for ring in rings])
+    x1 = np.concatenate([np.roll(ring[:, 0], -1) for ring in rings])
+    y1 = np.concatenate([np.roll(ring[:, 1], -1) for ring in rings])
+
+    # Intersect every edge with the horizontal line going through the cell centers of each row
+    row_y = grid["y_max"] - (np.arange(first_row, last_row) + 0.5) * cell_height
+    crossing = (y0 <= row_y[:, None]) != (y1 <= row_y[:, None])
+    rows, edges = np.nonzero(crossing)
+    crossing_x = (x0[edges] + (row_y[rows] - y0[edges])
+                  * (x1[edges] - x0[edges]) / (y1[edges] - y0[edges]))
+
+    # Each crossing toggles inside/outside for all the cell centers to its right.
+    # Accumulating the toggles along the rows gives the even-odd fill of the polygon.
+    first_col_right = np.ceil((crossing_x - grid["x_min"]) / cell_width - 0.5) - first_col
+    first_col_right = np.clip(first_col_right, 0, n_cols).astype(np.int64)
+    toggles = np.zeros((last_row - first_row, n_cols + 1), dtype=np.int32)
+    np.add.at(toggles, (rows, first_col_right), 1)
+    mask = (np.cumsum(toggles[:, :n_cols], axis=1) % 2) == 1
+    return first_row, first_col, mask
+
+# Read the zones of a feature class as a list of [zone value, rings] (see get_polygon_rings())
+def read_zone_rings(zone_feature_class, zone_field):
+    zones = []
+    with arcpy.da.SearchCursor(zone_feature_class, [zone_field, "SHAPE@"]) as cursor:
+        for zone, geometry in cursor:
+            if geometry is not None:
+                zones.append([zone, get_polygon_rings(geometry)])
+    return zones
+
+# Add the number and the sum of the raster values (NoData ignored) inside every zone
+# to the dictionaries counts and sums (zone value -> count, zone value -> sum)
+def accumulate_zone_sums(values, grid, zones, counts, sums):
+    for zone, rings in zones:
+        window = rasterize_polygon(rings, grid)
+        if window is None:
+            continue
+        first_row, first_col, mask = window
+        zone_values = values[first_row:first_row + mask.shape[0],
+                             first_col:first_col + mask.shape[1]][mask]
+        zone_values = zone_values[~np.isnan(zone_values)]
+        if zone_values.size == 0:
+            continue
+        counts[zone] = counts.get(zone, 0) + zone_values.size
+        sums[zone] = sums.get(zone, 0.0) + float(zone_values.sum(dtype=np.float64))
+
+# Get the tile (row and column of tiles of tile_size cells) that contains the center of a zone's bounding box
+def get_zone_tile(rings, grid, tile_size):
+    points = np.concatenate(rings)
+    center_x = (points[:, 0].min() + points[:, 0].max()) / 2
+    center_y = (points[:, 1].min() + points[:, 1].max()) / 2
+    return (int(np.floor((grid["y_max"] - center_y) / grid["cell_height"])) // tile_size,
+            int(np.floor((center_x - grid["x_min"]) / grid["cell_width"])) // tile_size)
+
+# Group the zones by tile, in tasks of at most max_zones_per_task zones (so that the workers
+# get a balanced share of the zones even when a few tiles hold most of them)
+def get_zone_tasks(zones, grid, tile_size, max_zones_per_task):
+    tiles = {}
+    for zone in zones:
+        tiles.setdefault(get_zone_tile(zone[1], grid, tile_size), []).append(zone)
+    tasks = []
+    for tile in sorted(tiles):
+        for first_zone in range(0, len(tiles[tile]), max_zones_per_task):
+            tasks.append(tiles[tile][first_zone:first_zone + max_zones_per_task])
+    return tasks
+
+# Worker function for the process pool: compute the counts and sums of a task's zones.
+# The value raster is memory-mapped read-only from the tile store, so the workers share it
+# instead of each getting a copy, and only read the cells under their zones.
+def compute_zone_sums_worker(arguments):
+    raster_name, zones = arguments
+    values, grid = open_tiled_raster(raster_name)
+    counts = {}
+    sums = {}
+    accumulate_zone_sums(values, grid, zones, counts, sums)
+    return counts, sums
+
+# Compute the counts and sums of the zones in parallel: the zones are sharded by spatial tile,
+# and the shards run in a process pool on the value raster memory-mapped from the tile store
+def compute_parallel_zone_sums(zones, value_raster, tile_size=SHARD_SIZE, num_of_processes=NUM_OF_PROCESSES):
+    grid = get_raster_grid(value_raster)
+    import_raster_to_tile_store(value_raster, grid)
+    if num_of_processes <= 0:
+        num_of_processes = multiprocessing.cpu_count()
+    max_zones_per_task = max(1, int(np.ceil(len(zones) / (4.0 * num_of_processes))))
+    tasks = [[value_raster, task_zones] for task_zones in get_zone_tasks(zones, grid, tile_size, max_zones_per_task)]
+    counts = {}
+    sums = {}
+    # The same zone value can be in several tasks: add up their counts and sums
+    for task_counts, task_sums in map_in_process_pool(compute_zone_sums_worker, tasks, num_of_processes):
+        for zone in task_counts:
+            counts[zone] = counts.get(zone, 0) + task_counts[zone]
+            sums[zone] = sums.get(zone, 0.0) + task_sums[zone]
+    return counts, sums, grid
+
+# Compute the COUNT, AREA and MEAN of the raster values inside every zone.
+# Zones can overlap, and zones that share the same zone value are aggregated together,
+# as with arcpy.sa.ZonalStatisticsAsTable(). NoData cells are ignored ("DATA" option).
+# With PARALLEL_ZONAL_STATISTICS_OPTION, the zones are processed in parallel worker processes.
+# Returns a dictionary zone value -> [count, area, mean]
+def compute_overlapping_zonal_statistics(zone_feature_class, zone_field, value_raster,
+                                         parallel_option=PARALLEL_ZONAL_STATISTICS_OPTION):
+    zones = read_zone_rings(zone_feature_class, zone_field)
+    if parallel_option == "yes":
+        counts, sums, grid = compute_parallel_zone_sums(zones, value_raster)
+    else:
+        # Read the value raster only once
+        values, grid = read_raster_as_array(value_raster)
+        counts = {}
+        sums = {}
+        accumulate_zone_sums(values, grid, zones, counts, sums)
+    cell_area = grid["cell_width"] * grid["cell_height"]
+
+    zonal_stats = {}
+    for zone in counts:
+        zonal_stats[zone] = [counts[zone], counts[zone] * cell_area, sums[zone] / counts[zone]]
+    return zonal_stats
+
+# Save zonal statistics to a table with the same fields as arcpy.sa.ZonalStatisticsAsTable()
+# (zone field, COUNT, AREA, MEAN), so that it can be joined the same way
+def save_zonal_statistics_table(zonal_stats, zone_field, zone_dtype, out_table):
+    zones = sorted(zonal_stats)
+    table = np.array([(zone, zonal_stats[zone][0], zonal_stats[zone][1], zonal_stats[zone][2])
+                      for zone in zones],
+                     dtype=[(zone_field, zone_dtype), ("COUNT", np.int32),
+                            ("AREA", np.float64), ("MEAN", np.float64)])
+    if arcpy.Exists(out_table):
+        arcpy.Delete_management(out_table)
+    arcpy.da.NumPyArrayToTable(table, out_table)
+
+# Equivalent of arcpy.sa.ZonalStatisticsAsTable(zones, zone_field, raster, out_table, "DATA", "MEAN")
+# that supports overlapping zones, in one pass
+def zonal_statistics_as_table(zone_feature_class, zone_field, value_raster, out_table):
+    zonal_stats = compute_overlapping_zonal_statistics(zone_feature_class, zone_field, value_raster)
+    # Keep the type of the zone field in the output table
+    zone_dtype = arcpy.da.FeatureClassToNumPyArray(zone_feature_class, [zone_field]).dtype[0]
+    save_zonal_statistics_table(zonal_stats, zone_field, zone_dtype, out_table)